@@ -2,6 +2,9 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker``
+so the async chat and voice views don't hold a worker while Gemini answers
+(see "ASGI Mode" in DEPLOYMENT.md).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -11,6 +14,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+# Servers load the model and read the documents at startup, manage.py commands don't
+os.environ.setdefault('PREDICTION_PRELOAD_MODEL', 'True')
+os.environ.setdefault('PRELOAD_DOCUMENTS', 'True')
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
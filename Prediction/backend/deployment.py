@@ -12,6 +12,7 @@ DEBUG = False
 SECRET_KEY = os.environ['MY_SECRET_KEY']
 
 MIDDLEWARE = [
+    'utils.timing.TimingMiddleware',  # First, so it times everything below it
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -23,6 +24,15 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# App Service's front end is the one proxy in front of the app, it appends the
+# client's address to X-Forwarded-For
+LLM_TRUSTED_PROXIES = int(os.environ.get('LLM_TRUSTED_PROXIES', '1'))
+
+LLM_CLIENT_RATE = float(os.environ.get('LLM_CLIENT_RATE', '0.5'))
+
+# Not public on the production site, see "Request Timing and Metrics" in DEPLOYMENT.md
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() == 'true'
+
 
 # CORS_ALLOW_ALL_ORIGINS = []
 
@@ -43,8 +53,14 @@ DATABASES = {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": CONNECTION_STR['dbname'],
         "HOST": CONNECTION_STR['host'],
+        "PORT": CONNECTION_STR.get('port', ''),
         "USER": CONNECTION_STR['user'],
         "PASSWORD": CONNECTION_STR['password'],
+        "OPTIONS": {"sslmode": CONNECTION_STR['sslmode']} if 'sslmode' in CONNECTION_STR else {},
+        # Keep each worker's connection open between requests instead of paying a
+        # TCP and TLS handshake per sign-in, checked before reuse after an idle period
+        "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        "CONN_HEALTH_CHECKS": os.environ.get('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true',
     }
 }
 
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.timing.TimingMiddleware',  # First, so it times everything below it
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise for static files
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware should be as high as possible
@@ -139,6 +140,20 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Passwords are hashed with PBKDF2-SHA256 at PASSWORD_HASH_ITERATIONS rounds
+# (Django's default 720000). Verifying one costs about as many CPU
+# milliseconds per core, measure with `benchmark_prediction --suite auth`.
+# After a change accounts are rehashed in the background as they sign in
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '720000'))
+
+PASSWORD_HASHERS = [
+    'prediction.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -164,3 +179,135 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Prediction model
+# The model is loaded once per worker process by prediction.model_registry
+
+PREDICTION_MODEL_PATH = os.environ.get('PREDICTION_MODEL_PATH', str(BASE_DIR / 'ml_models' / 'dtmodel.pkl'))
+
+# Load it at startup rather than on the first quiz. Off for manage.py commands,
+# backend/wsgi.py and backend/asgi.py turn it on for servers
+PREDICTION_PRELOAD_MODEL = os.environ.get('PREDICTION_PRELOAD_MODEL', 'False').lower() == 'true'
+
+# Seconds between checks for a replaced model file, 0 disables reloading
+PREDICTION_MODEL_CHECK_INTERVAL = float(os.environ.get('PREDICTION_MODEL_CHECK_INTERVAL', '30'))
+
+# Score with prediction.inference's flattened tree instead of sklearn's predict
+PREDICTION_FLAT_TREE = os.environ.get('PREDICTION_FLAT_TREE', 'True').lower() == 'true'
+
+# Single predictions cached per model version (LRU, entries), 0 disables the cache
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+
+
+# Sentiment analysis
+# NLTK data is installed at build time with `python manage.py download_nltk_data`
+# (into NLTK_DATA_DIR, default Prediction/nltk_data) and only checked at runtime.
+
+PRELOAD_SENTIMENT = os.environ.get('PRELOAD_SENTIMENT', 'False').lower() == 'true'
+
+# Processes used by /api/get/sentiment/batch/ for batches of at least
+# SENTIMENT_POOL_MIN_TEXTS texts (or any NDJSON stream), 0 scores in-process
+SENTIMENT_BATCH_PROCESSES = int(os.environ.get('SENTIMENT_BATCH_PROCESSES', '0'))
+
+SENTIMENT_POOL_MIN_TEXTS = int(os.environ.get('SENTIMENT_POOL_MIN_TEXTS', '1000'))
+
+
+# Chatbot and voice assistant
+# Prompts include the CONTEXT_TOP_K most relevant chunks of datasets/docs/Job_Roles.pdf,
+# the index is built with `python manage.py build_context_index`
+CONTEXT_TOP_K = int(os.environ.get('CONTEXT_TOP_K', '3'))
+
+# Extract the PDF text (from the shared cache in DOCUMENT_CACHE_DIR, default
+# Prediction/.cache/documents) and load the context index at startup. Off for
+# manage.py commands, backend/wsgi.py and backend/asgi.py turn it on for servers
+PRELOAD_DOCUMENTS = os.environ.get('PRELOAD_DOCUMENTS', 'False').lower() == 'true'
+
+# Cache for chatbot and voice answers: 'local' (per process LRU),
+# 'django' (the LLM_CACHE_ALIAS entry of CACHES, shared by workers) or 'none'
+LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND', 'local')
+
+LLM_CACHE_ALIAS = os.environ.get('LLM_CACHE_ALIAS', 'default')
+
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(6 * 60 * 60)))
+
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '1024'))
+
+# Gemini model fallback chain, in order of preference, and its circuit breakers
+# (see utils/llm_gateway.py). Health per model is reported at /api/chat/models/
+LLM_MODELS = [model.strip() for model in os.environ.get(
+    'LLM_MODELS', 'models/gemini-2.5-flash,models/gemini-2.0-flash,models/gemini-flash-latest,models/gemini-pro-latest'
+).split(',') if model.strip()]
+
+# Consecutive server errors/timeouts that open a model's breaker, and for how long
+LLM_FAILURE_THRESHOLD = int(os.environ.get('LLM_FAILURE_THRESHOLD', '3'))
+
+LLM_COOLDOWN = float(os.environ.get('LLM_COOLDOWN', '30'))
+
+# A model that returned 404 is retried after this many seconds
+LLM_NOT_FOUND_COOLDOWN = float(os.environ.get('LLM_NOT_FOUND_COOLDOWN', '3600'))
+
+# Seconds one chat or voice answer may spend across all model attempts
+LLM_DEADLINE = float(os.environ.get('LLM_DEADLINE', '30'))
+
+# Identical chat questions asked at the same time share one Gemini call. With
+# LLM_SINGLEFLIGHT_DISTRIBUTED workers also coordinate through a lock in the
+# LLM_CACHE_ALIAS cache, which needs LLM_CACHE_BACKEND = 'django' to share answers
+LLM_SINGLEFLIGHT = os.environ.get('LLM_SINGLEFLIGHT', 'True').lower() == 'true'
+
+LLM_SINGLEFLIGHT_DISTRIBUTED = os.environ.get('LLM_SINGLEFLIGHT_DISTRIBUTED', 'False').lower() == 'true'
+
+LLM_SINGLEFLIGHT_LOCK_TTL = int(os.environ.get('LLM_SINGLEFLIGHT_LOCK_TTL', '60'))
+
+# Admission control for /api/chat/ and /api/voice/ (see utils/admission.py).
+# Each client address may ask LLM_CLIENT_RATE questions per second after a burst
+# of LLM_CLIENT_BURST (429 beyond that), all clients together LLM_GLOBAL_RATE
+# after LLM_GLOBAL_BURST (503), a rate of 0 turns that bucket off. The client
+# bucket is off by default: it needs LLM_TRUSTED_PROXIES set behind a proxy,
+# otherwise all users share the proxy's address and so one bucket
+LLM_ADMISSION_CONTROL = os.environ.get('LLM_ADMISSION_CONTROL', 'True').lower() == 'true'
+
+LLM_CLIENT_RATE = float(os.environ.get('LLM_CLIENT_RATE', '0'))
+
+LLM_CLIENT_BURST = int(os.environ.get('LLM_CLIENT_BURST', '10'))
+
+LLM_GLOBAL_RATE = float(os.environ.get('LLM_GLOBAL_RATE', '10'))
+
+LLM_GLOBAL_BURST = int(os.environ.get('LLM_GLOBAL_BURST', '50'))
+
+# Answers one worker process works on at once, more are refused with a 503
+LLM_MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', '32'))
+
+# 'local' (buckets per process) or 'django' (in the LLM_CACHE_ALIAS cache, shared by workers)
+LLM_ADMISSION_BACKEND = os.environ.get('LLM_ADMISSION_BACKEND', 'local')
+
+# Reverse proxies in front of the app that append to X-Forwarded-For, with 0
+# clients are told apart by REMOTE_ADDR
+LLM_TRUSTED_PROXIES = int(os.environ.get('LLM_TRUSTED_PROXIES', '0'))
+
+# Text-to-speech runs on one worker thread that owns the pyttsx3 engine. Up to
+# TTS_QUEUE_SIZE jobs wait for it, more are refused with a 503. Rendered WAV
+# files are kept in TTS_AUDIO_DIR, named by the hash of (text, rate, voice)
+TTS_QUEUE_SIZE = int(os.environ.get('TTS_QUEUE_SIZE', '32'))
+
+TTS_AUDIO_DIR = os.environ.get('TTS_AUDIO_DIR', str(BASE_DIR / '.cache' / 'tts'))
+
+TTS_RATE = int(os.environ.get('TTS_RATE', '120'))
+
+# pyttsx3 voice id, the engine's first voice when empty
+TTS_VOICE = os.environ.get('TTS_VOICE') or None
+
+# Seconds a request waits for a WAV to be rendered
+TTS_RENDER_TIMEOUT = float(os.environ.get('TTS_RENDER_TIMEOUT', '10'))
+
+# Request timing (utils.timing): a Server-Timing header with the stages of each
+# request (model, encode, predict, context, llm, ...) and Prometheus histograms
+# served at /metrics
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True').lower() == 'true'
+
+# /metrics shows internal latencies and cache statistics, so it is off unless
+# DEBUG or METRICS_ENABLED is set. METRICS_ALLOWED_IPS (comma separated) limits
+# it to the scraper's addresses, staff users can always read it
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', str(DEBUG)).lower() == 'true'
+
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
@@ -3,6 +3,8 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 
+from utils.timing import metrics_view
+
 @api_view(['GET'])
 def root_view(request):
     """Root endpoint to test if backend is running"""
@@ -12,16 +14,20 @@ def root_view(request):
         'endpoints': {
             'auth': '/api/auth/signup/, /api/auth/signin/',
             'quiz': '/api/get/quiz/ (POST)',
-            'prediction': '/api/get/quiz/ (POST)',
-            'sentiment': '/api/get/sentiment/ (POST)',
+            'prediction': '/api/get/quiz/ (POST, ?top_k=3 or ?top_k=all for the best job roles)',
+            'batch prediction': '/api/get/quiz/batch/ (POST, ?top_k= as above)',
+            'model': '/api/get/model/ (GET, staff only)',
+            'sentiment': '/api/get/sentiment/ (POST), /api/get/sentiment/batch/ (POST)',
             'user': '/api/get/user/ (GET)',
-            'chat': '/api/chat/ (POST)',
-            'voice': '/api/voice/ (POST), /api/bot/cmd/ (GET)'
+            'chat': '/api/chat/ (POST, ?stream=sse or ?stream=ndjson to stream), /api/chat/cache/ (GET), /api/chat/models/ (GET)',
+            'metrics': '/metrics (GET, Prometheus text format)',
+            'voice': '/api/voice/ (POST, "audio": true for a WAV), /api/bot/cmd/ (GET, ?audio=1 for a WAV), /api/voice/audio/<hash>.wav (GET)'
         }
     }, status=status.HTTP_200_OK)
 
 urlpatterns = [
     path('', root_view, name='root'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('prediction.urls')),   
     path('api/', include('chatapp.urls')),
     path('api/', include('voiceapp.urls')),
@@ -11,6 +11,10 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+# Servers load the model and read the documents at startup, manage.py commands don't
+os.environ.setdefault('PREDICTION_PRELOAD_MODEL', 'True')
+os.environ.setdefault('PRELOAD_DOCUMENTS', 'True')
+
 settings_module = 'backend.deployment' if 'WEBSITE_HOSTNAME' in os.environ else 'backend.settings'
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
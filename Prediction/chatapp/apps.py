@@ -1,6 +1,23 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ChatappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chatapp"
+
+    def ready(self):
+        # Chat and voice share one extracted copy of the PDF, read it before
+        # the first question instead of during it
+        if getattr(settings, 'PRELOAD_DOCUMENTS', False):
+            from utils.documents import get_document_store
+            from utils.retrieval import get_context_index
+            get_document_store().preload()
+            try:
+                get_context_index()
+            except Exception as e:
+                logger.error("Could not preload context index: %s", e)
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from utils.retrieval import DEFAULT_INDEX_PATH, DEFAULT_PDF_PATH, build_index, load_index
+
+
+class Command(BaseCommand):
+    help = "Chunk the job roles PDF and build the BM25 index used for chatbot and voice prompts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', default=DEFAULT_PDF_PATH)
+        parser.add_argument('--output', default=DEFAULT_INDEX_PATH)
+        parser.add_argument('--force', action='store_true', help="Rebuild every page instead of reusing unchanged ones")
+
+    def handle(self, *args, **options):
+        previous = None
+        if not options['force'] and os.path.exists(options['output']):
+            try:
+                previous = load_index(options['output'])
+            except ValueError as e:
+                self.stderr.write(f"Ignoring existing index: {e}")
+
+        index = build_index(options['pdf'], options['output'], previous=previous)
+        n_chunks = sum(len(page['chunks']) for page in index['pages'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index['pages'])} pages into {n_chunks} chunks -> {options['output']}"
+        ))
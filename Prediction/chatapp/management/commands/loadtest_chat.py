@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import httpx
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from utils.admission import get_admission_controller
+from utils.fake_llm import FakeLLMServer
+from utils.llm_gateway import PerLoopClient, get_llm_gateway
+
+ENDPOINTS = {
+    'chat': ('/api/chat/', 'message'),
+    'voice': ('/api/voice/', 'query'),
+}
+
+
+@contextmanager
+def fake_client(server):
+    """Point the shared Gemini client at ``server`` for the duration of the block."""
+    gateway = get_llm_gateway()
+    original = gateway.client
+    gateway.client = PerLoopClient('loadtest', server.url)
+    try:
+        yield
+    finally:
+        gateway.client = original
+
+
+@contextmanager
+def admission_control(enabled):
+    """All load comes from one client, which the per-client bucket would throttle."""
+    controller = get_admission_controller()
+    original = controller.enabled
+    controller.enabled = enabled
+    try:
+        yield
+    finally:
+        controller.enabled = original
+
+
+def _summary(mode, latencies, errors, wall, server):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+    return {
+        'mode': mode,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round((len(latencies) + errors) / wall, 2) if wall else None,
+        'p50_seconds': percentile(0.5),
+        'p95_seconds': percentile(0.95),
+        'upstream_max_in_flight': server.max_in_flight if server else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Load test /api/chat/ or /api/voice/ against a local fake LLM with a fixed latency, "
+            "comparing the async (ASGI) path with a fixed number of sync workers")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='chat')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=0.5, help="Seconds the fake LLM takes per answer")
+        parser.add_argument('--wsgi-workers', type=int, default=2,
+                            help="Sync workers to compare against (threads through the WSGI handler), 0 skips it")
+        parser.add_argument('--url', help="Load test a running server (its GEMINI_BASE_URL must point at "
+                                          "--serve-fake-llm) instead of the in-process ASGI application")
+        parser.add_argument('--admission-control', action='store_true',
+                            help="Keep admission control on, refused requests are counted as errors")
+        parser.add_argument('--serve-fake-llm', type=int, metavar='PORT',
+                            help="Only run the fake LLM on PORT until interrupted")
+
+    def handle(self, *args, **options):
+        if options['serve_fake_llm'] is not None:
+            server = FakeLLMServer(latency=options['latency'], port=options['serve_fake_llm'])
+            self.stderr.write(f"Fake LLM on {server.url} ({options['latency']}s per answer), set GEMINI_BASE_URL to it")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+
+        # Per-request INFO lines from the HTTP clients would drown the summary
+        for name in ('httpx', 'google_genai'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        path, field = ENDPOINTS[options['endpoint']]
+        run_id = time.time_ns()
+
+        def payloads(mode):
+            # Distinct questions, so the answer cache cannot hide the LLM latency
+            return [{field: f'What does a software engineer do? (load test {run_id} {mode} {i})'}
+                    for i in range(options['requests'])]
+
+        if options['url']:
+            results = [asyncio.run(self._run_asgi(None, options['url'].rstrip('/') + path, payloads('url'),
+                                                  options['concurrency'], None))]
+        else:
+            with FakeLLMServer(latency=options['latency']) as server, fake_client(server), \
+                    admission_control(options['admission_control']):
+                results = [asyncio.run(self._run_asgi(ASGIHandler(), 'http://testserver' + path, payloads('asgi'),
+                                                      options['concurrency'], server))]
+            if options['wsgi_workers'] > 0:
+                with FakeLLMServer(latency=options['latency']) as server, fake_client(server), \
+                        admission_control(options['admission_control']):
+                    results.append(self._run_wsgi(path, payloads('wsgi'), options['wsgi_workers'], server))
+
+        for result in results:
+            self.stdout.write(json.dumps(result))
+
+    async def _run_asgi(self, app, url, payloads, concurrency, server):
+        transport = httpx.ASGITransport(app=app) if app is not None else None
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async with httpx.AsyncClient(transport=transport, timeout=None) as client:
+            async def one(payload):
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(url, json=payload)
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(payload) for payload in payloads))
+            wall = time.perf_counter() - started
+
+        return _summary('asgi' if app is not None else url, latencies, errors, wall, server)
+
+    def _run_wsgi(self, path, payloads, workers, server):
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+        local = threading.local()
+
+        def one(payload):
+            nonlocal errors
+            # One client per thread, like a sync worker serving one request at a time
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.post(path, payload, content_type='application/json')
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(one, payloads))
+        wall = time.perf_counter() - started
+        return _summary(f'wsgi x{workers}', latencies, errors, wall, server)
@@ -1,3 +1,639 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
 from django.test import TestCase
 
-# Create your tests here.
+from utils.admission import AdmissionController, CacheBucketStore, LocalBucketStore, Overloaded, TokenBucket
+from utils.documents import DocumentStore, DocumentUnavailable
+from utils.fake_llm import FakeLLMServer
+from utils.llm_gateway import DEFAULT_MODELS, LLMGateway, LLMUnavailable, PerLoopClient, retry_after
+from utils.response_cache import DjangoCacheBackend, LocalCacheBackend, ResponseCache, normalize_question
+from utils.singleflight import CacheLock, SingleFlight, flight_key
+from utils.retrieval import DEFAULT_PDF_PATH, ContextIndex, build_index, split_chunks
+
+from .views import ChatbotResponse
+
+
+class ContextIndexTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmpdir, 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_splits_on_role_headings(self):
+        text = "Job Roles\n1) Web Developer\nBuilds sites.\n2) UX Designer\nDesigns screens."
+        self.assertEqual(split_chunks(text), ['Job Roles', '1) Web Developer Builds sites.',
+                                              '2) UX Designer Designs screens.'])
+
+    def test_retrieves_relevant_role(self):
+        index = ContextIndex(build_index(DEFAULT_PDF_PATH, self.index_path))
+        context = index.retrieve('What does a network security engineer do?', k=1)
+        self.assertIn('Network Security Engineer', context)
+        self.assertLess(len(context), 1000)
+        # Nothing in common with the document still gives the model some context
+        self.assertTrue(index.retrieve('zzz qqq', k=2))
+
+    def test_incremental_rebuild_reuses_unchanged_pages(self):
+        first = build_index(DEFAULT_PDF_PATH, self.index_path, pages=['1) Web Developer\nBuilds sites.', 'Old page'])
+        second = build_index(DEFAULT_PDF_PATH, None, previous=dict(first, source={'sha256': 'changed'}),
+                             pages=['1) Web Developer\nBuilds sites.', 'New page'])
+        self.assertIs(second['pages'][0]['chunks'], first['pages'][0]['chunks'])
+        self.assertEqual(second['pages'][1]['chunks'][0]['text'], 'New page')
+
+    def test_prompt_context_falls_back_to_pdf_prefix(self):
+        with mock.patch('chatapp.views.retrieve_context', side_effect=OSError('no index')):
+            context = ChatbotResponse.get_context('data scientist')
+        self.assertTrue(context.startswith('Job Roles'))
+
+
+class DocumentStoreTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.tmpdir, 'doc.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4 test')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.extract = mock.Mock(return_value=['page one\n', 'page two'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_extracts_once_per_process(self):
+        store = DocumentStore(self.cache_dir, extract=self.extract)
+        self.assertEqual(store.get_text(self.pdf_path), 'page one\npage two')
+        self.assertEqual(store.get_pages(self.pdf_path), ['page one\n', 'page two'])
+        self.extract.assert_called_once()
+        self.assertEqual(store.stats['memory_hits'], 1)
+
+    def test_other_stores_read_the_disk_cache(self):
+        DocumentStore(self.cache_dir, extract=self.extract).get_pages(self.pdf_path)
+        other = DocumentStore(self.cache_dir, extract=self.extract)
+        self.assertEqual(other.get_pages(self.pdf_path), ['page one\n', 'page two'])
+        self.extract.assert_called_once()
+        self.assertEqual(other.stats['disk_hits'], 1)
+
+    def test_failures_are_cached_until_the_file_changes(self):
+        self.extract.side_effect = ValueError('broken pdf')
+        store = DocumentStore(self.cache_dir, failure_ttl=60, extract=self.extract)
+        for _ in range(2):
+            with self.assertRaises(DocumentUnavailable):
+                store.get_pages(self.pdf_path)
+        self.assertEqual(self.extract.call_count, 1)
+
+        self.extract.side_effect = None
+        with open(self.pdf_path, 'ab') as f:
+            f.write(b' fixed')
+        self.assertEqual(store.get_pages(self.pdf_path), ['page one\n', 'page two'])
+
+    def test_missing_file(self):
+        store = DocumentStore(self.cache_dir, extract=self.extract)
+        with self.assertRaises(DocumentUnavailable):
+            store.get_text(os.path.join(self.tmpdir, 'missing.pdf'))
+
+
+class StubGeminiClient:
+    """Stands in for ``genai.Client`` (``client.aio.models``), records models and answers with a counter."""
+
+    def __init__(self, fail_models=(), latency=0, errors=None):
+        self.calls = []
+        self.streamed = []
+        self.fail_models = set(fail_models)
+        self.errors = errors or {}
+        self.latency = latency
+        self.aio = self
+        self.models = self
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if model in self.errors:
+            raise self.errors[model]
+        if model in self.fail_models:
+            raise Exception('429 RESOURCE_EXHAUSTED')
+        return mock.Mock(text=f'answer {len(self.calls)} from {model}')
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self.calls.append(model)
+        if model in self.fail_models:
+            raise Exception('429 RESOURCE_EXHAUSTED')
+
+        async def chunks():
+            for text in ('Data scientists ', 'analyse ', 'data.'):
+                await asyncio.sleep(self.latency)
+                self.streamed.append(text)
+                yield mock.Mock(text=text)
+        return chunks()
+
+
+ask = async_to_sync(ChatbotResponse.get_chatbot_response)
+
+
+def unlimited():
+    # No buckets and no in-flight limit, so tests are not throttled by each other
+    return mock.patch('chatapp.views.get_admission_controller', return_value=AdmissionController(LocalBucketStore()))
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.clock = mock.Mock(return_value=0.0)
+        self.cache = ResponseCache(LocalCacheBackend(max_entries=2, clock=self.clock), ttl=60)
+        self.gemini = StubGeminiClient()
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=LLMGateway(self.gemini)),
+            mock.patch('chatapp.views.get_response_cache', return_value=self.cache),
+            mock.patch('chatapp.views.retrieve_context', return_value='1) Data Scientist\nAnalyses data.'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_normalizes_questions(self):
+        self.assertEqual(normalize_question('  What does a Data   Scientist do?? '),
+                         'what does a data scientist do')
+
+    def test_repeated_question_is_answered_from_cache(self):
+        first = ask('What does a data scientist do?')
+        second = ask('what does a data scientist do')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.gemini.calls), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_context_change_misses(self):
+        ask('What does a data scientist do?')
+        with mock.patch('chatapp.views.retrieve_context', return_value='rebuilt context'):
+            ask('What does a data scientist do?')
+        self.assertEqual(len(self.gemini.calls), 2)
+
+    def test_fallback_model_answer_is_reused(self):
+        self.gemini.fail_models.add('models/gemini-2.5-flash')
+        ask('Who is a QA engineer?')
+        ask('Who is a QA engineer?')
+        self.assertEqual(self.gemini.calls, ['models/gemini-2.5-flash', 'models/gemini-2.0-flash'])
+
+    def test_entries_expire(self):
+        ask('What does a data scientist do?')
+        self.clock.return_value = 61.0
+        ask('What does a data scientist do?')
+        self.assertEqual(len(self.gemini.calls), 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for question in ('first', 'second', 'first', 'third', 'first', 'second'):
+            ask(question)
+        # 'second' was evicted by 'third', 'first' stayed recently used
+        self.assertEqual(len(self.gemini.calls), 4)
+        self.assertEqual(self.cache.stats()['evictions'], 2)
+
+    def test_stats_endpoint(self):
+        ask('What does a data scientist do?')
+        response = self.client.get('/api/chat/cache/')
+        self.assertEqual(response.json()['misses'], 1)
+
+
+class AsyncChatbotViewTests(TestCase):
+
+    def setUp(self):
+        self.gemini = StubGeminiClient(latency=0.3)
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=LLMGateway(self.gemini)),
+            mock.patch('chatapp.views.get_response_cache', return_value=ResponseCache(None)),
+            mock.patch('chatapp.views.retrieve_context', return_value='1) Data Scientist\nAnalyses data.'),
+
+            unlimited(),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_answers_json_post(self):
+        response = self.client.post('/api/chat/', {'message': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'response': 'answer 1 from models/gemini-2.5-flash'})
+
+    def test_rejects_missing_message_and_bad_json(self):
+        response = self.client.post('/api/chat/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/chat/', '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_concurrent_requests_overlap_on_the_asgi_path(self):
+        # Through the real ASGI handler from a fresh event loop, like a uvicorn worker.
+        # (An async test method would run sync middleware on the test's own thread.)
+        async def post_all():
+            transport = httpx.ASGITransport(app=ASGIHandler())
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await asyncio.gather(*(
+                    client.post('/api/chat/', json={'message': f'Question {i}'}) for i in range(10)
+                ))
+
+        started = time.perf_counter()
+        responses = asyncio.run(post_all())
+        elapsed = time.perf_counter() - started
+        self.assertEqual([response.status_code for response in responses], [200] * 10)
+        # Ten 0.3s LLM calls serialized would take 3s
+        self.assertLess(elapsed, 1.5)
+
+    def test_server_timing_on_the_asgi_path(self):
+        async def post():
+            transport = httpx.ASGITransport(app=ASGIHandler())
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await client.post('/api/chat/', json={'message': 'Hi'})
+
+        timing = asyncio.run(post()).headers['Server-Timing']
+        stages = [entry.split(';')[0] for entry in timing.split(', ')]
+        self.assertEqual(stages, ['context', 'prompt', 'cache', 'llm', 'total'])
+        self.assertIn('llm;dur=', timing)
+        self.assertIn('desc="models/gemini-2.5-flash"', timing)
+        llm_ms = float(timing.split('llm;dur=')[1].split(';')[0])
+        self.assertGreaterEqual(llm_ms, 300)
+
+
+class StreamingChatTests(TestCase):
+
+    def setUp(self):
+        self.gemini = StubGeminiClient(latency=0.2)
+        self.cache = ResponseCache(LocalCacheBackend())
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=LLMGateway(self.gemini)),
+            mock.patch('chatapp.views.get_response_cache', return_value=self.cache),
+            mock.patch('chatapp.views.retrieve_context', return_value='1) Data Scientist\nAnalyses data.'),
+
+            unlimited(),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, query='?stream=ndjson', **extra):
+        return self.client.post(f'/api/chat/{query}', {'message': 'What does a data scientist do?'},
+                                content_type='application/json', **extra)
+
+    def test_ndjson_chunks_then_done(self):
+        response = self.post()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([event['type'] for event in events], ['chunk', 'chunk', 'chunk', 'done'])
+        self.assertEqual(events[-1]['response'], 'Data scientists analyse data.')
+
+    def test_first_chunk_arrives_before_generation_ends(self):
+        started = time.perf_counter()
+        response = self.post()
+        first = next(iter(response.streaming_content))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(json.loads(first), {'type': 'chunk', 'text': 'Data scientists '})
+        self.assertLess(elapsed, 0.5)
+        b''.join(response.streaming_content)
+
+    def test_client_leaving_stops_the_upstream_stream(self):
+        response = self.post()
+        next(iter(response.streaming_content))
+        # What Django does when the client disconnects on the WSGI path
+        response.close()
+        time.sleep(0.6)
+        self.assertEqual(self.gemini.streamed, ['Data scientists '])
+        self.assertEqual(self.cache.stats()['stores'], 0)
+
+    def test_sse_from_accept_header(self):
+        response = self.post('', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('event: chunk\ndata: {"text": "Data scientists "}\n\n'))
+        self.assertIn('event: done\n', body)
+
+    def test_falls_back_before_first_chunk_and_caches(self):
+        self.gemini.fail_models.add('models/gemini-2.5-flash')
+        b''.join(self.post().streaming_content)
+        self.assertEqual(self.gemini.calls, ['models/gemini-2.5-flash', 'models/gemini-2.0-flash'])
+
+        # The streamed answer is reused by the JSON mode too
+        response = self.post('')
+        self.assertEqual(response.json(), {'response': 'Data scientists analyse data.'})
+        self.assertEqual(len(self.gemini.calls), 2)
+
+    def test_errors_are_sent_as_events(self):
+        self.gemini.fail_models.update(DEFAULT_MODELS)
+        events = [json.loads(line) for line in b''.join(self.post().streaming_content).splitlines()]
+        self.assertEqual(events[-1]['type'], 'error')
+
+    def test_unknown_stream_format(self):
+        self.assertEqual(self.post('?stream=xml').status_code, 400)
+
+
+class KeepAliveUpstreamTests(TestCase):
+    """The real Gemini client against the fake LLM, which keeps connections alive."""
+
+    def setUp(self):
+        self.server = FakeLLMServer(latency=0.01).start()
+        self.addCleanup(self.server.stop)
+        self.gateway = LLMGateway(PerLoopClient('test', self.server.url), models=DEFAULT_MODELS[:1])
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=self.gateway),
+            mock.patch('chatapp.views.get_response_cache', return_value=ResponseCache(None)),
+            mock.patch('chatapp.views.retrieve_context', return_value='1) Data Scientist\nAnalyses data.'),
+            unlimited(),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_consecutive_requests_on_the_wsgi_path(self):
+        # Each of them runs the async view on a new event loop
+        for i in range(4):
+            response = self.client.post('/api/chat/', {'message': f'Question {i}'}, content_type='application/json')
+            self.assertEqual((response.status_code, response.json()), (200, {'response': 'A fake answer.'}))
+        response = self.client.post('/api/chat/?stream=ndjson', {'message': 'Question 4'},
+                                    content_type='application/json')
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(events[-1], {'type': 'done', 'response': 'A fake answer.'})
+
+    def test_one_event_loop_reuses_its_connection(self):
+        async def ask_twice():
+            for _ in range(2):
+                await self.gateway.generate('prompt')
+
+        asyncio.run(ask_twice())
+        self.assertEqual((self.server.requests, self.server.connections), (2, 1))
+
+
+class APIErrorStub(Exception):
+    """Shaped like ``google.genai.errors.APIError``."""
+
+    def __init__(self, code, retry_after=None, details=None):
+        super().__init__(f'{code} error')
+        self.code = code
+        self.details = details
+        self.response = mock.Mock(headers={'retry-after': retry_after} if retry_after else {})
+
+
+class LLMGatewayTests(TestCase):
+    PRIMARY, SECONDARY = DEFAULT_MODELS[:2]
+
+    def setUp(self):
+        self.clock = mock.Mock(return_value=100.0)
+        self.gemini = StubGeminiClient()
+        self.gateway = LLMGateway(self.gemini, failure_threshold=2, cooldown=30, deadline=5, clock=self.clock)
+
+    def generate(self):
+        return async_to_sync(self.gateway.generate)('prompt')
+
+    def test_rate_limited_model_is_skipped_until_retry_after(self):
+        self.gemini.errors[self.PRIMARY] = APIErrorStub(429, retry_after='20')
+        self.assertEqual(self.generate()[0], self.SECONDARY)
+        self.assertEqual(self.generate()[0], self.SECONDARY)
+        self.assertEqual(self.gemini.calls, [self.PRIMARY, self.SECONDARY, self.SECONDARY])
+
+        # Half-open after the cooldown: one probe, which closes the breaker
+        del self.gemini.errors[self.PRIMARY]
+        self.clock.return_value = 121.0
+        self.assertEqual(self.generate()[0], self.PRIMARY)
+        stats = self.gateway.stats()['models'][self.PRIMARY]
+        self.assertEqual((stats['state'], stats['skipped'], stats['errors']['rate_limited']), ('closed', 1, 1))
+
+    def test_server_errors_open_after_threshold(self):
+        self.gemini.errors[self.PRIMARY] = APIErrorStub(503)
+        for _ in range(3):
+            self.generate()
+        self.assertEqual(self.gemini.calls.count(self.PRIMARY), 2)
+        self.assertEqual(self.gateway.stats()['models'][self.PRIMARY]['state'], 'open')
+
+    def test_failed_probe_reopens(self):
+        self.gemini.errors[self.PRIMARY] = APIErrorStub(404)
+        self.generate()
+        self.clock.return_value += self.gateway.not_found_cooldown
+        self.generate()
+        self.generate()
+        self.assertEqual(self.gemini.calls.count(self.PRIMARY), 2)
+
+    def test_other_errors_are_raised_without_fallback(self):
+        self.gemini.errors[self.PRIMARY] = APIErrorStub(400)
+        with self.assertRaises(APIErrorStub):
+            self.generate()
+        self.assertEqual(self.gemini.calls, [self.PRIMARY])
+        self.assertEqual(self.gateway.stats()['models'][self.PRIMARY]['state'], 'closed')
+
+    def test_all_models_open_fails_fast(self):
+        for model in DEFAULT_MODELS:
+            self.gemini.errors[model] = APIErrorStub(429, details={'error': {'details': [
+                {'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '12s'}]}})
+        with self.assertRaises(LLMUnavailable):
+            self.generate()
+        with self.assertRaises(LLMUnavailable) as raised:
+            self.generate()
+        self.assertEqual(len(self.gemini.calls), len(DEFAULT_MODELS))
+        self.assertEqual(raised.exception.retry_after, 12.0)
+
+    def test_deadline_caps_attempts(self):
+        gateway = LLMGateway(StubGeminiClient(latency=0.5), deadline=0.1)
+        started = time.perf_counter()
+        with self.assertRaises(LLMUnavailable):
+            async_to_sync(gateway.generate)('prompt')
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(gateway.stats()['models'][self.PRIMARY]['errors']['unavailable'], 1)
+
+    def test_retry_after_header_formats(self):
+        self.assertEqual(retry_after(APIErrorStub(429, retry_after='7')), 7.0)
+        self.assertIsNone(retry_after(APIErrorStub(429)))
+
+    def test_chat_view_returns_503_with_retry_after(self):
+        for model in DEFAULT_MODELS:
+            self.gemini.errors[model] = APIErrorStub(429, retry_after='9')
+        with mock.patch('chatapp.views.get_llm_gateway', return_value=self.gateway), \
+                mock.patch('chatapp.views.get_response_cache', return_value=ResponseCache(None)), \
+                mock.patch('chatapp.views.retrieve_context', return_value='context'), unlimited():
+            response = self.client.post('/api/chat/', {'message': 'Hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '9')
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        self.gemini = StubGeminiClient(latency=0.3)
+        self.flight = SingleFlight()
+        self.cache = ResponseCache(LocalCacheBackend())
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=LLMGateway(self.gemini)),
+            mock.patch('chatapp.views.get_response_cache', return_value=self.cache),
+            mock.patch('chatapp.views.retrieve_context', return_value='1) Cloud Engineer\nRuns clouds.'),
+            mock.patch('chatapp.views.get_singleflight', return_value=self.flight),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_identical_questions_share_one_call(self):
+        async def ask_all():
+            return await asyncio.gather(*(
+                ChatbotResponse.get_chatbot_response(question)
+                for question in ['Tell me about Cloud Computing careers?', 'tell me about cloud computing careers'] * 5
+            ))
+
+        answers = asyncio.run(ask_all())
+        self.assertEqual(len(set(answers)), 1)
+        self.assertEqual(len(self.gemini.calls), 1)
+        self.assertEqual((self.flight.leaders, self.flight.followers), (1, 9))
+
+    def test_coalesces_across_threads(self):
+        answers = []
+        threads = [threading.Thread(target=lambda: answers.append(ask('Cloud careers?'))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(answers), 4)
+        self.assertEqual(len(self.gemini.calls), 1)
+
+    def test_followers_get_the_leaders_error(self):
+        self.gemini.fail_models.update(DEFAULT_MODELS)
+
+        async def ask_all():
+            return await asyncio.gather(*(ChatbotResponse.get_chatbot_response('Cloud?') for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(ask_all())
+        self.assertTrue(all(isinstance(result, LLMUnavailable) for result in results))
+        self.assertEqual(len(self.gemini.calls), len(DEFAULT_MODELS))
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_waits_for_another_worker_through_the_cache_lock(self):
+        from django.core.cache import cache as django_cache
+
+        shared = ResponseCache(DjangoCacheBackend())
+        lock = CacheLock(poll_interval=0.02)
+        context = '1) Cloud Engineer\nRuns clouds.'
+        key = flight_key('chat', 'Cloud careers?', context)
+        # Another worker holds the lock and publishes its answer a little later
+        django_cache.add(f'{key}:lock', 'other-worker', 60)
+        self.addCleanup(django_cache.clear)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await shared.astore('chat', 'Cloud careers?', DEFAULT_MODELS[0], context, 'answer from worker 2')
+            await django_cache.adelete(f'{key}:lock')
+
+        async def scenario():
+            answer, _ = await asyncio.gather(ChatbotResponse.get_chatbot_response('Cloud careers?'), other_worker())
+            return answer
+
+        with mock.patch('chatapp.views.get_response_cache', return_value=shared), \
+                mock.patch('chatapp.views.get_cache_lock', return_value=lock):
+            self.assertEqual(asyncio.run(scenario()), 'answer from worker 2')
+        self.assertEqual(self.gemini.calls, [])
+
+
+class AdmissionControlTests(TestCase):
+
+    def setUp(self):
+        self.clock = mock.Mock(return_value=1000.0)
+        self.gemini = StubGeminiClient()
+        patches = [
+            mock.patch('chatapp.views.get_llm_gateway', return_value=LLMGateway(self.gemini)),
+            mock.patch('chatapp.views.get_response_cache', return_value=ResponseCache(None)),
+            mock.patch('chatapp.views.retrieve_context', return_value='context'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def use(self, controller):
+        patch = mock.patch('chatapp.views.get_admission_controller', return_value=controller)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return controller
+
+    def post(self, query='', address='10.0.0.1', **extra):
+        return self.client.post(f'/api/chat/{query}', {'message': 'Hi'}, content_type='application/json',
+                                REMOTE_ADDR=address, **extra)
+
+    def test_client_over_its_burst_gets_429_until_refilled(self):
+        controller = self.use(AdmissionController(
+            LocalBucketStore(), client_bucket=TokenBucket(rate=0.5, capacity=2), clock=self.clock))
+        statuses = [self.post().status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        rejected = self.post()
+        self.assertEqual(rejected['Retry-After'], '2')
+        # Other clients have their own bucket
+        self.assertEqual(self.post(address='10.0.0.2').status_code, 200)
+        self.clock.return_value += 2
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(len(self.gemini.calls), 4)
+        self.assertEqual(controller.stats()['rejected']['client_rate'], 2)
+
+    def test_global_bucket_gets_503(self):
+        self.use(AdmissionController(LocalBucketStore(), global_bucket=TokenBucket(rate=1, capacity=2),
+                                     clock=self.clock))
+        statuses = [self.post(address=f'10.0.0.{i}').status_code for i in range(3)]
+        self.assertEqual(statuses, [200, 200, 503])
+
+    def test_503_from_the_global_bucket_keeps_the_clients_quota(self):
+        self.use(AdmissionController(LocalBucketStore(), client_bucket=TokenBucket(rate=0.01, capacity=2),
+                                     global_bucket=TokenBucket(rate=1, capacity=1), clock=self.clock))
+        self.assertEqual([self.post().status_code for _ in range(2)], [200, 503])
+        self.clock.return_value += 1
+        self.assertEqual(self.post().status_code, 200)
+
+    def test_full_in_flight_gets_503_and_slots_are_returned(self):
+        controller = self.use(AdmissionController(LocalBucketStore(), max_in_flight=1))
+        held = async_to_sync(controller.admit)(mock.Mock(META={}))
+        response = self.post()
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        held.release()
+        held.release()
+        self.assertEqual(self.post().status_code, 200)
+        b''.join(self.post('?stream=ndjson').streaming_content)
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_bad_requests_are_not_counted(self):
+        controller = self.use(AdmissionController(LocalBucketStore(), client_bucket=TokenBucket(1, 1)))
+        self.client.post('/api/chat/', {}, content_type='application/json')
+        self.assertEqual(controller.stats()['admitted'], 0)
+
+    def test_workers_share_buckets_through_the_cache(self):
+        from django.core.cache import cache as django_cache
+
+        self.addCleanup(django_cache.clear)
+        bucket = TokenBucket(rate=0.1, capacity=2)
+        workers = [AdmissionController(CacheBucketStore(), client_bucket=bucket, clock=self.clock) for _ in range(2)]
+        request = mock.Mock(META={'REMOTE_ADDR': '10.0.0.1'})
+        async_to_sync(workers[0].admit)(request).release()
+        async_to_sync(workers[1].admit)(request).release()
+        with self.assertRaises(Overloaded) as raised:
+            async_to_sync(workers[0].admit)(request)
+        self.assertEqual((raised.exception.status, raised.exception.retry_after), (429, 10.0))
+
+        # A bucket another request is updating is refused instead of waited on
+        self.clock.return_value += 100
+        django_cache.add('llm-admission:client:10.0.0.1:lock', 1, 60)
+        with self.assertRaises(Overloaded) as raised:
+            async_to_sync(workers[1].admit)(request)
+        self.assertEqual(raised.exception.status, 429)
+        django_cache.delete('llm-admission:client:10.0.0.1:lock')
+
+        # A lock that expired during the update and was taken by another worker is left to it
+        def take_while_lock_expires(state, now):
+            django_cache.set('llm-admission:client:10.0.0.1:lock', 'other-worker', 60)
+            return bucket.take(state, now)
+
+        slow_bucket = mock.Mock(wraps=bucket, take=take_while_lock_expires, idle_ttl=bucket.idle_ttl)
+        async_to_sync(CacheBucketStore().take)('llm-admission:client:10.0.0.1', slow_bucket, self.clock())
+        self.assertEqual(django_cache.get('llm-admission:client:10.0.0.1:lock'), 'other-worker')
+
+    def test_client_address_behind_trusted_proxies(self):
+        request = mock.Mock(META={'REMOTE_ADDR': '10.0.0.254', 'HTTP_X_FORWARDED_FOR': '1.1.1.1, 2.2.2.2, 10.0.0.9'})
+        self.assertEqual(AdmissionController(None).client_id(request), '10.0.0.254')
+        self.assertEqual(AdmissionController(None, trusted_proxies=1).client_id(request), '10.0.0.9')
+        self.assertEqual(AdmissionController(None, trusted_proxies=2).client_id(request), '2.2.2.2')
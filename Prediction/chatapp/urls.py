@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import ChatbotView
+from .views import ChatCacheStatsView, ChatbotView, LLMHealthView
 
 urlpatterns = [
-    path('chat/',ChatbotView.as_view(),name="chatbot")
+    path('chat/',ChatbotView.as_view(),name="chatbot"),
+    path('chat/cache/', ChatCacheStatsView.as_view(), name='chat_cache_stats'),
+    path('chat/models/', LLMHealthView.as_view(), name='llm_health'),
 ]
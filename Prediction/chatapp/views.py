@@ -1,117 +1,268 @@
 from django.shortcuts import render
-import os
+import json
+import logging
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
-from PyPDF2 import PdfReader
+from django.conf import settings
 
-# Load environment variables
+from utils.admission import Overloaded, get_admission_controller, overloaded_response
+from utils.documents import JOB_ROLES_PDF, DocumentUnavailable, get_document_store
+from utils.http import iterate_in_thread, read_request_data
+from utils.llm_gateway import LLMUnavailable, get_llm_gateway
+from utils.response_cache import get_response_cache
+from utils.retrieval import retrieve_context
+from utils.singleflight import flight_key, get_cache_lock, get_singleflight
+from utils.timing import span
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables, the Gemini client is created by utils.llm_gateway
 load_dotenv()
-API_KEY = os.environ.get("GOOGLE_API_KEY")
 
-# Initialize Gemini client
-client = None
-if API_KEY:
-    client = genai.Client(api_key=API_KEY)
-else:
-    print("Warning: GOOGLE_API_KEY not found in environment variables")
 
+STREAM_CONTENT_TYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def render_event(stream_format, event, payload):
+    """One Server-Sent Event, or one NDJSON line with the event name as ``type``."""
+    if stream_format == 'sse':
+        return f'event: {event}\ndata: {json.dumps(payload)}\n\n'
+    return json.dumps(dict(payload, type=event)) + '\n'
+
+
+# An async view: under ASGI (backend.asgi) a slow Gemini call only suspends this
+# request instead of pinning a worker. Under WSGI it still runs, one request per worker.
+@method_decorator(csrf_exempt, name='dispatch')
+class ChatbotView(View):
 
-class ChatbotView(APIView):
+    async def post(self, request):
+        # JSON by default, ?stream=sse or ?stream=ndjson (or Accept: text/event-stream)
+        # sends the answer piece by piece as Gemini generates it
+        stream_format = request.GET.get('stream')
+        if stream_format is None and 'text/event-stream' in request.headers.get('Accept', ''):
+            stream_format = 'sse'
+        if stream_format is not None and stream_format not in STREAM_CONTENT_TYPES:
+            return JsonResponse({'error': f'stream must be one of {", ".join(STREAM_CONTENT_TYPES)}'},
+                                status=status.HTTP_400_BAD_REQUEST)
 
-    def post(self, request):
         try:
-            user_message = request.data.get('message')
+            try:
+                user_message = read_request_data(request).get('message')
+            except ValueError as e:
+                return JsonResponse({'error': f'Invalid request body: {e}'}, status=status.HTTP_400_BAD_REQUEST)
             if not user_message:
-                return Response({'error': 'Message not provided'}, status=status.HTTP_400_BAD_REQUEST)
+                return JsonResponse({'error': 'Message not provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if not client:
-                return Response({
+            if not get_llm_gateway().configured:
+                return JsonResponse({
                     'error': 'GOOGLE_API_KEY not configured. Please set it in the .env file.'
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            response = ChatbotResponse.get_chatbot_response(user_message)
-            
-            return Response({
+            # Refuse at once when this client or the whole service asks too much,
+            # see utils/admission.py
+            ticket = await get_admission_controller().admit(request)
+
+            if stream_format:
+                return self.stream(request, user_message, stream_format, ticket)
+
+            try:
+                response = await ChatbotResponse.get_chatbot_response(user_message)
+            finally:
+                ticket.release()
+
+            return JsonResponse({
                 'response': response if isinstance(response, str) else str(response)
             })
+        except Overloaded as e:
+            return overloaded_response(e)
+        except LLMUnavailable as e:
+            # Every model failed or is cooling down, tell the client when to come back
+            response = JsonResponse({'error': f'An error occurred: {str(e)}'},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            if e.retry_after:
+                response['Retry-After'] = str(int(e.retry_after + 0.999))
+            return response
         except Exception as e:
-            return Response({
+            return JsonResponse({
                 'error': f'An error occurred: {str(e)}. Please check your GOOGLE_API_KEY is set in the backend .env file.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
+
+    @staticmethod
+    def stream(request, user_message, stream_format, ticket):
+        async def events():
+            parts = []
+            try:
+                async for text in ChatbotResponse.stream_chatbot_response(user_message):
+                    parts.append(text)
+                    yield render_event(stream_format, 'chunk', {'text': text})
+            except Exception as e:
+                # Headers are already sent, so errors are reported in the stream
+                logger.exception("Error in stream_chatbot_response")
+                yield render_event(stream_format, 'error', {'error': f'An error occurred: {e}'})
+                return
+            finally:
+                ticket.release()
+            yield render_event(stream_format, 'done', {'response': ''.join(parts)})
+
+        # Under WSGI Django would buffer an async iterator, so feed it from a thread
+        content = events() if isinstance(request, ASGIRequest) else iterate_in_thread(events())
+        response = StreamingHttpResponse(content, content_type=STREAM_CONTENT_TYPES[stream_format])
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx-style proxies from holding chunks back
+        response['X-Accel-Buffering'] = 'no'
+        # Also give the slot back when the client leaves before the stream started
+        response._resource_closers.append(ticket.release)
+        return response
+
+
+class ChatCacheStatsView(APIView):
+    def get(self, request):
+        return Response(dict(get_response_cache().stats(), singleflight=get_singleflight().stats()),
+                        status=status.HTTP_200_OK)
+
+
+class LLMHealthView(APIView):
+    def get(self, request):
+        return Response(dict(get_llm_gateway().stats(), admission=get_admission_controller().stats()),
+                        status=status.HTTP_200_OK)
+
 
 class ChatbotResponse:
 
-    _pdf_content = None  # Cache PDF content
-     
     @staticmethod
     def get_pdf_text():
-        if ChatbotResponse._pdf_content:
-            return ChatbotResponse._pdf_content
-            
-        file_path = os.path.join(os.path.dirname(__file__), "../datasets/docs/Job_Roles.pdf")
-        text = ""
+        # Extracted once and shared with the other app through the document store
         try:
-            with open(file_path, 'rb') as pdf_docs:
-                pdf_reader = PdfReader(pdf_docs)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-            ChatbotResponse._pdf_content = text
-        except Exception as e:
+            return get_document_store().get_text(JOB_ROLES_PDF)
+        except DocumentUnavailable as e:
             print(f"Error reading PDF: {e}")
-            text = "Career guidance information not available."
-        return text
+            return "Career guidance information not available."
 
     @staticmethod
-    def get_chatbot_response(user_message):
+    def get_context(user_message):
+        # Only the chunks of the PDF relevant to the question go into the prompt
         try:
-            # Get context from PDF
-            context = ChatbotResponse.get_pdf_text()
+            return retrieve_context(user_message, k=getattr(settings, 'CONTEXT_TOP_K', 3))
+        except Exception as e:
+            print(f"Context retrieval failed, using the PDF prefix: {e}")
+            return ChatbotResponse.get_pdf_text()[:8000]
 
-            # Create prompt with context
-            prompt = f"""You are a helpful career guidance assistant. Use the following context about job roles to answer the user's question.
+    @staticmethod
+    def build_prompt(user_message, context):
+        return f"""You are a helpful career guidance assistant. Use the following context about job roles to answer the user's question.
             
 Context:
-{context[:8000]}
+{context}
 
 User Question: {user_message}
 
 Please provide a helpful, detailed answer based on the context. If the answer is not in the context, say so and provide general career guidance."""
 
-            # Use available models from Google GenAI - models need "models/" prefix
-            models_to_try = ["models/gemini-2.5-flash", "models/gemini-2.0-flash", "models/gemini-flash-latest", "models/gemini-pro-latest"]
-            
-            for model_name in models_to_try:
-                try:
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=prompt,
-                        config=types.GenerateContentConfig(
-                            temperature=0.3,
-                            max_output_tokens=1024,
-                        )
-                    )
-                    return response.text
-                except Exception as model_error:
-                    error_str = str(model_error)
-                    # If 404 (model not found) or quota exceeded, try next model
-                    if "404" in error_str or "NOT_FOUND" in error_str or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
-                        if model_name == models_to_try[-1]:  # Last model failed
-                            raise Exception(f"All models failed. Error: {error_str}")
-                        continue  # Try next model
-                    else:
-                        # Other error, raise it
-                        raise
-            
-            raise Exception("Failed to generate response with any available model")
-            
+    @staticmethod
+    def generation_config():
+        return types.GenerateContentConfig(
+            temperature=0.3,
+            max_output_tokens=1024,
+        )
+
+    @staticmethod
+    async def get_chatbot_response(user_message):
+        try:
+            # Get context from PDF, off the event loop (the first call may extract the PDF)
+            with span('context'):
+                context = await sync_to_async(ChatbotResponse.get_context, thread_sensitive=False)(user_message)
+
+            # Create prompt with context
+            with span('prompt'):
+                prompt = ChatbotResponse.build_prompt(user_message, context)
+            gateway = get_llm_gateway()
+
+            # Repeated questions are answered from the cache, see utils/response_cache.py
+            cache = get_response_cache()
+            with span('cache'):
+                cached = await cache.alookup('chat', user_message, gateway.models, context)
+            if cached is not None:
+                return cached
+
+            async def generate():
+                # The gateway walks the model fallback chain, skipping models known to be down
+                model_name, text = await gateway.generate(prompt, ChatbotResponse.generation_config())
+                await cache.astore('chat', user_message, model_name, context, text)
+                return text
+
+            if not getattr(settings, 'LLM_SINGLEFLIGHT', True):
+                return await generate()
+
+            async def cached_answer():
+                return await cache.alookup('chat', user_message, gateway.models, context, record=False)
+
+            # Identical questions asked at the same time share one Gemini call
+            key = flight_key('chat', user_message, context)
+            return await get_singleflight().do(key, lambda: ChatbotResponse.generate_once(key, generate, cached_answer))
+
         except Exception as e:
             print(f"Error in get_chatbot_response: {e}")
             raise
+
+    @staticmethod
+    async def generate_once(key, generate, cached_answer):
+        """
+        Run ``generate`` unless another worker is already answering ``key``,
+        then wait for its answer to show up in the shared cache instead.
+        """
+        lock = get_cache_lock()
+        if lock is None:
+            return await generate()
+        if not await lock.acquire(key):
+            answer = await lock.wait(key, cached_answer, getattr(settings, 'LLM_DEADLINE', 30))
+            if answer is not None:
+                return answer
+            return await generate()
+        try:
+            return await generate()
+        finally:
+            await lock.release(key)
+
+    @staticmethod
+    async def stream_chatbot_response(user_message):
+        """
+        Yield the answer in pieces as the model generates them.
+
+        Falls back to the next model only until the first piece was sent, a
+        cached answer is yielded whole.
+        """
+        with span('context'):
+            context = await sync_to_async(ChatbotResponse.get_context, thread_sensitive=False)(user_message)
+        with span('prompt'):
+            prompt = ChatbotResponse.build_prompt(user_message, context)
+        gateway = get_llm_gateway()
+
+        cache = get_response_cache()
+        with span('cache'):
+            cached = await cache.alookup('chat', user_message, gateway.models, context)
+        if cached is not None:
+            yield cached
+            return
+
+        model_name = None
+        parts = []
+        async for model_name, text in gateway.stream(prompt, ChatbotResponse.generation_config()):
+            parts.append(text)
+            yield text
+        if parts:
+            await cache.astore('chat', user_message, model_name, context, ''.join(parts))
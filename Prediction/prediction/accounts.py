@@ -0,0 +1,105 @@
+"""
+Sign-in against the accounts created by ``/api/auth/signup/`` (``UserModel``).
+
+Sign-in used to go through ``django.contrib.auth.authenticate``, which
+searches ``auth_user``, a table signup never writes to, so it could not
+succeed. ``find_user`` is the one lookup of a sign-in: a single query on the
+unique (and so indexed) ``email`` column, loading only the columns sign-in
+needs.
+
+Passwords are stored as Django password hashes (see ``hashers``). When a
+password verifies but its hash is outdated (other iterations or algorithm),
+it is rehashed on a background thread after the response, so the sign-in
+pays for one hash, not two. The update only applies while the row still has
+the hash that was verified, a password changed in the meantime is kept.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import close_old_connections
+
+from .models import UserModel
+
+logger = logging.getLogger(__name__)
+
+SIGNIN_FIELDS = ('id', 'name', 'email', 'password')
+
+
+def find_user(email):
+    """The account registered with ``email`` (exact match) or None."""
+    try:
+        return UserModel.objects.only(*SIGNIN_FIELDS).get(email=email)
+    except UserModel.DoesNotExist:
+        return None
+
+
+def check_credentials(email, password):
+    """The account when ``password`` is its password, else None."""
+    user = find_user(email)
+    if user is None:
+        # Hash anyway, so unknown emails take as long to refuse as wrong passwords
+        make_password(password)
+        return None
+    if not check_password(password, user.password, setter=lambda raw: schedule_rehash(user, raw)):
+        return None
+    return user
+
+
+def rehash(user_id, old_hash, password):
+    """Store ``password`` hashed at the current cost, unless the hash changed since."""
+    try:
+        updated = UserModel.objects.filter(pk=user_id, password=old_hash).update(password=make_password(password))
+        logger.info(f"Rehashed the password of user {user_id}" if updated else
+                    f"Password of user {user_id} changed before it was rehashed")
+    finally:
+        # This thread's connection is not closed by a request ending
+        close_old_connections()
+
+
+class Rehasher:
+    """Rehashes on one background thread, at most one pending job per account."""
+
+    def __init__(self, workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-rehash')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, old_hash, password):
+        with self._lock:
+            if user_id in self._pending:
+                return None
+            self._pending.add(user_id)
+        return self._executor.submit(self._run, user_id, old_hash, password)
+
+    def _run(self, user_id, old_hash, password):
+        try:
+            rehash(user_id, old_hash, password)
+        except Exception as e:
+            # The old hash still verifies, the next sign-in tries again
+            logger.error(f"Rehashing the password of user {user_id} failed: {e!r}")
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+
+_rehasher = None
+_rehasher_lock = threading.Lock()
+
+
+def get_rehasher():
+    global _rehasher
+    if _rehasher is None:
+        with _rehasher_lock:
+            if _rehasher is None:
+                _rehasher = Rehasher()
+    return _rehasher
+
+
+def schedule_rehash(user, password):
+    get_rehasher().submit(user.pk, user.password, password)
@@ -1,6 +1,29 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class PredictionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prediction'
+
+    def ready(self):
+        # Load the model once per process (or once in the gunicorn master with
+        # --preload) instead of on every quiz submission.
+        if getattr(settings, 'PREDICTION_PRELOAD_MODEL', False):
+            from .model_registry import get_registry
+            try:
+                get_registry().get()
+            except Exception as e:
+                # Don't block startup, PredictionView reports the error per request
+                logger.error("Could not preload prediction model: %s", e)
+
+        if getattr(settings, 'PRELOAD_SENTIMENT', False):
+            from utils.utility import get_sentiment_engine
+            try:
+                get_sentiment_engine().load()
+            except Exception as e:
+                logger.error("Could not preload sentiment resources: %s", e)
@@ -0,0 +1,173 @@
+"""
+Versioned, scikit-learn independent model artifacts.
+
+An artifact is a directory holding ``manifest.json`` and one raw ``.npy``
+file per array. Trees of a forest are concatenated into the same arrays,
+``node_offsets`` marks where each tree starts and child indices are local to
+their tree::
+
+    dtmodel/
+        manifest.json
+        children_left.npy  children_right.npy  feature.npy
+        threshold.npy  value.npy  node_offsets.npy
+
+Arrays are loaded with ``np.load(mmap_mode='r')``, so every worker process
+maps the same page-cached file instead of unpickling a private copy, and
+serving does not need scikit-learn (or a matching version of it) at all.
+"""
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .inference import FlatForest, FlatTree
+
+FORMAT_NAME = 'career-path-tree-model'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+ARRAY_DTYPES = {
+    'children_left': np.int64,
+    'children_right': np.int64,
+    'feature': np.int64,
+    'threshold': np.float64,
+    'value': np.float64,
+    'node_offsets': np.int64,
+}
+
+
+class ArtifactError(Exception):
+    """Raised for a missing, corrupt or unsupported model artifact."""
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def manifest_path(path):
+    return os.path.join(path, MANIFEST_NAME)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _flat_trees(engine):
+    if isinstance(engine, FlatForest):
+        return 'random_forest', engine.trees
+    if isinstance(engine, FlatTree):
+        return 'decision_tree', [engine]
+    raise ArtifactError(f'Cannot export {type(engine).__name__}')
+
+
+def export_artifact(engine, output_dir, feature_names=None, source=None):
+    """
+    Write ``engine`` (a ``FlatTree`` or ``FlatForest``) to ``output_dir``.
+
+    ``source`` is free-form provenance recorded in the manifest, e.g. the
+    pickle path, its hash and the sklearn version it was trained with.
+    """
+    kind, trees = _flat_trees(engine)
+    offsets = np.zeros(len(trees) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([tree.node_count for tree in trees])
+    arrays = {
+        'children_left': np.concatenate([tree.children_left for tree in trees]),
+        'children_right': np.concatenate([tree.children_right for tree in trees]),
+        'feature': np.concatenate([tree.feature for tree in trees]),
+        'threshold': np.concatenate([tree.threshold for tree in trees]),
+        'value': np.concatenate([tree.value for tree in trees]),
+        'node_offsets': offsets,
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    entries = {}
+    for name, array in arrays.items():
+        filename = f'{name}.npy'
+        path = os.path.join(output_dir, filename)
+        np.save(path, np.ascontiguousarray(array, dtype=ARRAY_DTYPES[name]), allow_pickle=False)
+        entries[name] = {
+            'file': filename,
+            'dtype': np.dtype(ARRAY_DTYPES[name]).str,
+            'shape': list(array.shape),
+            'sha256': _file_sha256(path),
+        }
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'n_trees': len(trees),
+        'n_features': len(feature_names) if feature_names is not None else None,
+        'feature_names': list(feature_names) if feature_names is not None else None,
+        'classes': [c.item() if hasattr(c, 'item') else c for c in engine.classes_],
+        'max_depth': max(tree.max_depth for tree in trees),
+        'arrays': entries,
+        'source': source or {},
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    # Write the manifest last and atomically, it is what marks the artifact complete
+    tmp_path = manifest_path(output_dir) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(output_dir))
+    return manifest
+
+
+def read_manifest(path):
+    try:
+        with open(manifest_path(path)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f'No {MANIFEST_NAME} in {path}')
+    except ValueError as e:
+        raise ArtifactError(f'Invalid {MANIFEST_NAME} in {path}: {e}')
+    if manifest.get('format') != FORMAT_NAME:
+        raise ArtifactError(f'{path} is not a {FORMAT_NAME} artifact')
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f'Unsupported artifact format version {manifest.get("format_version")}')
+    return manifest
+
+
+def load_artifact(path, mmap=True, verify=False):
+    """
+    Load an artifact directory into a ``FlatTree`` or ``FlatForest``.
+
+    With ``mmap`` the arrays are read-only memory maps. ``verify`` checks each
+    file against the hash recorded in the manifest (it reads every byte).
+    """
+    manifest = read_manifest(path)
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        file_path = os.path.join(path, entry['file'])
+        if verify and _file_sha256(file_path) != entry['sha256']:
+            raise ArtifactError(f'Checksum mismatch for {file_path}')
+        array = np.load(file_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        if array.dtype.str != entry['dtype'] or list(array.shape) != entry['shape']:
+            raise ArtifactError(f'{file_path} does not match the manifest')
+        arrays[name] = array
+
+    classes = np.asarray(manifest['classes'])
+    offsets = arrays['node_offsets']
+    trees = []
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        # Slices of a memory map are views, no data is copied here
+        trees.append(FlatTree(
+            arrays['children_left'][start:end],
+            arrays['children_right'][start:end],
+            arrays['feature'][start:end],
+            arrays['threshold'][start:end],
+            arrays['value'][start:end],
+            classes,
+            normalize=False,
+        ))
+    if manifest['kind'] == 'random_forest':
+        engine = FlatForest(trees, classes)
+    else:
+        engine = trees[0]
+    return engine, manifest
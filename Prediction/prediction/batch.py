@@ -0,0 +1,131 @@
+"""
+Batch scoring of quiz submissions.
+
+Rows are encoded into one NumPy matrix per chunk and scored with a single
+``predict_proba`` call, the predicted class is the argmax of that call and
+the top-k recommendations are ranked from the same matrix.
+Rows can use the quiz API field names (``question1`` .. ``question19``) or
+the column layout of ``datasets/prediction-data.csv``, see ``features``.
+"""
+import csv
+import io
+import json
+
+import numpy as np
+
+from utils.timing import span
+
+from .features import FEATURE_COLUMNS, N_FEATURES, QUESTION_FIELDS, encoder
+from .recommendations import recommendations
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+class BatchInputError(ValueError):
+    """Raised for input that cannot be read as a batch at all."""
+
+
+def _score_chunk(model, chunk, offset, top_k=None):
+    matrix = np.empty((len(chunk), N_FEATURES), dtype=np.int32)
+    valid = np.ones(len(chunk), dtype=bool)
+    errors = {}
+    with span('encode'):
+        for i, row in enumerate(chunk):
+            try:
+                encoder.encode_row(row, matrix[i])
+            except KeyError as e:
+                valid[i] = False
+                errors[i] = f'Invalid option selected: {str(e)}'
+            except (TypeError, ValueError) as e:
+                valid[i] = False
+                errors[i] = f'Invalid value: {str(e)}'
+
+    if valid.any():
+        with span('predict'):
+            proba = model.predict_proba(matrix[valid])
+        best = proba.argmax(axis=1)
+        classes = model.classes_[best]
+        best_proba = proba[np.arange(len(best)), best]
+        ranked = recommendations(proba, model.classes_, top_k) if top_k is not None else None
+    scored = 0
+    for i in range(len(chunk)):
+        if valid[i]:
+            result = {
+                'row': offset + i,
+                'prediction': classes[scored].item(),
+                'probability': float(best_proba[scored]),
+            }
+            if ranked is not None:
+                result['recommendations'] = ranked[scored]
+            yield result
+            scored += 1
+        else:
+            yield {'row': offset + i, 'error': errors[i]}
+
+
+def score_rows(model, rows, chunk_size=DEFAULT_CHUNK_SIZE, top_k=None):
+    """Yield one result dict per input row, in input order, with ``top_k`` recommendations if given."""
+    chunk = []
+    offset = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _score_chunk(model, chunk, offset, top_k)
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        yield from _score_chunk(model, chunk, offset, top_k)
+
+
+def read_json_rows(data):
+    """Accept a list of rows or ``{"rows": [...]}``."""
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise BatchInputError('Expected a JSON array of quiz submissions')
+    for row in data:
+        if not isinstance(row, dict):
+            raise BatchInputError('Each quiz submission must be a JSON object')
+    return data
+
+
+def read_csv_rows(stream):
+    """Read rows from a text or binary CSV stream in the prediction-data.csv layout."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    missing = [c for c in FEATURE_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing and not set(QUESTION_FIELDS) <= set(reader.fieldnames or []):
+        raise BatchInputError(f'CSV is missing columns: {", ".join(missing)}')
+    return reader
+
+
+RESULT_FIELDS = ['row', 'prediction', 'probability', 'error']
+
+
+def render_ndjson(results, fields=RESULT_FIELDS):
+    for result in results:
+        yield json.dumps(result) + '\n'
+
+
+def render_csv(results, fields=RESULT_FIELDS):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for result in results:
+        if 'recommendations' in result:
+            # One cell, the list as JSON
+            result = dict(result, recommendations=json.dumps(result['recommendations']))
+        writer.writerow(result)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header when there were no rows
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+RENDERERS = {
+    'ndjson': (render_ndjson, 'application/x-ndjson'),
+    'csv': (render_csv, 'text/csv'),
+}
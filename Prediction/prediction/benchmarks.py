@@ -0,0 +1,331 @@
+"""
+Benchmarks for serving the career prediction model.
+
+Every case times a callable repeatedly on rows of
+``datasets/prediction-data.csv`` and reports per-call latency percentiles and
+row throughput, so a change to the model loader, the encoder or the inference
+engine shows up as a number in the JSON written by
+``manage.py benchmark_prediction``. Two such reports can be compared with
+``compare()``, which lists the cases whose median got slower.
+
+Cases:
+
+- ``load.*``: deserializing the configured model (pickle or artifact).
+- ``encode.*``: the feature encoder, one row, a list of rows, a DataFrame.
+- ``predict_proba.<engine>.<rows>``: scoring pre-encoded matrices with the
+  served engine and, for pickles, the sklearn estimator it was built from.
+- ``http.*``: ``POST /api/get/quiz/`` through Django's test client, with the
+  prediction result cache disabled and with a repeated submission.
+- ``auth.signin.*`` (only with ``--suite auth``): ``POST /api/auth/signin/``
+  through Django's WSGI handler, closing the database connection after every
+  request (``CONN_MAX_AGE`` 0) and keeping it, with the number of connections
+  opened per request. Creates a temporary account in the configured database
+  and uses a cheap password hash, so the connection cost is not drowned out.
+- ``auth.password.<iterations>``: verifying a password at each hashing cost,
+  including ``PASSWORD_HASH_ITERATIONS``, with the sign-ins one CPU core can
+  verify per second at that cost.
+"""
+import gc
+import io
+import json
+import os
+import platform
+import secrets
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from .features import FEATURES, encode_frame, encoder
+from .training import DATASET_PATH
+
+BATCH_SIZES = (1, 64, 1024)
+PASSWORD_ITERATIONS = (100000, 260000, 480000, 720000, 1000000)
+SIGNIN_BENCH_ITERATIONS = 1000
+
+
+def measure(fn, repeat, rows=1, warmup=1):
+    """Call ``fn`` ``repeat`` times and summarize the wall time of each call."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        'calls': repeat,
+        'rows_per_call': rows,
+        'mean_us': round(statistics.fmean(timings) * 1e6, 2),
+        'p50_us': round(median * 1e6, 2),
+        'p95_us': round(timings[min(repeat - 1, int(0.95 * repeat))] * 1e6, 2),
+        'min_us': round(timings[0] * 1e6, 2),
+        'rows_per_second': round(rows / median, 1) if median else None,
+    }
+
+
+def load_rows(path=DATASET_PATH, limit=None):
+    """The dataset as a DataFrame in the CSV layout and as quiz API submissions."""
+    import pandas as pd
+
+    data = pd.read_csv(path, nrows=limit)
+    submissions = [
+        {feature.field: str(value) for feature, value in zip(FEATURES, values)}
+        for values in data[[feature.column for feature in FEATURES]].itertuples(index=False)
+    ]
+    return data, submissions
+
+
+def _cycle(items):
+    state = {'i': 0}
+
+    def next_item():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return next_item
+
+
+def bench_load(path, repeat):
+    from .model_registry import ModelRegistry
+
+    results = {'load.model': measure(lambda: ModelRegistry(path).load(), repeat, warmup=0)}
+    if not os.path.isdir(path):
+        # Without the flat tree: what the sklearn estimator alone costs to load
+        results['load.model_sklearn_only'] = measure(
+            lambda: ModelRegistry(path, flat_tree=False).load(), repeat, warmup=0)
+    return results
+
+
+def bench_encode(data, submissions, repeat):
+    next_submission = _cycle(submissions)
+    batch = submissions[:1024]
+    frame = data.iloc[:1024]
+    return {
+        'encode.one': measure(lambda: encoder.encode_one(next_submission()), repeat * 10),
+        f'encode.many.{len(batch)}': measure(lambda: encoder.encode_many(batch), repeat, rows=len(batch)),
+        f'encode.frame.{len(frame)}': measure(lambda: encode_frame(frame), repeat, rows=len(frame)),
+    }
+
+
+def bench_predict(model, matrix, repeat):
+    engines = {type(model.predictor).__name__: model.predictor}
+    if model.estimator is not None and model.estimator is not model.predictor:
+        engines['sklearn'] = model.estimator
+    results = {}
+    for name, engine in engines.items():
+        rows = [np.ascontiguousarray(matrix[i:i + 1]) for i in range(min(len(matrix), 256))]
+        next_row = _cycle(rows)
+        results[f'predict_proba.{name}.1'] = measure(lambda: engine.predict_proba(next_row()), repeat * 10)
+        for size in sorted({min(size, len(matrix)) for size in BATCH_SIZES[1:] + (len(matrix),)}):
+            batch = np.ascontiguousarray(matrix[:size])
+            results[f'predict_proba.{name}.{len(batch)}'] = measure(
+                lambda: engine.predict_proba(batch), repeat, rows=len(batch))
+    return results
+
+
+def bench_http(submissions, repeat):
+    from django.test import Client
+
+    from .model_registry import get_registry
+
+    client = Client()
+    results = get_registry().results
+    next_submission = _cycle(submissions)
+
+    def post(submission):
+        response = client.post('/api/get/quiz/', submission, content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f'/api/get/quiz/ answered {response.status_code}: {response.content[:200]!r}')
+
+    max_entries = results.max_entries
+    results.max_entries = 0
+    try:
+        uncached = measure(lambda: post(next_submission()), repeat * 5)
+    finally:
+        results.max_entries = max_entries
+    repeated = submissions[0]
+    return {
+        'http.quiz': uncached,
+        'http.quiz_repeated': measure(lambda: post(repeated), repeat * 5),
+    }
+
+
+def _wsgi_post(handler, path, payload):
+    """One request through ``handler`` like a WSGI server sends it, ``request_finished`` included."""
+    from django.conf import settings
+
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    body = json.dumps(payload).encode()
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'HTTP_HOST': host, 'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0),
+        'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return statuses[0]
+
+
+def bench_auth(repeat, conn_max_ages=(0, 600), iterations=PASSWORD_ITERATIONS):
+    from django.test import override_settings
+
+    with override_settings(PASSWORD_HASH_ITERATIONS=SIGNIN_BENCH_ITERATIONS):
+        results = bench_signin(repeat, conn_max_ages)
+    results.update(bench_password_hashing(repeat, iterations))
+    return results
+
+
+def bench_signin(repeat, conn_max_ages):
+    from django.contrib.auth.hashers import make_password
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    from .models import UserModel
+
+    # The test client never closes connections, a WSGI server does after each request
+    handler = WSGIHandler()
+    email = f'benchmark-{secrets.token_hex(6)}@example.invalid'
+    password = secrets.token_urlsafe(12)
+    UserModel.objects.create(name='Benchmark', age=30, email=email, password=make_password(password))
+    opened = []
+
+    def count(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    def signin():
+        status = _wsgi_post(handler, '/api/auth/signin/', {'email': email, 'password': password})
+        if not status.startswith('200'):
+            raise RuntimeError(f'/api/auth/signin/ answered {status}')
+
+    original_max_age = connection.settings_dict['CONN_MAX_AGE']
+    connection_created.connect(count)
+    results = {}
+    try:
+        for max_age in conn_max_ages:
+            # Read when a connection is opened
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            connection.close()
+            opened.clear()
+            calls = repeat * 5
+            result = measure(signin, calls, warmup=0)
+            result['connections_per_request'] = round(opened.count(connection.alias) / calls, 3)
+            results[f'auth.signin.conn_max_age_{max_age}'] = result
+    finally:
+        connection_created.disconnect(count)
+        connection.settings_dict['CONN_MAX_AGE'] = original_max_age
+        connection.close()
+        UserModel.objects.filter(email=email).delete()
+    return results
+
+
+def bench_password_hashing(repeat, iterations=PASSWORD_ITERATIONS):
+    """
+    What a sign-in's password check costs at each number of PBKDF2 iterations.
+    One check runs on one core, so ``signins_per_core_second`` is how many
+    sign-ins each core of a worker can verify per second at that cost.
+    """
+    from django.conf import settings
+
+    from .hashers import ConfigurablePBKDF2PasswordHasher
+
+    hasher = ConfigurablePBKDF2PasswordHasher()
+    password = secrets.token_urlsafe(12)
+    results = {}
+    for rounds in sorted(set(iterations) | {settings.PASSWORD_HASH_ITERATIONS}):
+        encoded = hasher.encode(password, hasher.salt(), rounds)
+        result = measure(lambda: hasher.verify(password, encoded), max(repeat // 10, 3), warmup=1)
+        result['signins_per_core_second'] = result.pop('rows_per_second')
+        result['current'] = rounds == settings.PASSWORD_HASH_ITERATIONS
+        results[f'auth.password.{rounds}'] = result
+    return results
+
+
+def environment(model):
+    import django
+    from django.db import connection
+
+    try:
+        import sklearn
+        sklearn_version = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+    return {
+        'python': platform.python_version(),
+        'implementation': sys.implementation.name,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'sklearn': sklearn_version,
+        'django': django.__version__,
+        'database': connection.vendor,
+        'model': {key: model.as_dict()[key] for key in ('path', 'version', 'estimator', 'engine')},
+    }
+
+
+def run(suites=('load', 'encode', 'predict', 'http'), repeat=50, path=None, limit=None):
+    """Run the selected suites and return the JSON-serializable report."""
+    from .model_registry import get_registry
+
+    registry = get_registry()
+    model = registry.get()
+    data, submissions = load_rows(limit=limit)
+    matrix = encode_frame(data)
+
+    started = time.perf_counter()
+    results = {}
+    if 'load' in suites:
+        results.update(bench_load(path or registry.path, max(repeat // 10, 3)))
+    if 'encode' in suites:
+        results.update(bench_encode(data, submissions, repeat))
+    if 'predict' in suites:
+        results.update(bench_predict(model, matrix, repeat))
+    if 'http' in suites:
+        results.update(bench_http(submissions, repeat))
+    if 'auth' in suites:
+        results.update(bench_auth(repeat))
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'repeat': repeat,
+        'dataset_rows': len(data),
+        'seconds': round(time.perf_counter() - started, 3),
+        'environment': environment(model),
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Cases whose median latency grew by more than ``threshold`` (a fraction)
+    from ``baseline`` to ``current``, as ``{case: {baseline_us, current_us, change}}``.
+    """
+    regressions = {}
+    for case, result in current['results'].items():
+        before = baseline.get('results', {}).get(case)
+        if not before or not before['p50_us']:
+            continue
+        change = result['p50_us'] / before['p50_us'] - 1
+        if change > threshold:
+            regressions[case] = {
+                'baseline_us': before['p50_us'],
+                'current_us': result['p50_us'],
+                'change': round(change, 3),
+            }
+    return regressions
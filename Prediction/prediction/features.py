@@ -0,0 +1,199 @@
+"""
+Feature schema shared by training and serving.
+
+Every model input is declared once here, in model column order, with the
+column name used in ``datasets/prediction-data.csv``, the quiz API field that
+carries it and, for categorical inputs, the ordered list of labels (a label's
+position is its code). The schema is compiled once at import into lookup
+tables, and the encoder writes straight into ``int32`` NumPy matrices.
+
+This module only depends on NumPy so the training notebook can import it
+without setting up Django.
+"""
+import threading
+
+import numpy as np
+
+
+class Feature:
+    """One model input. ``labels`` is None for numeric ratings."""
+
+    def __init__(self, column, field, labels=None, aliases=None):
+        self.column = column
+        self.field = field
+        self.labels = labels
+        self.aliases = aliases or {}
+
+    def compile(self):
+        """Build the lookup table from normalized answer text to code."""
+        if self.labels is None:
+            return None
+        table = {}
+        for code, label in enumerate(self.labels):
+            table[label.lower()] = code
+            table[str(code)] = code
+        for alias, label in self.aliases.items():
+            table[alias.lower()] = self.labels.index(label)
+        return table
+
+
+YES_NO = ['no', 'yes']
+SKILL_LEVEL = ['poor', 'medium', 'excellent']
+
+# Labels are in code order and match the encoding the model was trained with
+FEATURES = (
+    Feature('Logical quotient rating', 'question1'),
+    Feature('hackathons', 'question2'),
+    Feature('coding skills rating', 'question3'),
+    Feature('public speaking points', 'question4'),
+    Feature('self-learning capability?', 'question5', YES_NO),
+    Feature('Extra-courses did', 'question6', YES_NO),
+    Feature('certifications', 'question7', [
+        'r programming', 'information security', 'shell programming', 'machine learning',
+        'full stack', 'hadoop', 'python', 'distro making', 'app development',
+    ]),
+    Feature('workshops', 'question8', [
+        'database security', 'system designing', 'web technologies', 'hacking',
+        'testing', 'data science', 'game development', 'cloud computing',
+    ]),
+    Feature('reading and writing skills', 'question9', SKILL_LEVEL),
+    Feature('memory capability score', 'question10', SKILL_LEVEL),
+    Feature('Interested subjects', 'question11', [
+        'Software Engineering', 'IOT', 'cloud computing', 'programming', 'networks',
+        'Computer Architecture', 'data engineering', 'hacking', 'Management', 'parallel computing',
+    ]),
+    Feature('interested career area ', 'question12', [
+        'system developer', 'security', 'Business process analyst', 'developer', 'testing',
+        'cloud computing',
+    ]),
+    Feature('Type of company want to settle in?', 'question13', [
+        'Service Based', 'Web Services', 'BPA', 'Testing and Maintainance Services',
+        'Product based', 'Finance', 'Cloud Services', 'product development',
+        'Sales and Marketing', 'SAaS services',
+    ], aliases={'Testing and Maintenance Services': 'Testing and Maintainance Services'}),
+    Feature('Taken inputs from seniors or elders', 'question14', YES_NO),
+    Feature('Interested Type of Books', 'question15', [
+        'Guide', 'Health', 'Self help', 'Horror', 'Biographies', 'Science fiction', 'Satire',
+        'Childrens', 'Autobiographies', 'Prayer books', 'Fantasy', 'Journals', 'Trilogy',
+        'Anthology', 'Encyclopedias', 'Drama', 'Mystery', 'History', 'Science', 'Dictionaries',
+        'Diaries', 'Religion-Spirituality', 'Action and Adventure', 'Poetry', 'Cookbooks',
+        'Comics', 'Art', 'Travel', 'Series', 'Math', 'Romance',
+    ], aliases={'Children': 'Childrens'}),
+    Feature('Management or Technical', 'question16', ['Management', 'Technical']),
+    Feature('hard/smart worker', 'question17', ['hard worker', 'smart worker']),
+    Feature('worked in teams ever?', 'question18', YES_NO),
+    Feature('Introvert', 'question19', YES_NO),
+)
+
+FEATURE_COLUMNS = [feature.column for feature in FEATURES]
+QUESTION_FIELDS = [feature.field for feature in FEATURES]
+N_FEATURES = len(FEATURES)
+TARGET_COLUMN = 'Suggested Job Role'
+
+# Job role codes in class order, the same mapping as the frontend's Predict
+# page. The dataset spells three roles differently, those are aliases.
+TARGET = Feature(TARGET_COLUMN, 'prediction', [
+    'Network Security Engineer', 'Software Engineer', 'UI/UX Engineer', 'Software Developer',
+    'Database Developer', 'QA Engineer', 'Web Developer', 'CRM Technical Developer',
+    'Technical Supporter', 'Systems Security Administrator', 'Applications Developer',
+    'Mobile Applications Developer',
+], aliases={
+    'UX Designer': 'UI/UX Engineer',
+    'Software Quality Assurance (QA) / Testing': 'QA Engineer',
+    'Technical Support': 'Technical Supporter',
+})
+CAREER_LABELS = dict(enumerate(TARGET.labels))
+
+
+class FeatureEncoder:
+    """Encoder compiled from a feature schema."""
+
+    def __init__(self, features=FEATURES):
+        self.features = features
+        self.columns = [feature.column for feature in features]
+        self.fields = [feature.field for feature in features]
+        self.tables = [feature.compile() for feature in features]
+        self._local = threading.local()
+
+    def _encode_value(self, table, value):
+        if table is None:
+            return int(value)
+        if isinstance(value, str):
+            return table[value.strip().lower()]
+        if int(value) != value:
+            raise KeyError(value)
+        return table[str(int(value))]
+
+    def encode_row(self, row, out):
+        """
+        Encode one submission into the 1-D array ``out``.
+
+        ``row`` may use the quiz API fields or the CSV column names. Unknown
+        categorical answers raise KeyError, malformed numbers ValueError.
+        """
+        keys = self.fields if self.fields[0] in row else self.columns
+        encode = self._encode_value
+        for i, (key, table) in enumerate(zip(keys, self.tables)):
+            out[i] = encode(table, row[key])
+        return out
+
+    def encode_one(self, row):
+        """
+        Encode one submission into a reused per-thread ``(1, n_features)`` matrix.
+
+        The returned array is overwritten by the next call on the same thread.
+        """
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = np.empty((1, len(self.features)), dtype=np.int32)
+        self.encode_row(row, buffer[0])
+        return buffer
+
+    def encode_many(self, rows, out=None):
+        """Encode a sequence of submissions into an ``(n, n_features)`` int32 matrix."""
+        if out is None:
+            out = np.empty((len(rows), len(self.features)), dtype=np.int32)
+        for i, row in enumerate(rows):
+            self.encode_row(row, out[i])
+        return out
+
+    def encode_columns(self, data, out=None):
+        """
+        Vectorized encoding of column data, e.g. a pandas DataFrame in the CSV layout.
+
+        Each categorical column is reduced to its distinct values, those are
+        looked up once, and the codes are broadcast back with the inverse index.
+        pandas ``category`` columns already hold both and are not re-scanned.
+        """
+        n_rows = len(data[self.columns[0]])
+        if out is None:
+            out = np.empty((n_rows, len(self.features)), dtype=np.int32)
+        for i, (column, table) in enumerate(zip(self.columns, self.tables)):
+            if table is None:
+                out[:, i] = np.asarray(data[column]).astype(np.int32)
+                continue
+            categorical = getattr(data[column], 'cat', None)
+            if categorical is not None:
+                inverse = np.asarray(categorical.codes)
+                if (inverse < 0).any():
+                    raise KeyError(f'missing value in {column!r}')
+                uniques = np.asarray(categorical.categories).astype(str)
+            else:
+                uniques, inverse = np.unique(np.asarray(data[column]).astype(str), return_inverse=True)
+            codes = np.array([self._encode_value(table, value) for value in uniques], dtype=np.int32)
+            out[:, i] = codes[inverse.reshape(-1)]
+        return out
+
+
+encoder = FeatureEncoder()
+target_encoder = FeatureEncoder((TARGET,))
+
+
+def encode_frame(data):
+    """Encode a DataFrame (or dict of columns) in the prediction-data.csv layout."""
+    return encoder.encode_columns(data)
+
+
+def encode_target(data):
+    """Job role codes of the ``Suggested Job Role`` column."""
+    return target_encoder.encode_columns(data)[:, 0]
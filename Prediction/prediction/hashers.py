@@ -0,0 +1,19 @@
+"""
+Password hasher with a configurable cost.
+
+PBKDF2-SHA256 like Django's default hasher, with the same algorithm name, so
+existing hashes stay valid, but with ``PASSWORD_HASH_ITERATIONS`` rounds.
+Each sign-in costs one hash, so the iterations set how many sign-ins a CPU
+core can verify per second (``benchmark_prediction --suite auth`` measures
+it). Hashes made with other iterations still verify and are rehashed to the
+current cost after the next successful sign-in (see ``accounts``).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
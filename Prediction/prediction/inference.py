@@ -0,0 +1,198 @@
+"""
+Array-based decision tree inference.
+
+A fitted tree is flattened into contiguous NumPy arrays (children, split
+feature, threshold and per-node class probabilities). Batches are traversed
+level by level with vectorized NumPy, a single row walks plain Python lists,
+which is cheaper than sklearn's validation and dtype conversion for one
+sample. Outputs match ``DecisionTreeClassifier.predict`` / ``predict_proba``,
+``FlatForest`` does the same for ``RandomForestClassifier``.
+
+Nothing here imports scikit-learn, ``from_estimator`` only reads the public
+``tree_`` arrays of an already loaded estimator.
+"""
+import numpy as np
+
+TREE_LEAF = -1
+
+
+def _normalize(values):
+    totals = values.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    return values / totals
+
+
+class FlatTree:
+    """A single classification tree stored as flat arrays."""
+
+    def __init__(self, children_left, children_right, feature, threshold, value, classes, normalize=True):
+        # No copies are made when the inputs already have the right layout,
+        # so memory-mapped arrays stay shared between processes
+        self.children_left = np.ascontiguousarray(children_left, dtype=np.int64)
+        self.children_right = np.ascontiguousarray(children_right, dtype=np.int64)
+        self.feature = np.ascontiguousarray(feature, dtype=np.int64)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        value = np.asarray(value, dtype=np.float64)
+        # Class fractions per node, whether the source stored counts or fractions
+        self.value = np.ascontiguousarray(_normalize(value) if normalize else value)
+        self.classes_ = np.asarray(classes)
+        for array in (self.children_left, self.children_right, self.feature, self.threshold, self.value):
+            array.flags.writeable = False
+        self.max_depth = self._compute_depth()
+        self._lists = None
+        self._batch = None
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Flatten a fitted single-output ``DecisionTreeClassifier``."""
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError('Only single-output trees are supported')
+        return cls(
+            tree.children_left,
+            tree.children_right,
+            tree.feature,
+            tree.threshold,
+            tree.value[:, 0, :],
+            estimator.classes_,
+        )
+
+    def _compute_depth(self):
+        depth = 0
+        frontier = np.array([0])
+        while True:
+            frontier = frontier[self.children_left[frontier] != TREE_LEAF]
+            if not frontier.size:
+                return depth
+            frontier = np.concatenate([self.children_left[frontier], self.children_right[frontier]])
+            depth += 1
+
+    def _single_row_lists(self):
+        # Python lists are faster than NumPy scalar indexing for one row
+        if self._lists is None:
+            self._lists = (
+                self.children_left.tolist(),
+                self.children_right.tolist(),
+                self.feature.tolist(),
+                self.threshold.tolist(),
+            )
+        return self._lists
+
+    def _batch_arrays(self):
+        # For batches leaves point back at themselves and never split, so every
+        # row can take exactly max_depth steps without tracking which are done
+        if self._batch is None:
+            leaf = self.children_left == TREE_LEAF
+            nodes = np.arange(self.node_count)
+            self._batch = (
+                np.where(leaf, nodes, self.children_left),
+                np.where(leaf, nodes, self.children_right),
+                np.where(leaf, 0, self.feature),
+                np.where(leaf, np.inf, self.threshold),
+            )
+        return self._batch
+
+    @property
+    def node_count(self):
+        return len(self.children_left)
+
+    @property
+    def n_classes(self):
+        return len(self.classes_)
+
+    @staticmethod
+    def _as_matrix(X):
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+
+    def _apply_one(self, row):
+        left, right, feature, threshold = self._single_row_lists()
+        node = 0
+        while left[node] != TREE_LEAF:
+            if row[feature[node]] <= threshold[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        return node
+
+    def apply(self, X):
+        """Return the leaf index reached by each row of ``X``."""
+        X = self._as_matrix(X)
+        if X.shape[0] == 1:
+            return np.array([self._apply_one(X[0].tolist())], dtype=np.int64)
+
+        left, right, feature, threshold = self._batch_arrays()
+        rows = np.arange(X.shape[0])
+        nodes = np.zeros(X.shape[0], dtype=np.int64)
+        for _ in range(self.max_depth):
+            go_left = X[rows, feature[nodes]] <= threshold[nodes]
+            nodes = np.where(go_left, left[nodes], right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class FlatForest:
+    """
+    A forest of flattened trees, scored like ``RandomForestClassifier``.
+
+    Probabilities are the mean of the per-tree probabilities, accumulated in
+    estimator order so the floating point result matches sklearn.
+    """
+
+    def __init__(self, trees, classes):
+        self.trees = list(trees)
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Flatten a fitted single-output ``RandomForestClassifier``."""
+        trees = []
+        for tree_estimator in estimator.estimators_:
+            tree = tree_estimator.tree_
+            trees.append(FlatTree(
+                tree.children_left,
+                tree.children_right,
+                tree.feature,
+                tree.threshold,
+                tree.value[:, 0, :],
+                estimator.classes_,
+            ))
+        return cls(trees, estimator.classes_)
+
+    @property
+    def node_count(self):
+        return sum(tree.node_count for tree in self.trees)
+
+    @property
+    def n_classes(self):
+        return len(self.classes_)
+
+    def predict_proba(self, X):
+        X = FlatTree._as_matrix(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for tree in self.trees:
+            proba += tree.predict_proba(X)
+        proba /= len(self.trees)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def build_engine(estimator):
+    """Return a flattened engine for ``estimator``, or None when it is not a supported model."""
+    if not hasattr(estimator, 'classes_'):
+        return None
+    if hasattr(estimator, 'tree_'):
+        return FlatTree.from_estimator(estimator)
+    if hasattr(estimator, 'estimators_') and all(hasattr(e, 'tree_') for e in estimator.estimators_):
+        return FlatForest.from_estimator(estimator)
+    return None
@@ -0,0 +1,55 @@
+import json
+import logging
+import warnings
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.benchmarks import compare, run
+
+SUITES = ('load', 'encode', 'predict', 'http', 'auth')
+
+# 'auth' writes a temporary account to the database, so it only runs when asked for
+DEFAULT_SUITES = ('load', 'encode', 'predict', 'http')
+
+
+class Command(BaseCommand):
+    help = ("Benchmark model loading, feature encoding, predict_proba and /api/get/quiz/ on "
+            "prediction-data.csv and print the results as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', nargs='+', choices=SUITES, default=list(DEFAULT_SUITES))
+        parser.add_argument('--repeat', type=int, default=50, help="Timed calls per case (more for cheap cases)")
+        parser.add_argument('--rows', type=int, help="Only use the first ROWS rows of the dataset")
+        parser.add_argument('--model-path', help="Model to time loading for, defaults to PREDICTION_MODEL_PATH")
+        parser.add_argument('--output', '-o', help="Also write the JSON report to this file")
+        parser.add_argument('--compare', metavar='BASELINE', help="Fail when a case is slower than in this report")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed slowdown of a case's median against --compare, as a fraction")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        # One INFO line per model load would drown the report, and sklearn warns
+        # on every call that the benchmark matrices have no column names
+        logging.getLogger('prediction.model_registry').setLevel(logging.WARNING)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            report = run(options['suite'], options['repeat'], options['model_path'], options['rows'])
+
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+            report['regressions'] = compare(baseline, report, options['threshold'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+        if report.get('regressions'):
+            raise CommandError(f"{len(report['regressions'])} case(s) slower than {options['compare']} "
+                               f"by more than {options['threshold']:.0%}: {', '.join(report['regressions'])}")
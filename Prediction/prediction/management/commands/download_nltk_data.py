@@ -0,0 +1,29 @@
+import nltk
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.utility import NLTK_DATA_DIR, NLTK_RESOURCES, missing_nltk_resources
+
+
+class Command(BaseCommand):
+    help = ("Download the NLTK data used by the sentiment endpoint into a local directory. "
+            "Run at build time so workers never touch the network.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=NLTK_DATA_DIR,
+                            help="Target directory, defaults to NLTK_DATA_DIR")
+        parser.add_argument('--check', action='store_true',
+                            help="Only verify the data is present, exit non-zero if not")
+
+    def handle(self, *args, **options):
+        if options['dir'] not in nltk.data.path:
+            nltk.data.path.insert(0, options['dir'])
+        if not options['check']:
+            for package in NLTK_RESOURCES:
+                if not nltk.download(package, download_dir=options['dir'], quiet=True, raise_on_error=True):
+                    raise CommandError(f"Failed to download NLTK package {package}")
+                self.stdout.write(f"Installed {package} in {options['dir']}")
+
+        missing = missing_nltk_resources()
+        if missing:
+            raise CommandError(f"Missing NLTK data: {', '.join(missing)}")
+        self.stdout.write(self.style.SUCCESS("NLTK data is installed"))
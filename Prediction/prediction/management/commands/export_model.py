@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.artifacts import export_artifact, load_artifact
+from prediction.inference import build_engine
+from prediction.model_registry import ModelRegistry
+
+
+class Command(BaseCommand):
+    help = ("Export pickled tree models (dtmodel.pkl, rfmodel.pkl) to the memory-mappable "
+            "artifact format. Point PREDICTION_MODEL_PATH at the output directory to serve it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help="Pickles to export, defaults to PREDICTION_MODEL_PATH")
+        parser.add_argument('--output-dir', help="Where to write the artifacts, defaults to next to each pickle")
+
+    def handle(self, *args, **options):
+        models = options['models'] or [settings.PREDICTION_MODEL_PATH]
+        for path in models:
+            try:
+                loaded = ModelRegistry(path).load()
+            except Exception as e:
+                raise CommandError(f"Could not load {path}: {e}")
+            engine = build_engine(loaded.estimator)
+            if engine is None:
+                raise CommandError(f"{path} holds a {type(loaded.estimator).__name__}, only trees and forests can be exported")
+
+            name = os.path.splitext(os.path.basename(path))[0]
+            output = os.path.join(options['output_dir'] or os.path.dirname(os.path.abspath(path)), name)
+            feature_names = getattr(loaded.estimator, 'feature_names_in_', None)
+            manifest = export_artifact(engine, output, feature_names=feature_names, source={
+                'path': os.path.basename(path),
+                'sha256': loaded.sha256,
+                'estimator': type(loaded.estimator).__name__,
+                'sklearn_version': loaded.trained_sklearn_version,
+            })
+
+            # Re-read what was written to make sure the artifact is usable
+            load_artifact(output, verify=True)
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported {path} -> {output} ({manifest['kind']}, {manifest['n_trees']} tree(s), "
+                f"{engine.node_count} nodes)"
+            ))
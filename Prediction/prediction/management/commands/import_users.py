@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.batch import RENDERERS, BatchInputError
+from prediction.user_import import (DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, IMPORT_RESULT_FIELDS, import_users,
+                                    read_json_users, read_user_rows)
+
+
+class Command(BaseCommand):
+    help = ("Create accounts from a CSV (name,age,email,password columns) or JSON array, "
+            "reporting the rows that could not be imported")
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Input .csv or .json file, '-' reads CSV from stdin")
+        parser.add_argument('--output', '-o', default='-', help="Where to write the per-row report, defaults to stdout")
+        parser.add_argument('--format', choices=sorted(RENDERERS), default='ndjson')
+        parser.add_argument('--all', action='store_true', help="Report every row, not only the failed ones")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows checked with one email query and written in one transaction")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per INSERT")
+        parser.add_argument('--hash-workers', type=int, help="Threads hashing passwords, defaults to the CPUs + 4")
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the rows, create nothing")
+
+    def handle(self, *args, **options):
+        render, _ = RENDERERS[options['format']]
+        source = sys.stdin if options['input'] == '-' else open(options['input'], newline='', encoding='utf-8-sig')
+        target = self.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        started = time.perf_counter()
+        counts = {'rows': 0, 'errors': 0}
+
+        def reported(results):
+            for result in results:
+                counts['rows'] += 1
+                counts['errors'] += 'error' in result
+                if options['all'] or 'error' in result:
+                    yield result
+
+        try:
+            if options['input'].endswith('.json'):
+                rows = read_json_users(json.load(source))
+            else:
+                rows = read_user_rows(source)
+            results = import_users(rows, max(options['chunk_size'], 1), max(options['batch_size'], 1),
+                                   options['hash_workers'], commit=not options['dry_run'])
+            target.writelines(render(reported(results), IMPORT_RESULT_FIELDS))
+        except BatchInputError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not self.stdout:
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        imported = counts['rows'] - counts['errors']
+        self.stderr.write(f"{'Validated' if options['dry_run'] else 'Imported'} {imported} of {counts['rows']} "
+                          f"users ({counts['errors']} errors) in {elapsed:.2f}s "
+                          f"({counts['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
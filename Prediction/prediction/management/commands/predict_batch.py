@@ -0,0 +1,51 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.batch import DEFAULT_CHUNK_SIZE, RENDERERS, BatchInputError, read_csv_rows, read_json_rows, score_rows
+from prediction.model_registry import get_model
+
+
+class Command(BaseCommand):
+    help = "Score a CSV (prediction-data.csv layout) or JSON array of quiz submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Input .csv or .json file, '-' reads CSV from stdin")
+        parser.add_argument('--output', '-o', default='-', help="Output file, defaults to stdout")
+        parser.add_argument('--format', choices=sorted(RENDERERS), default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        model = get_model().predictor
+        render, _ = RENDERERS[options['format']]
+
+        source = sys.stdin if options['input'] == '-' else open(options['input'], newline='', encoding='utf-8-sig')
+        target = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        started = time.perf_counter()
+        counts = {'rows': 0, 'errors': 0}
+
+        def counted(results):
+            for result in results:
+                counts['rows'] += 1
+                counts['errors'] += 'error' in result
+                yield result
+
+        try:
+            if options['input'].endswith('.json'):
+                rows = read_json_rows(json.load(source))
+            else:
+                rows = read_csv_rows(source)
+            target.writelines(render(counted(score_rows(model, rows, max(options['chunk_size'], 1)))))
+        except BatchInputError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not sys.stdout:
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"Scored {counts['rows']} rows ({counts['errors']} errors) in {elapsed:.2f}s "
+                          f"({counts['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
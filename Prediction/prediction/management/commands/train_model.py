@@ -0,0 +1,65 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.training import DATASET_PATH, DEFAULT_BUILD_DIR, ESTIMATORS, SPLIT_SEED, TEST_SIZE, load_dataset, \
+    train_models, write_build
+
+
+class Command(BaseCommand):
+    help = ("Train the career prediction models from prediction-data.csv (the notebook's pipeline) and "
+            "write them with metrics and timings to a new versioned build directory")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=sorted(ESTIMATORS), default=['dt'],
+                            help="Models to fit: dt (decision tree, served by default), rf, svm")
+        parser.add_argument('--n-jobs', type=int, default=1,
+                            help="Models fitted in parallel by joblib, -1 uses every core")
+        parser.add_argument('--dataset', default=DATASET_PATH)
+        parser.add_argument('--output-dir', default=DEFAULT_BUILD_DIR)
+        parser.add_argument('--test-size', type=float, default=TEST_SIZE)
+        parser.add_argument('--random-state', type=int, default=SPLIT_SEED)
+        parser.add_argument('--dry-run', action='store_true', help="Report the metrics without writing a build")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['dataset']):
+            raise CommandError(f"Dataset not found: {options['dataset']}")
+        names = list(dict.fromkeys(options['models']))
+        started = time.perf_counter()
+
+        try:
+            X, y, load_seconds = load_dataset(options['dataset'])
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Could not encode {options['dataset']}: {e}")
+        fit_started = time.perf_counter()
+        models = train_models(X, y, names, n_jobs=options['n_jobs'], test_size=options['test_size'],
+                              random_state=options['random_state'])
+        report = {
+            'rows': len(y),
+            'test_size': options['test_size'],
+            'random_state': options['random_state'],
+            'n_jobs': options['n_jobs'],
+            'load_seconds': round(load_seconds, 4),
+            'train_seconds': round(time.perf_counter() - fit_started, 4),
+        }
+
+        for name in names:
+            model_report = models[name][1]
+            metrics = ', '.join(f'{key} {value:.4f}' for key, value in model_report['metrics'].items())
+            self.stdout.write(f"{name}: {model_report['estimator']} fitted in {model_report['fit_seconds']:.3f}s, "
+                              f"{metrics}")
+
+        if options['dry_run']:
+            report['total_seconds'] = round(time.perf_counter() - started, 4)
+            self.stdout.write(json.dumps(report))
+            return
+
+        build_dir, report = write_build(models, options['output_dir'], options['dataset'], report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote build {report['version']} to {build_dir} in {time.perf_counter() - started:.3f}s"
+        ))
+        served = next((name for name in names if report['models'][name]['artifact']), None)
+        if served:
+            self.stdout.write(f"Serve it with PREDICTION_MODEL_PATH={os.path.join(build_dir, served)}")
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:26
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import migrations, models
+
+
+def hash_plain_passwords(apps, schema_editor):
+    # Signup used to store passwords as typed
+    UserModel = apps.get_model("prediction", "UserModel")
+    for user in UserModel.objects.only("id", "password").iterator():
+        try:
+            identify_hasher(user.password)
+        except ValueError:
+            user.password = make_password(user.password)
+            user.save(update_fields=["password"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("prediction", "0002_alter_usermodel_email"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usermodel",
+            name="password",
+            field=models.CharField(max_length=128),
+        ),
+        migrations.RunPython(hash_plain_passwords, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,321 @@
+"""
+Process-wide registry for the career prediction model.
+
+The estimator is deserialized once per worker process (at app ``ready()`` or
+on first use) instead of on every quiz submission. The path can be a pickle
+or an artifact directory written by ``manage.py export_model`` (see
+``artifacts``), which is memory-mapped and needs no scikit-learn. The registry also keeps
+the metadata we need to reason about the loaded model (path, file hash,
+scikit-learn versions, class labels) and can pick up a replaced model file
+without restarting the worker.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from .artifacts import ArtifactError, is_artifact, load_artifact, manifest_path
+from .inference import build_engine
+from .result_cache import DEFAULT_MAX_ENTRIES, PredictionCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), '../ml_models/dtmodel.pkl')
+
+# Node layout written by scikit-learn < 1.3, which had no missing value support
+_NODE_FIELDS = [
+    ('left_child', '<i8'),
+    ('right_child', '<i8'),
+    ('feature', '<i8'),
+    ('threshold', '<f8'),
+    ('impurity', '<f8'),
+    ('n_node_samples', '<i8'),
+    ('weighted_n_node_samples', '<f8'),
+    ('missing_go_to_left', 'u1'),
+]
+
+
+class ModelLoadError(Exception):
+    """Raised when the model file exists but cannot be turned into an estimator."""
+
+
+def _sklearn_version():
+    try:
+        import sklearn
+        return sklearn.__version__
+    except ImportError:
+        return None
+
+
+def _version_tuple(version):
+    parts = []
+    for part in (version or '0').split('.')[:2]:
+        digits = ''.join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits or 0))
+    return tuple(parts)
+
+
+def _patch_tree_state(state):
+    """Upgrade a pickled ``Tree`` state to the layout the installed sklearn expects."""
+    nodes = state['nodes']
+    if nodes.dtype.names and 'missing_go_to_left' not in nodes.dtype.names:
+        new_nodes = np.zeros(nodes.shape, dtype=np.dtype(_NODE_FIELDS))
+        for field in nodes.dtype.names:
+            new_nodes[field] = nodes[field]
+        state = dict(state, nodes=new_nodes)
+
+    # sklearn >= 1.4 stores class fractions in ``value`` and no longer
+    # normalizes in predict_proba, older pickles hold raw class counts.
+    values = state.get('values')
+    if (values is not None and values.ndim == 3 and values.shape[2] > 1
+            and _version_tuple(_sklearn_version()) >= (1, 4)):
+        totals = values.sum(axis=2, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            totals[totals == 0] = 1.0
+            state = dict(state, values=np.ascontiguousarray(values / totals))
+    return state
+
+
+class _CompatUnpickler(pickle.Unpickler):
+    """Unpickler that routes sklearn trees through :func:`_patch_tree_state`."""
+
+    def find_class(self, module, name):
+        if module == 'sklearn.tree._tree' and name == 'Tree':
+            return _compat_tree_class()
+        return super().find_class(module, name)
+
+
+_compat_tree = None
+
+
+def _compat_tree_class():
+    global _compat_tree
+    if _compat_tree is None:
+        from sklearn.tree._tree import Tree
+
+        class CompatTree(Tree):
+            def __setstate__(self, state):
+                super().__setstate__(_patch_tree_state(state))
+
+        _compat_tree = CompatTree
+    return _compat_tree
+
+
+def _load_estimator(path):
+    """Load ``path`` with joblib, falling back to the patched unpickler on dtype errors."""
+    try:
+        return joblib.load(path)
+    except (ValueError, TypeError) as e:
+        error_str = str(e)
+        if 'incompatible dtype' not in error_str and 'missing_go_to_left' not in error_str:
+            raise
+        logger.info("Model pickle needs sklearn compatibility patching: %s", error_str.splitlines()[0])
+        try:
+            with open(path, 'rb') as f:
+                return _CompatUnpickler(f).load()
+        except Exception as patch_error:
+            raise ModelLoadError(
+                f'Model compatibility error: {error_str}. The model was created with a different '
+                f'scikit-learn version. Please reinstall scikit-learn==1.2.2'
+            ) from patch_error
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LoadedModel:
+    """
+    A model together with the metadata describing where it came from.
+
+    ``estimator`` is the unpickled sklearn object, None for artifacts.
+    """
+
+    def __init__(self, estimator, path, sha256, trained_sklearn_version, load_seconds, file_stat,
+                 engine=None, n_features=None):
+        self.estimator = estimator
+        self.engine = engine
+        # What the views score with, the flattened tree when there is one
+        self.predictor = engine if engine is not None else estimator
+        self.path = path
+        self.sha256 = sha256
+        self.version = sha256[:12]
+        self.trained_sklearn_version = trained_sklearn_version
+        self.sklearn_version = _sklearn_version() if estimator is not None else None
+        self.classes = [c.item() if hasattr(c, 'item') else c for c in getattr(self.predictor, 'classes_', [])]
+        self.n_features = n_features if n_features is not None else getattr(estimator, 'n_features_in_', None)
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.file_stat = file_stat
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'sha256': self.sha256,
+            'version': self.version,
+            'estimator': type(self.estimator).__name__,
+            'engine': type(self.predictor).__name__,
+            'trained_sklearn_version': self.trained_sklearn_version,
+            'sklearn_version': self.sklearn_version,
+            'classes': self.classes,
+            'n_features': self.n_features,
+            'load_seconds': self.load_seconds,
+            'loaded_at': self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the one loaded model for this process.
+
+    ``get()`` loads lazily and, when ``check_interval`` is positive, stats the
+    model file (an artifact's manifest) at most once per interval and reloads
+    it if it changed.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH, check_interval=0, flat_tree=True, cache_size=DEFAULT_MAX_ENTRIES):
+        self.path = os.path.abspath(path)
+        self.is_artifact = is_artifact(self.path)
+        # The manifest is replaced last when an artifact is re-exported
+        self._watch_path = manifest_path(self.path) if self.is_artifact else self.path
+        self.check_interval = check_interval
+        self.flat_tree = flat_tree
+        # Results of single predictions, emptied whenever another model is loaded
+        self.results = PredictionCache(cache_size)
+        self._model = None
+        self._lock = threading.RLock()
+        self._last_check = 0.0
+        self._load_count = 0
+        self._last_reload_at = None
+        self._last_error = None
+
+    def _stat(self):
+        st = os.stat(self._watch_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f'Prediction model not found: {self.path}')
+        started = time.perf_counter()
+        file_stat = self._stat()
+        if self.is_artifact:
+            try:
+                engine, manifest = load_artifact(self.path)
+            except ArtifactError as e:
+                raise ModelLoadError(str(e)) from e
+            loaded = LoadedModel(None, self.path, _file_sha256(self._watch_path),
+                                 manifest.get('source', {}).get('sklearn_version'),
+                                 time.perf_counter() - started, file_stat, engine, manifest.get('n_features'))
+        else:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                estimator = _load_estimator(self.path)
+            trained_version = _sklearn_version()
+            for warning in caught:
+                original = getattr(warning.message, 'original_sklearn_version', None)
+                if original:
+                    trained_version = original
+            engine = build_engine(estimator) if self.flat_tree else None
+            loaded = LoadedModel(estimator, self.path, _file_sha256(self.path), trained_version,
+                                 time.perf_counter() - started, file_stat, engine)
+        logger.info("Loaded prediction model %s (%s) in %.3fs", self.path, loaded.version, loaded.load_seconds)
+        return loaded
+
+    def load(self):
+        """(Re)load the model file unconditionally and return the new model."""
+        with self._lock:
+            try:
+                model = self._load()
+            except Exception as e:
+                self._last_error = str(e)
+                raise
+            if self._model is not None:
+                self._last_reload_at = model.loaded_at
+            self._model = model
+            self.results.invalidate(model.version)
+            self._load_count += 1
+            self._last_error = None
+            self._last_check = time.monotonic()
+            return model
+
+    def reload_if_changed(self):
+        """Reload when the file on disk differs from the loaded one. Returns True on reload."""
+        model = self._model
+        if model is None:
+            self.load()
+            return True
+        try:
+            if self._stat() == model.file_stat:
+                return False
+        except OSError:
+            return False
+        # Touched but identical content keeps the current estimator
+        if _file_sha256(self._watch_path) == model.sha256:
+            model.file_stat = self._stat()
+            return False
+        self.load()
+        return True
+
+    def get(self):
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self.load()
+                model = self._model
+        if self.check_interval > 0 and time.monotonic() - self._last_check >= self.check_interval:
+            self._last_check = time.monotonic()
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                # Keep serving the model we already have
+                self._last_error = str(e)
+                logger.error("Model reload failed: %s", e)
+            model = self._model
+        return model
+
+    def stats(self):
+        model = self._model
+        return {
+            'loaded': model is not None,
+            'load_count': self._load_count,
+            'last_reload_at': self._last_reload_at,
+            'last_error': self._last_error,
+            'check_interval': self.check_interval,
+            'model': model.as_dict() if model is not None else None,
+            'result_cache': self.results.stats(),
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the registry for this process, configured from Django settings."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from django.conf import settings
+                _registry = ModelRegistry(
+                    path=getattr(settings, 'PREDICTION_MODEL_PATH', DEFAULT_MODEL_PATH),
+                    check_interval=getattr(settings, 'PREDICTION_MODEL_CHECK_INTERVAL', 0),
+                    flat_tree=getattr(settings, 'PREDICTION_FLAT_TREE', True),
+                    cache_size=getattr(settings, 'PREDICTION_CACHE_SIZE', DEFAULT_MAX_ENTRIES),
+                )
+    return _registry
+
+
+def get_model():
+    return get_registry().get()
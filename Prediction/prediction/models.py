@@ -5,7 +5,8 @@ class UserModel(models.Model):
     name = models.CharField(max_length=100)
     age = models.IntegerField()
     email = models.EmailField(max_length=100,unique=True)
-    password = models.CharField(max_length=100)
+    # A Django password hash, see prediction.hashers
+    password = models.CharField(max_length=128)
 
     def __str__(self):
         return self.name
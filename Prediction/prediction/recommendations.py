@@ -0,0 +1,69 @@
+"""
+Top-k career recommendations from ``predict_proba`` output.
+
+The k best classes of every row are found with a partition, linear in the
+number of classes, and only those k are sorted, so a batch matrix is ranked
+in one vectorized pass. It is ``np.partition`` on the values rather than
+``argpartition`` so that ties are broken like ``argmax`` does. Columns are
+mapped to labels through the model's ``classes_``, never by assuming
+class == column index.
+"""
+import numpy as np
+
+from .features import CAREER_LABELS
+
+
+def career_label(career_class):
+    return CAREER_LABELS.get(career_class, str(career_class))
+
+
+def parse_top_k(value, n_classes):
+    """
+    ``?top_k=`` as an int between 1 and ``n_classes``, None when absent.
+
+    ``all`` asks for the full distribution, larger numbers are clamped.
+    """
+    if value in (None, ''):
+        return None
+    if value == 'all':
+        return n_classes
+    k = int(value)
+    if k < 1:
+        raise ValueError('top_k must be at least 1')
+    return min(k, n_classes)
+
+
+def top_k_indices(proba, k):
+    """
+    Column indices of the ``k`` largest probabilities of each row, best first.
+
+    Ties go to the lower column, so the first index is always ``argmax``.
+    """
+    proba = np.atleast_2d(proba)
+    n_rows, n_columns = proba.shape
+    k = min(k, n_columns)
+    if k < n_columns:
+        # The k-th largest value of each row, everything above it is in, ties
+        # at it are filled from the left
+        threshold = np.partition(proba, n_columns - k, axis=1)[:, n_columns - k, None]
+        above = proba > threshold
+        at = proba == threshold
+        needed = k - above.sum(axis=1, keepdims=True)
+        selected = above | (at & (np.cumsum(at, axis=1) <= needed))
+        candidates = np.nonzero(selected)[1].reshape(n_rows, k)
+    else:
+        candidates = np.broadcast_to(np.arange(k), (n_rows, k))
+    order = np.argsort(-np.take_along_axis(proba, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recommendations(proba, classes, k):
+    """One list of ``{prediction, label, probability}`` dicts per row of ``proba``."""
+    proba = np.atleast_2d(proba)
+    indices = top_k_indices(proba, k)
+    ranked_classes = np.asarray(classes)[indices].tolist()
+    ranked_proba = np.take_along_axis(proba, indices, axis=1).tolist()
+    return [
+        [{'prediction': c, 'label': career_label(c), 'probability': p} for c, p in zip(row_classes, row_proba)]
+        for row_classes, row_proba in zip(ranked_classes, ranked_proba)
+    ]
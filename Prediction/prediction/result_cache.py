@@ -0,0 +1,90 @@
+"""
+Memo cache for single quiz predictions.
+
+The quiz has 19 answers with a handful of options each and many students
+submit identical answer sets (and the frontend retries), so the scored result
+is cached under the encoded answer vector packed to bytes. The cache holds
+results of one model version, set by the registry with ``invalidate()`` on
+every (re)load, which drops all entries. Lookups and stores for any other
+version miss, so a request still holding the previous model can neither read
+nor write results of the wrong one. The cache is bounded, least recently used
+entries go first.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def pack(encoded):
+    """Bytes key for an encoded answer row, one byte per answer when the codes fit."""
+    encoded = np.asarray(encoded).ravel()
+    if encoded.size and encoded.min() >= -128 and encoded.max() <= 127:
+        return encoded.astype(np.int8).tobytes()
+    return b'\xff' + encoded.astype('<i4').tobytes()
+
+
+class PredictionCache:
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, version, key):
+        """The cached result for ``key`` under model ``version``, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            result = self._entries.get(key) if version == self.version else None
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, version, key, result):
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version:
+                # Scored by a model that has been replaced while we were at it
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, version):
+        """Drop every entry and accept results of ``version`` from now on."""
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self.version = version
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'version': self.version,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -1,3 +1,685 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from utils import utility
+from utils.utility import SentimentEngine, load_emotions, missing_nltk_resources, score_texts
+
+from .accounts import Rehasher, rehash
+from .artifacts import export_artifact, load_artifact
+from .batch import score_rows
+from .benchmarks import compare
+from .features import FEATURE_COLUMNS, QUESTION_FIELDS, encode_frame, encode_target, encoder
+from .inference import FlatForest, FlatTree, build_engine
+from .models import UserModel
+from .model_registry import DEFAULT_MODEL_PATH, ModelRegistry, get_registry
+from .recommendations import CAREER_LABELS, parse_top_k, recommendations, top_k_indices
+from .result_cache import PredictionCache, pack
+from .training import load_dataset
+from .user_import import _insert, import_users
+from utils.timing import MetricsRegistry, metrics, span
+
+
+QUIZ_ANSWERS = {
+    'question1': '5', 'question2': '0', 'question3': '6', 'question4': '2',
+    'question5': '1', 'question6': '0', 'question7': 'Information Security',
+    'question8': 'Testing', 'question9': '0', 'question10': '0',
+    'question11': '3', 'question12': '4', 'question13': '2', 'question14': '0',
+    'question15': '28', 'question16': '0', 'question17': '1', 'question18': '1',
+    'question19': '0',
+}
+
+
+class FeatureEncoderTests(TestCase):
+
+    def test_api_answers_match_training_encoding(self):
+        # Same row as the example in the training notebook
+        expected = [5, 0, 6, 2, 1, 0, 1, 4, 0, 0, 3, 4, 2, 0, 28, 0, 1, 1, 0]
+        self.assertEqual(encoder.encode_one(QUIZ_ANSWERS).tolist(), [expected])
+
+        csv_row = {
+            'Logical quotient rating': '5', 'hackathons': '0', 'coding skills rating': '6',
+            'public speaking points': '2', 'self-learning capability?': 'yes',
+            'Extra-courses did': 'no', 'certifications': 'information security',
+            'workshops': 'testing', 'reading and writing skills': 'poor',
+            'memory capability score': 'poor', 'Interested subjects': 'programming',
+            'interested career area ': 'testing', 'Type of company want to settle in?': 'BPA',
+            'Taken inputs from seniors or elders': 'no', 'Interested Type of Books': 'Series',
+            'Management or Technical': 'Management', 'hard/smart worker': 'smart worker',
+            'worked in teams ever?': 'yes', 'Introvert': 'no',
+        }
+        self.assertEqual(encoder.encode_many([csv_row]).tolist(), [expected])
+        self.assertEqual(encode_frame({c: [csv_row[c]] * 3 for c in FEATURE_COLUMNS}).tolist(), [expected] * 3)
+
+    def test_rejects_unknown_options(self):
+        with self.assertRaises(KeyError):
+            encoder.encode_one(dict(QUIZ_ANSWERS, question8='Machine Learning'))
+        with self.assertRaises(KeyError):
+            encoder.encode_one(dict(QUIZ_ANSWERS, question15='31'))
+        with self.assertRaises(ValueError):
+            encoder.encode_one(dict(QUIZ_ANSWERS, question1='high'))
+
+    def test_schema_covers_quiz(self):
+        self.assertEqual(QUESTION_FIELDS, [f'question{i}' for i in range(1, 20)])
+        self.assertEqual(list(get_registry().get().estimator.feature_names_in_), FEATURE_COLUMNS)
+
+
+class FlatTreeTests(TestCase):
+
+    def setUp(self):
+        self.estimator = get_registry().get().estimator
+        self.engine = FlatTree.from_estimator(self.estimator)
+        rng = np.random.default_rng(0)
+        self.X = rng.integers(0, 12, size=(2000, 19)).astype(np.int32)
+
+    def test_batch_matches_sklearn(self):
+        np.testing.assert_array_equal(self.engine.predict_proba(self.X), self.estimator.predict_proba(self.X))
+        np.testing.assert_array_equal(self.engine.predict(self.X), self.estimator.predict(self.X))
+
+    def test_single_row_matches_sklearn(self):
+        for row in self.X[:200]:
+            np.testing.assert_array_equal(self.engine.predict_proba(row), self.estimator.predict_proba([row]))
+
+    def test_registry_serves_flat_tree(self):
+        self.assertIsInstance(get_registry().get().predictor, FlatTree)
+        self.assertEqual(self.engine.max_depth, self.estimator.get_depth())
+
+
+class ModelArtifactTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(1)
+        self.X = rng.integers(0, 12, size=(500, 19)).astype(np.int32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def export_pickle(self, path):
+        loaded = ModelRegistry(path).load()
+        output = os.path.join(self.tmpdir, 'artifact')
+        export_artifact(build_engine(loaded.estimator), output,
+                        feature_names=loaded.estimator.feature_names_in_,
+                        source={'sklearn_version': loaded.trained_sklearn_version})
+        return loaded.estimator, output
+
+    def test_decision_tree_round_trip(self):
+        estimator, output = self.export_pickle(DEFAULT_MODEL_PATH)
+        engine, manifest = load_artifact(output, verify=True)
+        self.assertIsInstance(engine.value.base, np.memmap)
+        self.assertEqual(manifest['feature_names'], FEATURE_COLUMNS)
+        np.testing.assert_array_equal(engine.predict_proba(self.X), estimator.predict_proba(self.X))
+        np.testing.assert_array_equal(engine.predict_proba(self.X[0]), estimator.predict_proba(self.X[:1]))
+
+    def test_random_forest_round_trip(self):
+        from sklearn.ensemble import RandomForestClassifier
+        import pandas as pd
+
+        data = pd.read_csv(os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), '../datasets/prediction-data.csv'))
+        X = pd.DataFrame(encode_frame(data), columns=FEATURE_COLUMNS)
+        forest = RandomForestClassifier(n_estimators=8, random_state=10).fit(X, data['Suggested Job Role'])
+        path = os.path.join(self.tmpdir, 'rfmodel.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump(forest, f)
+
+        estimator, output = self.export_pickle(path)
+        engine, manifest = load_artifact(output)
+        self.assertIsInstance(engine, FlatForest)
+        self.assertEqual(manifest['n_trees'], 8)
+        X_test = pd.DataFrame(self.X, columns=FEATURE_COLUMNS)
+        np.testing.assert_allclose(engine.predict_proba(self.X), estimator.predict_proba(X_test), rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(engine.predict(self.X), estimator.predict(X_test))
+
+    def test_registry_serves_artifact_without_sklearn(self):
+        _, output = self.export_pickle(DEFAULT_MODEL_PATH)
+        model = ModelRegistry(output).get()
+        self.assertIsNone(model.estimator)
+        self.assertEqual(model.classes, list(range(12)))
+        self.assertEqual(model.trained_sklearn_version, '1.2.2')
+
+        script = (
+            "import sys; from prediction.model_registry import ModelRegistry; "
+            f"ModelRegistry({output!r}).get().predictor.predict([[0] * 19]); "
+            "assert 'sklearn' not in sys.modules"
+        )
+        subprocess.run([sys.executable, '-c', script], check=True,
+                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def nltk_resources_available():
+    return not missing_nltk_resources()
+
+
+class SentimentEngineTests(TestCase):
+
+    def test_load_emotions(self):
+        emotions = load_emotions()
+        self.assertEqual(emotions['victimized'], ['cheated', 'sad'])
+        self.assertEqual(emotions['worked up'], ['angry'])
+        self.assertEqual(sum(len(v) for v in emotions.values()), 517)
+
+    def test_missing_nltk_data_is_reported_not_downloaded(self):
+        with mock.patch.dict(utility.NLTK_RESOURCES, {'not_a_package': 'corpora/not_a_package'}), \
+                mock.patch('nltk.download') as download:
+            with self.assertRaisesRegex(LookupError, 'download_nltk_data'):
+                SentimentEngine().analyze('hello')
+        download.assert_not_called()
+
+    @unittest.skipUnless(nltk_resources_available(), 'NLTK data is not installed')
+    def test_resources_are_built_once(self):
+        engine = SentimentEngine()
+        first = engine.analyze('I adored the workshop, it was great!')
+        analyzer = engine.analyzer
+        engine.analyze('I was accused and felt victimized.')
+        self.assertIs(engine.analyzer, analyzer)
+        self.assertIsInstance(engine.stop_words, frozenset)
+        self.assertIn('loved', first['emotions'])
+        self.assertEqual(engine.predict('This is terrible and awful'), 0)
+
+
+def fake_score(text_input):
+    negative = 'bad' in text_input
+    return {'prediction': 0 if negative else 1, 'compound': -0.5 if negative else 0.5,
+            'pos': 0.0 if negative else 0.6, 'neg': 0.6 if negative else 0.0, 'neu': 0.4, 'emotions': []}
+
+
+@mock.patch.object(utility.get_sentiment_engine(), 'score', side_effect=fake_score)
+class BatchSentimentTests(TestCase):
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_json_texts(self, score):
+        results = self.read(self.client.post('/api/get/sentiment/batch/', {'texts': ['good day', 'bad day', 3]},
+                                             content_type='application/json'))
+        self.assertEqual([r['row'] for r in results], [0, 1, 2])
+        self.assertEqual([r.get('prediction') for r in results], [1, 0, None])
+        self.assertEqual(results[1]['compound'], -0.5)
+        self.assertIn('error', results[2])
+
+    def test_ndjson_stream(self, score):
+        body = '"good day"\n{"text": "bad day"}\n\n"fine"\n'
+        results = self.read(self.client.post('/api/get/sentiment/batch/', body,
+                                             content_type='application/x-ndjson'))
+        self.assertEqual([r['prediction'] for r in results], [1, 0, 1])
+
+    def test_process_pool_keeps_order(self, score):
+        texts = ['bad' if i % 3 == 0 else 'good' for i in range(50)]
+        results = list(score_texts(texts, processes=2, chunk_size=7))
+        self.assertEqual([r['row'] for r in results], list(range(50)))
+        self.assertEqual([r['prediction'] for r in results], [0 if t == 'bad' else 1 for t in texts])
+
+    def test_requires_texts(self, score):
+        response = self.client.post('/api/get/sentiment/batch/', {'text': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ModelRegistryTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'model.pkl')
+        shutil.copyfile(DEFAULT_MODEL_PATH, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_loads_once_with_metadata(self):
+        registry = ModelRegistry(self.path)
+        model = registry.get()
+        self.assertIs(registry.get(), model)
+        self.assertEqual(registry.stats()['load_count'], 1)
+        self.assertEqual(model.classes, list(range(12)))
+        self.assertEqual(model.n_features, 19)
+        self.assertEqual(len(model.sha256), 64)
+        self.assertEqual(model.trained_sklearn_version, '1.2.2')
+
+    def test_reload_only_when_content_changes(self):
+        registry = ModelRegistry(self.path)
+        first = registry.get()
+        os.utime(self.path, ns=(0, 0))
+        self.assertFalse(registry.reload_if_changed())
+        with open(self.path, 'ab') as f:
+            f.write(b'\0')
+        self.assertTrue(registry.reload_if_changed())
+        self.assertIsNot(registry.get(), first)
+        self.assertIsNotNone(registry.stats()['last_reload_at'])
+
+    def test_info_endpoint_is_for_staff_only(self):
+        from django.contrib.auth.models import User
+
+        registry = ModelRegistry(self.path)
+        registry.get()
+        with mock.patch('prediction.views.get_registry', return_value=registry):
+            self.assertEqual(self.client.get('/api/get/model/').status_code, 403)
+            self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+            response = self.client.get('/api/get/model/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['model']['path'], self.path)
+
+    def test_missing_file(self):
+        registry = ModelRegistry(os.path.join(self.tmpdir, 'missing.pkl'))
+        with self.assertRaises(FileNotFoundError):
+            registry.get()
+        self.assertIsNotNone(registry.stats()['last_error'])
+
+
+class PredictionCacheTests(TestCase):
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_entries=2)
+        cache.invalidate('v1')
+        for key in (b'a', b'b'):
+            cache.put('v1', key, (1, 0.5))
+        cache.get('v1', b'a')
+        cache.put('v1', b'c', (2, 0.5))
+        self.assertIsNone(cache.get('v1', b'b'))
+        self.assertEqual(cache.get('v1', b'a'), (1, 0.5))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_never_serves_another_model_version(self):
+        cache = PredictionCache()
+        cache.invalidate('v1')
+        cache.put('v1', b'a', (1, 0.5))
+        cache.invalidate('v2')
+        self.assertIsNone(cache.get('v1', b'a'))
+        self.assertIsNone(cache.get('v2', b'a'))
+        # A request that scored with the old model after the reload
+        cache.put('v1', b'a', (1, 0.5))
+        self.assertIsNone(cache.get('v2', b'a'))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_pack(self):
+        self.assertEqual(pack(np.array([[1, 2, 27]], dtype=np.int32)), bytes([1, 2, 27]))
+        self.assertNotEqual(pack(np.array([1, 300])), pack(np.array([1, 44])))
+
+    def test_registry_reload_invalidates(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'model.pkl')
+        shutil.copyfile(DEFAULT_MODEL_PATH, path)
+        registry = ModelRegistry(path)
+        first = registry.get()
+        registry.results.put(first.version, b'a', (1, 0.5))
+        with open(path, 'ab') as f:
+            f.write(b'\0')
+        registry.reload_if_changed()
+        self.assertEqual(registry.stats()['result_cache']['version'], registry.get().version)
+        self.assertIsNone(registry.results.get(registry.get().version, b'a'))
+
+
+class RecommendationTests(TestCase):
+
+    def test_top_k_matches_full_sort(self):
+        proba = np.random.default_rng(0).random((200, 12))
+        np.testing.assert_array_equal(top_k_indices(proba, 4), np.argsort(-proba, axis=1)[:, :4])
+        np.testing.assert_array_equal(top_k_indices(proba, 1)[:, 0], proba.argmax(axis=1))
+
+    def test_ties_follow_argmax(self):
+        proba = np.array([[0.1, 0.4, 0.4, 0.1], [0.25, 0.25, 0.25, 0.25]])
+        self.assertEqual(top_k_indices(proba, 1).tolist(), [[1], [0]])
+        self.assertEqual(top_k_indices(proba, 3).tolist(), [[1, 2, 0], [0, 1, 2]])
+
+    def test_labels_come_from_model_classes(self):
+        # Classes that are not column indices
+        ranked = recommendations(np.array([0.2, 0.7, 0.1]), np.array([11, 5, 0]), 2)
+        self.assertEqual(ranked, [[
+            {'prediction': 5, 'label': 'QA Engineer', 'probability': 0.7},
+            {'prediction': 11, 'label': 'Mobile Applications Developer', 'probability': 0.2},
+        ]])
+
+    def test_parse_top_k(self):
+        self.assertIsNone(parse_top_k(None, 12))
+        self.assertEqual(parse_top_k('3', 12), 3)
+        self.assertEqual(parse_top_k('50', 12), 12)
+        self.assertEqual(parse_top_k('all', 12), 12)
+        for value in ('0', 'three'):
+            with self.assertRaises(ValueError):
+                parse_top_k(value, 12)
+
+
+class TrainModelTests(TestCase):
+
+    def test_dataset_encoding(self):
+        X, y, _ = load_dataset()
+        self.assertEqual(list(X.columns), FEATURE_COLUMNS)
+        self.assertEqual(sorted(set(y.tolist())), list(range(12)))
+        self.assertEqual(encode_target({'Suggested Job Role': ['UX Designer', 'Web Developer']}).tolist(), [2, 6])
+
+    def test_reproduces_the_shipped_model(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        call_command('train_model', '--output-dir', output_dir, stdout=io.StringIO())
+        build_dir = os.path.join(output_dir, os.listdir(output_dir)[0])
+        with open(os.path.join(build_dir, 'training.json')) as f:
+            report = json.load(f)
+        self.assertEqual(report['rows'], 6901)
+        self.assertEqual(set(report['models']['dt']['metrics']), {'accuracy', 'precision', 'recall', 'f1'})
+
+        # The notebook's split and seed give the same tree as dtmodel.pkl
+        trained = ModelRegistry(os.path.join(build_dir, 'dt')).get().predictor
+        X, _, _ = load_dataset()
+        shipped = get_registry().get().predictor
+        np.testing.assert_array_equal(trained.predict(X.to_numpy()), shipped.predict(X.to_numpy()))
+
+
+class BenchmarkTests(TestCase):
+
+    def test_command_reports_every_suite_as_json(self):
+        out = io.StringIO()
+        call_command('benchmark_prediction', '--repeat', '2', '--rows', '100', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['dataset_rows'], 100)
+        self.assertEqual(report['environment']['model']['engine'], 'FlatTree')
+        for case in ('load.model', 'encode.one', 'encode.frame.100', 'predict_proba.FlatTree.1',
+                     'predict_proba.sklearn.64', 'http.quiz', 'http.quiz_repeated'):
+            self.assertGreater(report['results'][case]['p50_us'], 0, case)
+
+    def test_compare_flags_slower_cases(self):
+        baseline = {'results': {'a': {'p50_us': 100.0}, 'b': {'p50_us': 100.0}}}
+        current = {'results': {'a': {'p50_us': 130.0}, 'b': {'p50_us': 110.0}, 'new': {'p50_us': 5.0}}}
+        self.assertEqual(compare(baseline, current, 0.2), {
+            'a': {'baseline_us': 100.0, 'current_us': 130.0, 'change': 0.3},
+        })
+
+
+class TimingTests(TestCase):
+
+    def test_server_timing_header(self):
+        get_registry().results.invalidate(get_registry().get().version)
+        response = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        stages = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['model', 'encode', 'predict', 'total'])
+        # Served from the result cache the second time
+        response = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        self.assertNotIn('predict;', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{method="POST",route="api/get/quiz/",status="200"}', body)
+        self.assertIn('stage_duration_seconds_bucket{stage="encode",le="+Inf"}', body)
+        with self.settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    def test_histogram_rendering(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            registry.observe('stage_duration_seconds', value, 'Stages', stage='a"b')
+        self.assertEqual(registry.render().splitlines()[2:], [
+            'stage_duration_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+            'stage_duration_seconds_bucket{stage="a\\"b",le="1.0"} 3',
+            'stage_duration_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+            'stage_duration_seconds_sum{stage="a\\"b"} 4.05',
+            'stage_duration_seconds_count{stage="a\\"b"} 4',
+        ])
+
+    def test_span_outside_a_request_only_feeds_the_histogram(self):
+        before = getattr(metrics.histogram('stage_duration_seconds', stage='offline'), 'count', 0)
+        with span('offline'):
+            pass
+        self.assertEqual(metrics.histogram('stage_duration_seconds', stage='offline').count, before + 1)
+
+
+class PredictionViewTests(TestCase):
+
+    def test_predict(self):
+        response = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()['prediction'], range(12))
+        self.assertLessEqual(response.json()['probability'], 1.0)
+
+    def test_model_is_not_reloaded_per_request(self):
+        self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        count = get_registry().stats()['load_count']
+        self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json')
+        self.assertEqual(get_registry().stats()['load_count'], count)
+
+    def test_repeated_answers_are_served_from_cache(self):
+        results = get_registry().results
+        first = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json').json()
+        hits = results.hits
+        with mock.patch.object(get_registry().get().predictor, 'predict_proba') as predict_proba:
+            second = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json').json()
+        predict_proba.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertEqual(results.hits, hits + 1)
+
+    def test_invalid_option(self):
+        answers = dict(QUIZ_ANSWERS, question7='Basket Weaving')
+        response = self.client.post('/api/get/quiz/', answers, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_top_k(self):
+        plain = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json').json()
+        response = self.client.post('/api/get/quiz/?top_k=3', QUIZ_ANSWERS, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        ranked = response.json()['recommendations']
+        self.assertEqual(len(ranked), 3)
+        self.assertEqual(ranked[0]['prediction'], plain['prediction'])
+        self.assertAlmostEqual(ranked[0]['probability'], plain['probability'])
+        self.assertEqual(ranked[0]['label'], CAREER_LABELS[plain['prediction']])
+        self.assertEqual([r['probability'] for r in ranked], sorted((r['probability'] for r in ranked), reverse=True))
+
+        everything = self.client.post('/api/get/quiz/?top_k=all', QUIZ_ANSWERS, content_type='application/json')
+        self.assertAlmostEqual(sum(r['probability'] for r in everything.json()['recommendations']), 1.0)
+        bad = self.client.post('/api/get/quiz/?top_k=0', QUIZ_ANSWERS, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+
+class BatchPredictionTests(TestCase):
+
+    def test_json_batch_matches_single_prediction(self):
+        single = self.client.post('/api/get/quiz/', QUIZ_ANSWERS, content_type='application/json').json()
+        bad = dict(QUIZ_ANSWERS, question8='Knitting')
+        response = self.client.post('/api/get/quiz/batch/', [QUIZ_ANSWERS, bad, QUIZ_ANSWERS],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([r['row'] for r in results], [0, 1, 2])
+        self.assertEqual(results[0]['prediction'], single['prediction'])
+        self.assertAlmostEqual(results[0]['probability'], single['probability'])
+        self.assertIn('error', results[1])
+
+    def test_csv_upload(self):
+        with open(os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), '../datasets/prediction-data.csv'), 'rb') as f:
+            head = b''.join(f.readline() for _ in range(6))
+        upload = SimpleUploadedFile('students.csv', head, content_type='text/csv')
+        response = self.client.post('/api/get/quiz/batch/?output=csv', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'row,prediction,probability,error')
+        self.assertEqual(len(lines), 6)
+
+    def test_batch_top_k_matches_single(self):
+        single = self.client.post('/api/get/quiz/?top_k=3', QUIZ_ANSWERS, content_type='application/json').json()
+        response = self.client.post('/api/get/quiz/batch/?top_k=3', [QUIZ_ANSWERS, QUIZ_ANSWERS],
+                                    content_type='application/json')
+        results = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        for result in results:
+            self.assertEqual([r['prediction'] for r in result['recommendations']],
+                             [r['prediction'] for r in single['recommendations']])
+
+        response = self.client.post('/api/get/quiz/batch/?output=csv&top_k=2', [QUIZ_ANSWERS],
+                                    content_type='application/json')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'row,prediction,probability,error,recommendations')
+
+    def test_chunks_preserve_order(self):
+        model = get_registry().get().estimator
+        rows = [dict(QUIZ_ANSWERS, question1=str(i % 9 + 1)) for i in range(25)]
+        chunked = list(score_rows(model, rows, chunk_size=4))
+        whole = list(score_rows(model, rows, chunk_size=100))
+        self.assertEqual(chunked, whole)
+
+    def test_rejects_non_array(self):
+        response = self.client.post('/api/get/quiz/batch/', {'text': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class SignInTests(TestCase):
+
+    def setUp(self):
+        # A real rehash would write from another thread, outside the test's transaction
+        patch = mock.patch('prediction.accounts.schedule_rehash')
+        self.schedule_rehash = patch.start()
+        self.addCleanup(patch.stop)
+        response = self.client.post('/api/auth/signup/', {
+            'name': 'Asha', 'age': 21, 'email': 'asha@example.com', 'password': 'correct horse',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def signin(self, email='asha@example.com', password='correct horse'):
+        return self.client.post('/api/auth/signin/', {'email': email, 'password': password},
+                                content_type='application/json')
+
+    def test_signed_up_account_can_sign_in_with_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.signin()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'success': True, 'message': 'Login successful'})
+
+    def test_wrong_password_and_unknown_email(self):
+        self.assertEqual(self.signin(password='wrong').status_code, 400)
+        self.assertEqual(self.signin(email='nobody@example.com').status_code, 400)
+
+    def test_signup_stores_a_hash(self):
+        user = UserModel.objects.get(email='asha@example.com')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(check_password('correct horse', user.password))
+
+    def test_outdated_hash_is_rehashed_outside_the_request(self):
+        user = UserModel.objects.get(email='asha@example.com')
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.signin().status_code, 200)
+            (account, password), _ = self.schedule_rehash.call_args
+            self.assertEqual((account.pk, password), (user.pk, 'correct horse'))
+
+            rehash(user.pk, user.password, 'correct horse')
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertEqual(self.signin().status_code, 200)
+
+    def test_rehash_keeps_a_password_changed_meanwhile(self):
+        user = UserModel.objects.get(email='asha@example.com')
+        UserModel.objects.filter(pk=user.pk).update(password=make_password('new password'))
+        rehash(user.pk, user.password, 'correct horse')
+        self.assertEqual(self.signin(password='new password').status_code, 200)
+
+    def test_one_pending_rehash_per_account(self):
+        release = threading.Event()
+        with mock.patch('prediction.accounts.rehash', side_effect=lambda *args: release.wait(5)) as rehash_mock:
+            rehasher = Rehasher()
+            first = rehasher.submit(1, 'old', 'secret')
+            self.assertIsNone(rehasher.submit(1, 'old', 'secret'))
+            self.assertEqual(rehasher.pending(), 1)
+            release.set()
+            first.result(5)
+        self.assertEqual(rehasher.pending(), 0)
+        self.assertEqual(rehash_mock.call_count, 1)
+
+    def test_benchmark_counts_connections_per_request(self):
+        from .benchmarks import bench_auth
+
+        results = bench_auth(repeat=1, iterations=(1000, 2000))
+        self.assertEqual(set(results), {'auth.signin.conn_max_age_0', 'auth.signin.conn_max_age_600',
+                                        'auth.password.1000', 'auth.password.2000'})
+        self.assertTrue(results['auth.password.1000']['current'])
+        self.assertLessEqual(results['auth.signin.conn_max_age_600']['connections_per_request'],
+                             results['auth.signin.conn_max_age_0']['connections_per_request'])
+        self.assertFalse(UserModel.objects.filter(email__startswith='benchmark-').exists())
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class UserImportTests(TestCase):
+    CSV = (
+        'name,age,email,password\n'
+        'Asha,21,asha@example.com,pw-asha\n'
+        'Ben,not a number,ben@example.com,pw-ben\n'
+        'Chen,22,taken@example.com,pw-chen\n'
+        'Dana,23,asha@example.com,pw-dana\n'
+        'Eli,24,eli@example.com,pw-eli\n'
+    )
+
+    def setUp(self):
+        patch = mock.patch('prediction.accounts.schedule_rehash')
+        patch.start()
+        self.addCleanup(patch.stop)
+        UserModel.objects.create(name='Taken', age=30, email='taken@example.com', password=make_password('x'))
+
+    def test_command_imports_valid_rows_and_reports_the_others(self):
+        path = os.path.join(tempfile.mkdtemp(), 'users.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(self.CSV)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_users', path, '--chunk-size', '2', stdout=out, stderr=err)
+
+        errors = {row['row']: row['error'] for row in map(json.loads, out.getvalue().splitlines())}
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        self.assertIn('age', errors[1])
+        self.assertIn('already exists', errors[2])
+        self.assertIn('duplicate', errors[3])
+        self.assertIn('Imported 2 of 5 users (3 errors)', err.getvalue())
+        self.assertEqual(self.client.post('/api/auth/signin/', {'email': 'eli@example.com', 'password': 'pw-eli'},
+                                          content_type='application/json').status_code, 200)
+
+    def test_one_email_query_per_chunk(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        rows = [{'name': f'User {i}', 'age': 20, 'email': f'user{i}@example.com', 'password': 'pw'} for i in range(10)]
+        with CaptureQueriesContext(connection) as queries:
+            results = list(import_users(rows, chunk_size=5, batch_size=2))
+        selects = [q for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual((len(selects), len(inserts)), (2, 6))
+        self.assertTrue(all('id' in result for result in results))
+
+    def test_dry_run_creates_nothing(self):
+        rows = [{'name': 'Asha', 'age': 21, 'email': 'asha@example.com', 'password': 'pw'}]
+        self.assertEqual(list(import_users(rows, commit=False)), [{'row': 0, 'email': 'asha@example.com'}])
+        self.assertFalse(UserModel.objects.filter(email='asha@example.com').exists())
+
+    def test_conflicting_insert_only_fails_its_row(self):
+        users = [UserModel(name='A', age=1, email='a@example.com', password='x'),
+                 UserModel(name='T', age=1, email='taken@example.com', password='x')]
+        self.assertEqual(list(_insert(users, batch_size=10)), [1])
+        self.assertTrue(UserModel.objects.filter(email='a@example.com').exists())
+
+    def test_endpoint_is_for_staff_only(self):
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        self.assertEqual(self.client.post('/api/auth/signup/batch/', {'file': upload}).status_code, 403)
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        upload.seek(0)
+        response = self.client.post('/api/auth/signup/batch/?output=csv', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'row,email,id,error')
+        self.assertEqual(len(lines), 6)
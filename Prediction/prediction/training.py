@@ -0,0 +1,174 @@
+"""
+Offline training of the career prediction models.
+
+This is the pipeline of ``career_path_prediction_system.ipynb`` as code:
+read ``datasets/prediction-data.csv`` with explicit dtypes (ratings as small
+ints, answers as pandas categories), encode it with the ``features`` schema
+in one vectorized step, split it like the notebook (20% test, seed 2) and fit
+the decision tree, random forest and/or SVM with the notebook's parameters.
+The models are independent, so they are fitted in parallel by joblib when
+``n_jobs`` allows.
+
+``write_build`` stores every model of a run in one versioned directory with
+a ``training.json`` report (dataset hash, metrics, timings)::
+
+    builds/20240501-120000-3f2a9c/
+        training.json
+        dt.pkl   dt/            (artifact, see ``artifacts``)
+        rf.pkl   rf/
+        svm.pkl
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from .features import FEATURE_COLUMNS, FEATURES, TARGET_COLUMN, encode_frame, encode_target
+
+DATASET_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '../datasets/prediction-data.csv'))
+DEFAULT_BUILD_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '../ml_models/builds'))
+TEST_SIZE = 0.2
+SPLIT_SEED = 2
+
+
+def _decision_tree():
+    from sklearn.tree import DecisionTreeClassifier
+    return DecisionTreeClassifier(random_state=1)
+
+
+def _random_forest():
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(random_state=10)
+
+
+def _svm():
+    from sklearn.svm import SVC
+    return SVC()
+
+
+# Same estimators and parameters as the notebook
+ESTIMATORS = {
+    'dt': _decision_tree,
+    'rf': _random_forest,
+    'svm': _svm,
+}
+
+
+def dataset_dtypes():
+    dtypes = {feature.column: 'int8' if feature.labels is None else 'category' for feature in FEATURES}
+    dtypes[TARGET_COLUMN] = 'category'
+    return dtypes
+
+
+def load_dataset(path=DATASET_PATH):
+    """Return ``(X, y, seconds)``, the encoded ``int32`` feature matrix and job role codes."""
+    import pandas as pd
+
+    started = time.perf_counter()
+    data = pd.read_csv(path, usecols=FEATURE_COLUMNS + [TARGET_COLUMN], dtype=dataset_dtypes())
+    X = pd.DataFrame(encode_frame(data), columns=FEATURE_COLUMNS)
+    y = encode_target(data)
+    return X, y, time.perf_counter() - started
+
+
+def _fit_and_score(name, X_train, y_train, X_test, y_test):
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+    estimator = ESTIMATORS[name]()
+    started = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    y_pred = estimator.predict(X_test)
+    predict_seconds = time.perf_counter() - started
+    metrics = {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
+        'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
+        'f1': f1_score(y_test, y_pred, average='weighted', zero_division=0),
+    }
+    return name, estimator, {
+        'estimator': type(estimator).__name__,
+        'params': {key: value for key, value in estimator.get_params().items() if _json_scalar(value)},
+        'metrics': {key: round(float(value), 6) for key, value in metrics.items()},
+        'fit_seconds': round(fit_seconds, 4),
+        'predict_seconds': round(predict_seconds, 4),
+    }
+
+
+def _json_scalar(value):
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def train_models(X, y, names=('dt',), n_jobs=1, test_size=TEST_SIZE, random_state=SPLIT_SEED):
+    """Fit ``names`` on one shared split, returns ``{name: (estimator, report)}``."""
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import train_test_split
+
+    unknown = [name for name in names if name not in ESTIMATORS]
+    if unknown:
+        raise ValueError(f'Unknown model {", ".join(unknown)}, expected {", ".join(ESTIMATORS)}')
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    results = Parallel(n_jobs=min(n_jobs, len(names)) if n_jobs > 0 else n_jobs)(
+        delayed(_fit_and_score)(name, X_train, y_train, X_test, y_test) for name in names
+    )
+    return {name: (estimator, report) for name, estimator, report in results}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_build(models, output_dir=DEFAULT_BUILD_DIR, dataset_path=DATASET_PATH, report=None):
+    """
+    Write the fitted ``models`` of ``train_models`` to a new versioned directory.
+
+    Trees and forests are also exported as artifacts. Returns the directory
+    and the ``training.json`` report.
+    """
+    import joblib
+    import sklearn
+
+    from .artifacts import export_artifact
+    from .inference import build_engine
+
+    dataset_sha256 = _file_sha256(dataset_path)
+    version = f'{datetime.datetime.now().strftime("%Y%m%d-%H%M%S")}-{dataset_sha256[:6]}'
+    build_dir = os.path.join(output_dir, version)
+    os.makedirs(build_dir)
+
+    report = dict(report or {})
+    report.update(
+        version=version,
+        created_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        sklearn_version=sklearn.__version__,
+        dataset={'path': os.path.basename(dataset_path), 'sha256': dataset_sha256},
+        models={},
+    )
+    for name, (estimator, model_report) in models.items():
+        started = time.perf_counter()
+        pickle_path = os.path.join(build_dir, f'{name}.pkl')
+        joblib.dump(estimator, pickle_path)
+        model_report = dict(model_report, pickle=os.path.basename(pickle_path), artifact=None)
+        engine = build_engine(estimator)
+        if engine is not None:
+            export_artifact(engine, os.path.join(build_dir, name), feature_names=FEATURE_COLUMNS, source={
+                'path': os.path.basename(pickle_path),
+                'sha256': _file_sha256(pickle_path),
+                'estimator': type(estimator).__name__,
+                'sklearn_version': sklearn.__version__,
+                'training_version': version,
+                'metrics': model_report['metrics'],
+            })
+            model_report['artifact'] = name
+        model_report['write_seconds'] = round(time.perf_counter() - started, 4)
+        report['models'][name] = model_report
+
+    with open(os.path.join(build_dir, 'training.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return build_dir, report
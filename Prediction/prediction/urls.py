@@ -1,10 +1,14 @@
 from django.urls import path
-from .views import PredictionView, SentimentAnalysisView, SignUpView, SignInView, UserDetailsView
+from .views import BatchPredictionView, BatchSentimentView, ModelInfoView, PredictionView, SentimentAnalysisView, SignUpView, SignInView, UserDetailsView, UserImportView
 
 urlpatterns = [
     path('auth/signup/',SignUpView.as_view(),name='signup'),
+    path('auth/signup/batch/', UserImportView.as_view(), name='signup_batch'),
     path('auth/signin/',SignInView.as_view(),name='signin'),
     path('get/quiz/',PredictionView.as_view(),name='predict'),
+    path('get/quiz/batch/', BatchPredictionView.as_view(), name='predict_batch'),
+    path('get/model/', ModelInfoView.as_view(), name='model_info'),
     path('get/sentiment/', SentimentAnalysisView.as_view(), name='get_sentiment'),
+    path('get/sentiment/batch/', BatchSentimentView.as_view(), name='get_sentiment_batch'),
     path('get/user/',UserDetailsView.as_view(),name='user')
 ]
@@ -0,0 +1,144 @@
+"""
+Bulk import of accounts (``UserModel``), e.g. a whole university at once.
+
+Rows are validated like ``/api/auth/signup/`` (``name``, ``age``, ``email``,
+``password``), but per chunk instead of per row:
+
+- the emails of a chunk are checked against the table with one ``IN``
+  query, and against the earlier rows of the import,
+- passwords are hashed on a thread pool (PBKDF2 releases the GIL, so the
+  hashing uses several cores),
+- the valid rows are written with ``bulk_create`` in ``batch_size`` INSERTs,
+  inside one transaction per chunk.
+
+Invalid rows are reported and skipped, they never abort the import. When a
+chunk's INSERT fails anyway (an account created by a signup at the same
+moment) its rows are retried one by one, so only the conflicting rows fail.
+"""
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .batch import BatchInputError
+from .models import UserModel
+from .serializers import UserImportSerializer
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_BATCH_SIZE = 250
+USER_FIELDS = ('name', 'age', 'email', 'password')
+IMPORT_RESULT_FIELDS = ['row', 'email', 'id', 'error']
+
+
+def _errors(serializer_errors):
+    return '; '.join(f'{field}: {" ".join(str(message) for message in messages)}'
+                     for field, messages in serializer_errors.items())
+
+
+def _insert(users, batch_size):
+    """Insert ``users``, returns ``{index: error}`` for the ones that could not be."""
+    try:
+        with transaction.atomic():
+            UserModel.objects.bulk_create(users, batch_size=batch_size)
+        return {}
+    except IntegrityError:
+        pass
+    errors = {}
+    for user in users:
+        user.pk = None
+    for i, user in enumerate(users):
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            errors[i] = 'email: user model with this email already exists.'
+    return errors
+
+
+def _import_chunk(chunk, offset, seen, batch_size, executor, commit):
+    results = [None] * len(chunk)
+    valid = []
+    for i, row in enumerate(chunk):
+        serializer = UserImportSerializer(data=row)
+        if not serializer.is_valid():
+            results[i] = {'row': offset + i, 'email': row.get('email'), 'error': _errors(serializer.errors)}
+            continue
+        email = serializer.validated_data['email']
+        if email in seen:
+            results[i] = {'row': offset + i, 'email': email, 'error': 'email: duplicate email in this import.'}
+            continue
+        seen.add(email)
+        valid.append((i, serializer.validated_data))
+
+    # One query for the whole chunk instead of one per row
+    existing = set(UserModel.objects.filter(email__in=[data['email'] for _, data in valid])
+                   .values_list('email', flat=True))
+    new = []
+    for i, data in valid:
+        if data['email'] in existing:
+            results[i] = {'row': offset + i, 'email': data['email'],
+                          'error': 'email: user model with this email already exists.'}
+        else:
+            new.append((i, data))
+
+    if commit and new:
+        hashes = executor.map(make_password, [data['password'] for _, data in new])
+        users = [UserModel(**dict(data, password=encoded)) for (_, data), encoded in zip(new, hashes)]
+        errors = _insert(users, batch_size)
+    else:
+        users = [None] * len(new)
+        errors = {}
+    for n, ((i, data), user) in enumerate(zip(new, users)):
+        result = {'row': offset + i, 'email': data['email']}
+        if n in errors:
+            result['error'] = errors[n]
+        elif user is not None and user.pk is not None:
+            result['id'] = user.pk
+        results[i] = result
+    return results
+
+
+def import_users(rows, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE, hash_workers=None,
+                 commit=True):
+    """
+    Create an account per row and yield one result dict per row, in input
+    order, with the new ``id`` or an ``error``. With ``commit=False`` rows
+    are only validated.
+    """
+    seen = set()
+    offset = 0
+    chunk = []
+    with ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix='import-hash') as executor:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from _import_chunk(chunk, offset, seen, batch_size, executor, commit)
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            yield from _import_chunk(chunk, offset, seen, batch_size, executor, commit)
+
+
+def read_user_rows(stream):
+    """Read accounts from a text or binary CSV stream with ``name,age,email,password`` columns."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    missing = [field for field in USER_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise BatchInputError(f'CSV is missing columns: {", ".join(missing)}')
+    return reader
+
+
+def read_json_users(data):
+    """Accept a list of accounts or ``{"users": [...]}``."""
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise BatchInputError('Expected a JSON array of users')
+    for row in data:
+        if not isinstance(row, dict):
+            raise BatchInputError('Each user must be a JSON object')
+    return data
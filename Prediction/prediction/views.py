@@ -1,171 +1,79 @@
 #from django.shortcuts import render
 
 # Create your views here.
-import joblib
-import os
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
+from django.http import StreamingHttpResponse
 
+from .accounts import check_credentials
+from .features import encoder
+from .batch import DEFAULT_CHUNK_SIZE, RENDERERS, RESULT_FIELDS, BatchInputError, read_csv_rows, read_json_rows, score_rows
 from .serializers import PredictionSerializer, SignInSerializer, SignUpSerializer, UserSerializer
-from django.contrib.auth import authenticate
 
-from utils.utility import predict_sentiment
+from .model_registry import ModelLoadError, get_model, get_registry
+from .recommendations import parse_top_k, recommendations
+from .result_cache import pack
+from .user_import import IMPORT_RESULT_FIELDS, import_users, read_json_users, read_user_rows
+
+from django.conf import settings
+import json
+
+from utils.timing import span
+from utils.utility import predict_sentiment, score_texts
 
 class PredictionView(APIView):
     def post(self, request, *args, **kwargs):
         serializer = PredictionSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                # Load the model with scikit-learn version compatibility handling
-                model_path = os.path.join(os.path.dirname(__file__), '../ml_models/dtmodel.pkl')
-                if not os.path.exists(model_path):
+                # The registry loads (and patches) the model once per process
+                try:
+                    with span('model'):
+                        loaded = get_model()
+                except FileNotFoundError:
                     return Response({
                         'error': 'Prediction model not found'
                     }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
+                except ModelLoadError as e:
+                    return Response({
+                        'error': str(e)
+                    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
                 try:
-                    # Try standard joblib load first
-                    model = joblib.load(model_path)
-                except (ValueError, TypeError) as e:
-                    error_str = str(e)
-                    if 'incompatible dtype' in error_str or 'missing_go_to_left' in error_str:
-                        # Handle scikit-learn version mismatch by patching the tree structure
-                        try:
-                            import pickle
-                            import numpy as np
-                            
-                            # Load raw pickle
-                            with open(model_path, 'rb') as f:
-                                model = pickle.load(f)
-                            
-                            # Patch the tree structure if needed
-                            if hasattr(model, 'tree_') and hasattr(model.tree_, 'nodes'):
-                                try:
-                                    # Check if nodes array needs patching
-                                    nodes = model.tree_.nodes
-                                    if nodes.dtype.names and 'missing_go_to_left' not in nodes.dtype.names:
-                                        # Create new dtype with missing_go_to_left field
-                                        old_dtype = nodes.dtype
-                                        new_dtype = np.dtype([
-                                            ('left_child', '<i8'),
-                                            ('right_child', '<i8'),
-                                            ('feature', '<i8'),
-                                            ('threshold', '<f8'),
-                                            ('impurity', '<f8'),
-                                            ('n_node_samples', '<i8'),
-                                            ('weighted_n_node_samples', '<f8'),
-                                            ('missing_go_to_left', 'u1')
-                                        ])
-                                        
-                                        # Create new array with compatible dtype
-                                        new_nodes = np.zeros(nodes.shape, dtype=new_dtype)
-                                        for field in old_dtype.names:
-                                            new_nodes[field] = nodes[field]
-                                        # Set default value for missing_go_to_left
-                                        new_nodes['missing_go_to_left'] = 0
-                                        
-                                        # Replace the nodes array
-                                        model.tree_.nodes = new_nodes
-                                except Exception:
-                                    pass  # If patching fails, try prediction anyway
-                        except Exception as patch_error:
-                            return Response({
-                                'error': f'Model compatibility error: {str(e)}. The model was created with a different scikit-learn version. Please reinstall scikit-learn==1.2.2'
-                            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                    else:
-                        raise e
-
-                # Extract and encode data
-                data = [
-                serializer.validated_data['question1'],
-                serializer.validated_data['question2'],
-                serializer.validated_data['question3'],
-                serializer.validated_data['question4'],
-                serializer.validated_data['question5'],
-                serializer.validated_data['question6'],
-                serializer.validated_data['question7'],
-                serializer.validated_data['question8'],
-                serializer.validated_data['question9'],
-                serializer.validated_data['question10'],
-                serializer.validated_data['question11'],
-                serializer.validated_data['question12'],
-                serializer.validated_data['question13'],
-                serializer.validated_data['question14'],
-                serializer.validated_data['question15'],
-                serializer.validated_data['question16'],
-                serializer.validated_data['question17'],
-                serializer.validated_data['question18'],
-                serializer.validated_data['question19'],
-                ]
-
-                # Encode categorical data (example encoding)
-                encoding_question7 = {
-                'R Programming': 0,
-                'Information Security': 1,
-                'Shell Programming': 2,
-                'Machine Learning': 3,
-                'Full Stack':4,
-                'Hadoop':5,
-                'Python':6,
-                'Distro Making':7,
-                'App Development':8
-
-                }
-
-                encoding_question8 = {
-                'Database Security': 0,
-                'System Designing': 1,
-                'Web Technologies': 2,
-                'Machine Learning': 3,
-                'Hacking':4,
-                'Testing':5,
-                'Data Science':6,
-                'Game Development':7,
-                'Cloud Computing':8
-
-                }
-
-
-                encoded_data = [
-                int(data[0]),  # Assuming question1 is already numeric
-                int(data[1]),  # Assuming question2 is already numeric
-                int(data[2]),  # Assuming question3 is already numeric
-                int(data[3]),  # Assuming question4 is already numeric
-                int(data[4]),  # Assuming question5 is already numeric
-                int(data[5]),   # Assuming question6 is already numeric
-                encoding_question7[data[6]],
-                encoding_question8[data[7]],
-                int(data[8]),  # Assuming question1 is already numeric
-                int(data[9]),  # Assuming question2 is already numeric
-                int(data[10]),  # Assuming question3 is already numeric
-                int(data[11]),  # Assuming question4 is already numeric
-                int(data[12]),  # Assuming question5 is already numeric
-                int(data[13]),   # Assuming question6 is already numeric
-                int(data[14]),  # Assuming question1 is already numeric
-                int(data[15]),  # Assuming question2 is already numeric
-                int(data[16]),  # Assuming question3 is already numeric
-                int(data[17]),  # Assuming question4 is already numeric
-                int(data[18]),  # Assuming question5 is already numeric
-                ]
-
-                # Make prediction
-                prediction = model.predict([encoded_data])
-
-                #Get the probability
-                prediction_probability = model.predict_proba([encoded_data])
-
-                # Get the probability of the predicted class
-                predicted_class = int(prediction[0])
-                predicted_proba = float(prediction_probability[0][predicted_class])
+                    top_k = parse_top_k(request.query_params.get('top_k'), len(loaded.classes))
+                except ValueError:
+                    return Response({
+                        'error': 'top_k must be a positive integer or "all"'
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
-                return Response({
-                    'prediction': predicted_class,
-                    'probability': predicted_proba
-                    }, status=status.HTTP_200_OK)
+                # Encode the answers with the schema the model was trained on
+                with span('encode'):
+                    encoded_data = encoder.encode_one(serializer.validated_data)
+
+                # Identical answer sets are scored once per model version
+                results = get_registry().results
+                key = pack(encoded_data)
+                probabilities = results.get(loaded.version, key)
+                if probabilities is None:
+                    # One pass over the tree gives the whole distribution
+                    with span('predict'):
+                        probabilities = loaded.predictor.predict_proba(encoded_data)[0].copy()
+                    probabilities.flags.writeable = False
+                    results.put(loaded.version, key, probabilities)
+
+                classes = loaded.predictor.classes_
+                best = int(probabilities.argmax())
+                result = {
+                    'prediction': int(classes[best]),
+                    'probability': float(probabilities[best])
+                    }
+                if top_k is not None:
+                    result['recommendations'] = recommendations(probabilities, classes, top_k)[0]
+                return Response(result, status=status.HTTP_200_OK)
             except KeyError as e:
                 return Response({
                     'error': f'Invalid option selected: {str(e)}'
@@ -178,6 +86,53 @@ class PredictionView(APIView):
     
 
 
+class BatchPredictionView(APIView):
+    """
+    Score many quiz submissions in one call.
+
+    Takes a JSON array of submissions or a CSV upload (``file``) in the
+    prediction-data.csv layout and streams one result per row back as NDJSON
+    (default) or CSV with ``?output=csv``. ``?top_k=3`` (or ``all``) adds the
+    best job roles of each row, as in the single prediction.
+    """
+
+    def post(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in RENDERERS:
+            return Response({'error': f'Unsupported output format: {output}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except ValueError:
+            return Response({'error': 'chunk_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if 'file' in request.FILES:
+                rows = read_csv_rows(request.FILES['file'].file)
+            else:
+                rows = read_json_rows(request.data)
+            model = get_model().predictor
+            top_k = parse_top_k(request.query_params.get('top_k'), len(model.classes_))
+        except BatchInputError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'top_k must be a positive integer or "all"'}, status=status.HTTP_400_BAD_REQUEST)
+        except (FileNotFoundError, ModelLoadError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        render, content_type = RENDERERS[output]
+        fields = RESULT_FIELDS + ['recommendations'] if top_k is not None else RESULT_FIELDS
+        results = score_rows(model, rows, max(chunk_size, 1), top_k)
+        return StreamingHttpResponse(render(results, fields), content_type=content_type)
+
+
+class ModelInfoView(APIView):
+    # The stats include the model's path on the server
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_registry().stats(), status=status.HTTP_200_OK)
+
+
 class SignUpView(APIView):
     def post(self, request, *args, **kwargs):
          serializer = SignUpSerializer(data=request.data)
@@ -188,14 +143,52 @@ class SignUpView(APIView):
              return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserImportView(APIView):
+    """
+    Create many accounts in one call, for staff users only.
+
+    Takes a JSON array of signup payloads or a CSV upload (``file``) with
+    ``name,age,email,password`` columns and streams one result per row back
+    as NDJSON (default) or CSV with ``?output=csv``: the new ``id`` or the
+    ``error`` of a row that was skipped. ``?chunk_size`` and ``?batch_size``
+    tune the transactions and INSERTs, see ``user_import``.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in RENDERERS:
+            return Response({'error': f'Unsupported output format: {output}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            sizes = {name: int(request.query_params[name])
+                     for name in ('chunk_size', 'batch_size') if name in request.query_params}
+        except ValueError:
+            return Response({'error': 'chunk_size and batch_size must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if 'file' in request.FILES:
+                rows = read_user_rows(request.FILES['file'].file)
+            else:
+                rows = read_json_users(request.data)
+        except BatchInputError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        render, content_type = RENDERERS[output]
+        results = import_users(rows, **{name: max(size, 1) for name, size in sizes.items()})
+        return StreamingHttpResponse(render(results, IMPORT_RESULT_FIELDS), content_type=content_type)
+
+
 class SignInView(APIView):
     def post(self, request, *args, **kwargs):
         serializer = SignInSerializer(data=request.data)
         if serializer.is_valid():
             email = serializer.validated_data['email']
             password = serializer.validated_data['password']
-            user = authenticate(request, username=email, password=password)
-            
+            # One indexed query on UserModel, the table signup writes to
+            with span('user_lookup'):
+                user = check_credentials(email, password)
+
             if user is not None:
                 return Response({'success': True, 'message': 'Login successful'}, status=status.HTTP_200_OK)
             else:
@@ -225,4 +218,45 @@ class SentimentAnalysisView(APIView):
                 return Response({"error": "No text provided"}, status=status.HTTP_400_BAD_REQUEST)
             
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _ndjson_texts(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        yield item.get('text') if isinstance(item, dict) else item
+
+
+class BatchSentimentView(APIView):
+    """
+    Score many texts in one call.
+
+    Takes ``{"texts": [...]}`` (or a bare JSON array) or an
+    ``application/x-ndjson`` body with one string or ``{"text": ...}`` object
+    per line, and streams one NDJSON result per text back in input order with
+    the prediction, the raw VADER scores and the matched emotions.
+    """
+
+    def post(self, request, *args, **kwargs):
+        processes = getattr(settings, 'SENTIMENT_BATCH_PROCESSES', 0)
+        if request.content_type.startswith('application/x-ndjson'):
+            texts = _ndjson_texts(request.stream) if request.stream is not None else iter(())
+        else:
+            data = request.data
+            texts = data.get('texts') if isinstance(data, dict) else data
+            if not isinstance(texts, list):
+                return Response({"error": "No texts provided"}, status=status.HTTP_400_BAD_REQUEST)
+            # Small batches are not worth starting a process pool for
+            if len(texts) < getattr(settings, 'SENTIMENT_POOL_MIN_TEXTS', 1000):
+                processes = 0
+
+        results = score_texts(texts, processes=processes)
+        return StreamingHttpResponse((json.dumps(result) + '\n' for result in results),
+                                     content_type='application/x-ndjson')
+
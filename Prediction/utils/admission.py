@@ -0,0 +1,263 @@
+"""
+Admission control for the LLM-backed endpoints (``/api/chat/``, ``/api/voice/``).
+
+A burst of questions would otherwise go straight to Gemini, run into its
+rate limits and then walk the whole model fallback chain, multiplying the
+load. Before a request starts an answer it has to pass three checks, and is
+refused straight away when one fails:
+
+- a bounded number of answers in flight in this worker process
+  (503 and ``Retry-After``),
+- a token bucket shared by all clients (503 and ``Retry-After``),
+- a token bucket per client, keyed by its address (429 and ``Retry-After``
+  when the client asks faster than its rate, after using up its burst). It
+  is off unless configured: behind a proxy that is not counted in
+  ``trusted_proxies`` all users would share the proxy's bucket.
+
+The buckets live in this process (``LocalBucketStore``) or in a Django cache
+(``CacheBucketStore``), where all workers draw from the same buckets. A cache
+bucket is updated under a short lock key, a request that cannot get the lock
+quickly is refused as well rather than queued. When the cache itself fails,
+requests are let through, like the answer cache a cache outage must not take
+the chatbot down. The in-flight limit is always per process.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CLIENTS = 10000
+LOCK_TTL = 1
+LOCK_WAIT = 0.05
+LOCK_POLL_INTERVAL = 0.002
+BUSY_RETRY_AFTER = 1
+
+
+class Overloaded(Exception):
+    """A request refused by admission control, ``status`` is 429 or 503."""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    ``capacity`` tokens, refilled at ``rate`` tokens per second. The state of
+    one bucket is ``(tokens, updated_at)``, kept by a store.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+    def take(self, state, now):
+        """Return ``(allowed, new_state, retry_after)`` for taking one token."""
+        tokens, updated_at = state if state is not None else (self.capacity, now)
+        tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+        if tokens >= 1:
+            return True, (tokens - 1, now), 0.0
+        return False, (tokens, now), (1 - tokens) / self.rate
+
+    def idle_ttl(self):
+        """Seconds after which an unused bucket is full again and can be forgotten."""
+        return int(self.capacity / self.rate) + 1
+
+
+class LocalBucketStore:
+    """Bucket states of this process, the least recently used clients are dropped first."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_CLIENTS):
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key, bucket, now):
+        with self._lock:
+            allowed, state, retry_after = bucket.take(self._states.get(key), now)
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_keys:
+                # A forgotten client starts again with a full bucket
+                self._states.popitem(last=False)
+        return allowed, retry_after
+
+
+class CacheBucketStore:
+    """Bucket states in the ``alias`` Django cache, shared by all workers using it."""
+
+    def __init__(self, alias='default', lock_wait=LOCK_WAIT):
+        self.alias = alias
+        self.lock_wait = lock_wait
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    async def take(self, key, bucket, now):
+        cache = self.cache
+        lock_key = f'{key}:lock'
+        # Deleted only while it is ours, after LOCK_TTL another worker may hold it
+        token = uuid.uuid4().hex
+        try:
+            deadline = time.monotonic() + self.lock_wait
+            while not await cache.aadd(lock_key, token, timeout=LOCK_TTL):
+                if time.monotonic() >= deadline:
+                    # Too many requests are updating this bucket at once
+                    return False, BUSY_RETRY_AFTER
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                allowed, state, retry_after = bucket.take(await cache.aget(key), now)
+                await cache.aset(key, state, timeout=bucket.idle_ttl())
+            finally:
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+        except Exception as e:
+            logger.warning(f"Admission control cache failed, letting the request through: {e!r}")
+            return True, 0.0
+        return allowed, retry_after
+
+
+class Ticket:
+    """An admitted request's in-flight slot, ``release`` it when the answer is done."""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._released = controller is None
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+
+    def __init__(self, store, client_bucket=None, global_bucket=None, max_in_flight=0,
+                 trusted_proxies=0, clock=time.time, enabled=True):
+        self.store = store
+        self.client_bucket = client_bucket
+        self.global_bucket = global_bucket
+        self.max_in_flight = max_in_flight
+        self.trusted_proxies = trusted_proxies
+        self.clock = clock
+        self.enabled = enabled
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {'client_rate': 0, 'global_rate': 0, 'in_flight': 0}
+        self._lock = threading.Lock()
+
+    def client_id(self, request):
+        """
+        The client's address. Behind ``trusted_proxies`` proxies it is the
+        address the outermost of them put into ``X-Forwarded-For``, the
+        entries before it are client-controlled.
+        """
+        if self.trusted_proxies:
+            forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.META.get('REMOTE_ADDR', 'unknown')
+
+    async def admit(self, request):
+        """Return a ``Ticket`` for ``request`` or raise ``Overloaded``."""
+        if not self.enabled:
+            return Ticket(None)
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.rejected['in_flight'] += 1
+                raise Overloaded('Too many answers in progress, please retry shortly', 503, BUSY_RETRY_AFTER)
+            self.in_flight += 1
+        ticket = Ticket(self)
+        try:
+            now = self.clock()
+            # The global bucket first, a request refused for the site's load keeps the client's quota
+            if self.global_bucket is not None:
+                allowed, retry_after = await self.store.take('llm-admission:global', self.global_bucket, now)
+                if not allowed:
+                    self._count_rejection('global_rate')
+                    raise Overloaded('The assistant is busy, please retry shortly', 503, retry_after)
+            if self.client_bucket is not None:
+                allowed, retry_after = await self.store.take(
+                    f'llm-admission:client:{self.client_id(request)}', self.client_bucket, now)
+                if not allowed:
+                    self._count_rejection('client_rate')
+                    raise Overloaded('Too many questions, please slow down', 429, retry_after)
+        except BaseException:
+            ticket.release()
+            raise
+        with self._lock:
+            self.admitted += 1
+        return ticket
+
+    def _count_rejection(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        def bucket(b):
+            return {'rate': b.rate, 'burst': b.capacity} if b is not None else None
+
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'store': type(self.store).__name__,
+                'client_bucket': bucket(self.client_bucket),
+                'global_bucket': bucket(self.global_bucket),
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+            }
+
+
+def overloaded_response(error):
+    response = JsonResponse({'error': str(error)}, status=error.status)
+    response['Retry-After'] = str(max(1, int(error.retry_after + 0.999)))
+    return response
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def _bucket(rate, burst):
+    return TokenBucket(rate, max(burst, 1)) if rate > 0 else None
+
+
+def build_admission_controller():
+    from django.conf import settings
+
+    if getattr(settings, 'LLM_ADMISSION_BACKEND', 'local') == 'django':
+        store = CacheBucketStore(getattr(settings, 'LLM_CACHE_ALIAS', 'default'))
+    else:
+        store = LocalBucketStore()
+    return AdmissionController(
+        store,
+        client_bucket=_bucket(getattr(settings, 'LLM_CLIENT_RATE', 0), getattr(settings, 'LLM_CLIENT_BURST', 10)),
+        global_bucket=_bucket(getattr(settings, 'LLM_GLOBAL_RATE', 10), getattr(settings, 'LLM_GLOBAL_BURST', 50)),
+        max_in_flight=getattr(settings, 'LLM_MAX_IN_FLIGHT', 32),
+        trusted_proxies=getattr(settings, 'LLM_TRUSTED_PROXIES', 0),
+        enabled=getattr(settings, 'LLM_ADMISSION_CONTROL', True),
+    )
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = build_admission_controller()
+    return _controller
@@ -0,0 +1,144 @@
+"""
+Shared store for text extracted from the PDFs in ``datasets/docs``.
+
+PyPDF2 extraction runs at most once per distinct file content: the page
+texts are written to an on-disk cache keyed by the file's SHA-256, so other
+worker processes (and later restarts) load the cached JSON instead of
+parsing the PDF again. Inside a process the result is kept in memory and
+only revalidated with a ``stat``. Failed extractions are remembered for
+``failure_ttl`` seconds so a broken file is not re-parsed on every request.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+DOCS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '../datasets/docs'))
+JOB_ROLES_PDF = os.path.join(DOCS_DIR, 'Job_Roles.pdf')
+DEFAULT_CACHE_DIR = os.environ.get(
+    'DOCUMENT_CACHE_DIR', os.path.normpath(os.path.join(os.path.dirname(__file__), '../.cache/documents'))
+)
+DEFAULT_FAILURE_TTL = 60
+
+
+class DocumentUnavailable(Exception):
+    """Raised when a document cannot be read, or failed recently."""
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pdf_pages(path):
+    from PyPDF2 import PdfReader
+
+    with open(path, 'rb') as pdf_docs:
+        return [page.extract_text() or '' for page in PdfReader(pdf_docs).pages]
+
+
+class DocumentStore:
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, failure_ttl=DEFAULT_FAILURE_TTL, extract=extract_pdf_pages):
+        self.cache_dir = cache_dir
+        self.failure_ttl = failure_ttl
+        self.extract = extract
+        self._documents = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'extractions': 0, 'failures': 0}
+
+    def _cache_path(self, sha256):
+        return os.path.join(self.cache_dir, f'{sha256}.json')
+
+    def _read_cache(self, sha256):
+        try:
+            with open(self._cache_path(sha256)) as f:
+                return json.load(f)['pages']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_cache(self, sha256, path, pages):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{self._cache_path(sha256)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'source': os.path.basename(path), 'sha256': sha256, 'pages': pages}, f)
+            os.replace(tmp_path, self._cache_path(sha256))
+        except OSError as e:
+            # A read-only filesystem only costs other workers an extraction
+            logger.warning("Could not write document cache for %s: %s", path, e)
+
+    def _load(self, path, stat):
+        failure = self._failures.get(path)
+        if failure is not None:
+            failed_at, failed_stat, error = failure
+            if failed_stat == stat and time.monotonic() - failed_at < self.failure_ttl:
+                raise DocumentUnavailable(error)
+
+        try:
+            sha256 = _file_sha256(path)
+            pages = self._read_cache(sha256)
+            if pages is not None:
+                self.stats['disk_hits'] += 1
+            else:
+                with span('pdf_extract'):
+                    pages = self.extract(path)
+                self.stats['extractions'] += 1
+                self._write_cache(sha256, path, pages)
+        except Exception as e:
+            self.stats['failures'] += 1
+            self._failures[path] = (time.monotonic(), stat, str(e))
+            raise DocumentUnavailable(str(e)) from e
+
+        self._failures.pop(path, None)
+        self._documents[path] = (stat, sha256, pages)
+        return pages
+
+    def get_pages(self, path=JOB_ROLES_PDF):
+        """Extracted text of each page of ``path``."""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError as e:
+            raise DocumentUnavailable(str(e)) from e
+
+        entry = self._documents.get(path)
+        if entry is not None and entry[0] == stat:
+            self.stats['memory_hits'] += 1
+            return entry[2]
+        with self._lock:
+            entry = self._documents.get(path)
+            if entry is not None and entry[0] == stat:
+                return entry[2]
+            return self._load(path, stat)
+
+    def get_text(self, path=JOB_ROLES_PDF):
+        return ''.join(self.get_pages(path))
+
+    def get_sha256(self, path=JOB_ROLES_PDF):
+        self.get_pages(path)
+        return self._documents[os.path.abspath(path)][1]
+
+    def preload(self, path=JOB_ROLES_PDF):
+        try:
+            self.get_pages(path)
+        except DocumentUnavailable as e:
+            logger.error("Could not preload %s: %s", path, e)
+
+
+_document_store = DocumentStore()
+
+
+def get_document_store():
+    return _document_store
@@ -0,0 +1,137 @@
+"""
+A local stand-in for the Gemini REST API, for load tests.
+
+It answers ``POST /v1beta/models/<model>:generateContent`` after a fixed
+delay, and ``:streamGenerateContent`` with the answer split into Server-Sent
+Events spread over the same delay. That is enough for ``genai.Client`` (sync
+and ``client.aio``) pointed at it with ``GEMINI_BASE_URL`` or
+``HttpOptions(base_url=...)``. Every
+request is served on its own thread, so the server itself never limits
+concurrency. Connections are kept alive (HTTP/1.1), like the real endpoint,
+``connections`` counts the ones clients opened.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _candidate(text):
+    return {
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'text': text}]},
+            'finishReason': 'STOP',
+        }],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections open between requests like the real endpoint, so clients reuse them
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.requests += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if ':streamGenerateContent' in self.path:
+                self._stream(server)
+            else:
+                time.sleep(server.latency)
+                body = json.dumps(_candidate(server.answer)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _stream(self, server):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        # The length is not known up front, chunked encoding keeps the connection reusable
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = server.answer.split(' ')
+        pieces = [word + ' ' for word in words[:-1]] + words[-1:]
+        for piece in pieces:
+            time.sleep(server.latency / len(pieces))
+            self._chunk(b'data: ' + json.dumps(_candidate(piece)).encode('utf-8') + b'\r\n\r\n')
+        self._chunk(b'')
+
+    def _chunk(self, data):
+        self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once, the default backlog of 5 would throttle them
+    request_queue_size = 1024
+
+
+class FakeLLMServer:
+    """
+    ``with FakeLLMServer(latency=0.5) as server:`` serves on ``server.url``
+    until the block exits. ``max_in_flight`` records the peak number of
+    concurrent requests it saw.
+    """
+
+    def __init__(self, latency=0.5, answer='A fake answer.', host='127.0.0.1', port=0):
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.latency = latency
+        self._httpd.answer = answer
+        self._httpd.lock = threading.Lock()
+        self._httpd.in_flight = 0
+        self._httpd.max_in_flight = 0
+        self._httpd.requests = 0
+        self._httpd.connections = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self):
+        return self._httpd.requests
+
+    @property
+    def connections(self):
+        return self._httpd.connections
+
+    @property
+    def max_in_flight(self):
+        return self._httpd.max_in_flight
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
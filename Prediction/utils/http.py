@@ -0,0 +1,86 @@
+"""
+Request helpers for the plain Django (non-DRF) views, which are used where
+a view has to be ``async`` and DRF's ``APIView`` cannot be.
+"""
+import asyncio
+import json
+import queue
+import threading
+
+from django.http import QueryDict
+
+_DONE = object()
+
+
+def read_request_data(request):
+    """
+    The request body as a dict: parsed JSON, or the form fields for
+    form-encoded posts, like DRF's ``request.data``.
+
+    Raises ``ValueError`` for a malformed JSON body.
+    """
+    content_type = request.content_type or ''
+    if content_type == 'application/json' or content_type.endswith('+json'):
+        if not request.body:
+            return {}
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError('JSON body must be an object')
+        return data
+    if isinstance(request.POST, QueryDict):
+        return request.POST.dict()
+    return {}
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def iterate_in_thread(aiterable):
+    """
+    Iterate an async iterable from sync code, e.g. a streaming response under WSGI.
+
+    Django would otherwise buffer the whole async stream before sending it.
+    The iterable runs on its own event loop in a background thread and each
+    item is handed over as soon as it is produced. Closing the iterator
+    before the end (Django does when the client disconnects) cancels the
+    async iterable, so an abandoned stream stops pulling from upstream.
+    """
+    items = queue.Queue()
+    loop = asyncio.new_event_loop()
+
+    async def consume():
+        try:
+            async for item in aiterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(_Failure(e))
+        else:
+            items.put(_DONE)
+
+    task = loop.create_task(consume())
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # The loop already finished
+            pass
@@ -0,0 +1,409 @@
+"""
+Shared gateway for the Gemini calls of the chatbot and voice assistant.
+
+Both apps ask for an answer with a prompt and a generation config, the
+gateway walks the model fallback chain and keeps health per model:
+
+- A 404 (model retired or not enabled for the key) opens the model's breaker
+  for ``not_found_cooldown`` seconds.
+- A 429 / quota error opens it for the ``Retry-After`` the API sent (header
+  or ``RetryInfo.retryDelay``), ``cooldown`` seconds when there is none.
+- Server errors, timeouts and connection errors open it after
+  ``failure_threshold`` consecutive failures.
+
+Open models are skipped without a request. When the cooldown ends one
+request is let through as a probe (half-open), success closes the breaker
+and failure opens it again. Other errors (bad request, auth) are raised
+unchanged and say nothing about the model.
+
+All attempts of one call share a ``deadline``, so a slow model cannot use
+up the time budget of the ones after it. Per-model counters and latencies
+are returned by ``stats()``.
+"""
+import asyncio
+import email.utils
+import logging
+import os
+import re
+import ssl
+import threading
+import time
+import weakref
+
+import httpx
+
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+# Use available models from Google GenAI - models need "models/" prefix
+DEFAULT_MODELS = ("models/gemini-2.5-flash", "models/gemini-2.0-flash", "models/gemini-flash-latest", "models/gemini-pro-latest")
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN = 30.0
+DEFAULT_NOT_FOUND_COOLDOWN = 60 * 60.0
+DEFAULT_DEADLINE = 30.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+NOT_FOUND = 'not_found'
+RATE_LIMITED = 'rate_limited'
+UNAVAILABLE = 'unavailable'
+FATAL = 'fatal'
+
+_RETRY_DELAY_RE = re.compile(r"""['"]retryDelay['"]\s*:\s*['"]([\d.]+)s['"]""")
+
+
+class LLMUnavailable(Exception):
+    """No model could answer: all failed, were cooling down, or the deadline passed."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _error_code(error):
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def classify_error(error):
+    """``not_found``, ``rate_limited``, ``unavailable`` (worth another model) or ``fatal``."""
+    code = _error_code(error)
+    error_str = str(error)
+    if code == 404 or (code is None and ("404" in error_str or "NOT_FOUND" in error_str)):
+        return NOT_FOUND
+    if code == 429 or (code is None and ("429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+                                         or "quota" in error_str.lower())):
+        return RATE_LIMITED
+    if (code is not None and code >= 500) or isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return UNAVAILABLE
+    return FATAL
+
+
+def retry_after(error):
+    """Seconds to wait from the error's ``Retry-After`` header or ``RetryInfo``, or None."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    match = _RETRY_DELAY_RE.search(str(getattr(error, 'details', None) or error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class ModelHealth:
+    """Breaker state and counters for one model, guarded by the gateway's lock."""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.attempts = 0
+        self.successes = 0
+        self.skipped = 0
+        self.errors = {NOT_FOUND: 0, RATE_LIMITED: 0, UNAVAILABLE: 0, FATAL: 0}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = None
+        self.last_error = None
+
+    def as_dict(self, now):
+        completed = self.successes + sum(self.errors.values())
+        return {
+            'state': self.state,
+            'retry_in': round(max(self.open_until - now, 0.0), 3) if self.state == OPEN else 0.0,
+            'consecutive_failures': self.consecutive_failures,
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'skipped': self.skipped,
+            'errors': dict(self.errors),
+            'latency_avg': round(self.latency_total / completed, 4) if completed else None,
+            'latency_max': round(self.latency_max, 4),
+            'latency_last': round(self.latency_last, 4) if self.latency_last is not None else None,
+            'last_error': self.last_error,
+        }
+
+
+class LLMGateway:
+
+    def __init__(self, client, models=DEFAULT_MODELS, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 cooldown=DEFAULT_COOLDOWN, not_found_cooldown=DEFAULT_NOT_FOUND_COOLDOWN,
+                 deadline=DEFAULT_DEADLINE, clock=time.monotonic):
+        self.client = client
+        self.models = tuple(models)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.not_found_cooldown = not_found_cooldown
+        self.deadline = deadline
+        self.clock = clock
+        self._health = {model: ModelHealth(model) for model in self.models}
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return self.client is not None
+
+    def _acquire(self, model):
+        """True when ``model`` may be called now, counting it as skipped otherwise."""
+        health = self._health[model]
+        with self._lock:
+            if health.state == OPEN and self.clock() >= health.open_until:
+                health.state = HALF_OPEN
+            if health.state == HALF_OPEN:
+                if health.probing:
+                    health.skipped += 1
+                    return False
+                health.probing = True
+            elif health.state == OPEN:
+                health.skipped += 1
+                return False
+            health.attempts += 1
+            return True
+
+    def _open(self, health, seconds):
+        health.state = OPEN
+        health.open_until = self.clock() + seconds
+        logger.warning("LLM model %s disabled for %.0fs: %s", health.name, seconds, health.last_error)
+
+    def _record(self, model, started, error=None):
+        health = self._health[model]
+        latency = self.clock() - started
+        kind = classify_error(error) if error is not None else None
+        with self._lock:
+            health.probing = False
+            health.latency_total += latency
+            health.latency_max = max(health.latency_max, latency)
+            health.latency_last = latency
+            if error is None:
+                health.successes += 1
+                health.consecutive_failures = 0
+                health.state = CLOSED
+                return None
+            health.errors[kind] += 1
+            health.last_error = str(error)[:200]
+            if kind == FATAL:
+                # Not the model's fault (bad request, auth), the breaker is left alone
+                if health.state == HALF_OPEN:
+                    health.state = CLOSED
+                return kind
+            health.consecutive_failures += 1
+            if kind == NOT_FOUND:
+                self._open(health, self.not_found_cooldown)
+            elif kind == RATE_LIMITED:
+                delay = retry_after(error)
+                self._open(health, delay if delay is not None else self.cooldown)
+            elif health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                self._open(health, self.cooldown)
+            else:
+                health.state = CLOSED
+        return kind
+
+    def _release(self, model):
+        # An attempt abandoned without an outcome (cancelled) frees the probe slot
+        with self._lock:
+            health = self._health[model]
+            if health.probing:
+                health.probing = False
+                health.attempts -= 1
+
+    def _unavailable(self, last_error):
+        if last_error is not None:
+            return LLMUnavailable(f"All models failed. Error: {last_error}", self.retry_in())
+        return LLMUnavailable(f"All models are cooling down, retry in {self.retry_in():.0f}s", self.retry_in())
+
+    def retry_in(self):
+        """Seconds until the first open model may be tried again."""
+        now = self.clock()
+        with self._lock:
+            waits = [max(h.open_until - now, 0.0) for h in self._health.values() if h.state == OPEN]
+        return min(waits) if len(waits) == len(self._health) else 0.0
+
+    def _remaining(self, deadline_at):
+        remaining = deadline_at - self.clock()
+        if remaining <= 0:
+            raise LLMUnavailable(f"No model answered within {self.deadline:.0f}s", self.retry_in())
+        return remaining
+
+    async def generate(self, contents, config=None):
+        """Return ``(model, text)`` from the first healthy model that answers."""
+        deadline_at = self.clock() + self.deadline
+        last_error = None
+        for model in self.models:
+            remaining = self._remaining(deadline_at)
+            if not self._acquire(model):
+                continue
+            started = self.clock()
+            try:
+                with span('llm', model):
+                    response = await asyncio.wait_for(
+                        self.client.aio.models.generate_content(model=model, contents=contents, config=config),
+                        remaining,
+                    )
+            except asyncio.CancelledError:
+                self._release(model)
+                raise
+            except Exception as error:
+                if isinstance(error, asyncio.TimeoutError):
+                    error = TimeoutError(f"{model} did not answer within the {self.deadline:.0f}s deadline")
+                if self._record(model, started, error) == FATAL:
+                    raise
+                last_error = error
+                continue
+            self._record(model, started)
+            return model, response.text
+        raise self._unavailable(last_error)
+
+    async def stream(self, contents, config=None):
+        """
+        Yield ``(model, text)`` pieces as they are generated.
+
+        The deadline and model fallback apply until the first piece, errors
+        after it are raised to the caller.
+        """
+        deadline_at = self.clock() + self.deadline
+        last_error = None
+        for model in self.models:
+            remaining = self._remaining(deadline_at)
+            if not self._acquire(model):
+                continue
+            started = self.clock()
+            first = None
+            try:
+                # Until the first piece, the rest of the answer streams after the headers were sent
+                with span('llm_first_chunk', model):
+                    stream = await asyncio.wait_for(
+                        self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config),
+                        remaining,
+                    )
+                    iterator = stream.__aiter__()
+                    while first is None:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), max(deadline_at - self.clock(), 0))
+                        first = chunk.text or None
+            except StopAsyncIteration:
+                self._record(model, started)
+                return
+            except asyncio.CancelledError:
+                self._release(model)
+                raise
+            except Exception as error:
+                if isinstance(error, asyncio.TimeoutError):
+                    error = TimeoutError(f"{model} did not answer within the {self.deadline:.0f}s deadline")
+                if self._record(model, started, error) == FATAL:
+                    raise
+                last_error = error
+                continue
+
+            try:
+                yield model, first
+                async for chunk in iterator:
+                    if chunk.text:
+                        yield model, chunk.text
+            except (GeneratorExit, asyncio.CancelledError):
+                # Abandoned by the caller, e.g. the client disconnected
+                self._release(model)
+                raise
+            except Exception as error:
+                self._record(model, started, error)
+                raise
+            self._record(model, started)
+            return
+        raise self._unavailable(last_error)
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            return {
+                'models': {model: self._health[model].as_dict(now) for model in self.models},
+                'deadline': self.deadline,
+                'failure_threshold': self.failure_threshold,
+                'cooldown': self.cooldown,
+            }
+
+
+class PerLoopClient:
+    """
+    A ``genai.Client`` per event loop, for the gateway's ``client.aio`` calls.
+
+    ``client.aio`` keeps connections alive in an httpx pool, and a pooled
+    connection belongs to the event loop that opened it. Under WSGI every
+    async view call runs on a new event loop, so one shared client fails
+    with "Event loop is closed" on the connection an earlier request left.
+    Under ASGI a worker has one loop and so one client. The clients share an
+    SSL context, building one is most of the cost of a client.
+    """
+
+    def __init__(self, api_key, base_url=None):
+        import certifi
+
+        self.api_key = api_key
+        self.base_url = base_url
+        self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _new_client(self):
+        from google import genai
+        from google.genai import types
+
+        return genai.Client(api_key=self.api_key, http_options=types.HttpOptions(
+            base_url=self.base_url,
+            client_args={'verify': self._ssl_context},
+            # 'ssl' is what the client's websocket (live API) connections use
+            async_client_args={'verify': self._ssl_context, 'ssl': self._ssl_context},
+        ))
+
+    @property
+    def aio(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                # Dropped with the loop, WSGI requests leave no clients behind
+                client = self._clients[loop] = self._new_client()
+        return client.aio
+
+
+def build_llm_gateway():
+    from django.conf import settings
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    # Optional API endpoint override, e.g. a proxy or the load test's fake server
+    base_url = os.environ.get("GEMINI_BASE_URL")
+    client = None
+    if api_key:
+        client = PerLoopClient(api_key, base_url)
+    else:
+        logger.warning("GOOGLE_API_KEY not found in environment variables")
+
+    return LLMGateway(
+        client,
+        models=getattr(settings, 'LLM_MODELS', DEFAULT_MODELS),
+        failure_threshold=getattr(settings, 'LLM_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD),
+        cooldown=getattr(settings, 'LLM_COOLDOWN', DEFAULT_COOLDOWN),
+        not_found_cooldown=getattr(settings, 'LLM_NOT_FOUND_COOLDOWN', DEFAULT_NOT_FOUND_COOLDOWN),
+        deadline=getattr(settings, 'LLM_DEADLINE', DEFAULT_DEADLINE),
+    )
+
+
+_llm_gateway = None
+_llm_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    global _llm_gateway
+    if _llm_gateway is None:
+        with _llm_gateway_lock:
+            if _llm_gateway is None:
+                _llm_gateway = build_llm_gateway()
+    return _llm_gateway
@@ -0,0 +1,247 @@
+"""
+Cache for LLM answers to the chatbot and voice assistant.
+
+Students ask the same few questions all day, so answers are cached under a
+key built from the normalized question, the model that produced the answer
+and a fingerprint of the prompt context (a rebuilt PDF or index changes the
+context and so misses the old entries). Entries expire after a TTL and the
+store is bounded, least recently used entries are evicted first.
+
+Two backends are available, selected with the ``LLM_CACHE_BACKEND`` setting:
+
+- ``local``: an in-process LRU dict, per worker.
+- ``django``: one of Django's ``CACHES`` (``LLM_CACHE_ALIAS``), e.g. Redis or
+  Memcached to share answers between workers. Eviction is the cache server's.
+
+``none`` disables caching.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1024
+KEY_PREFIX = 'llm-answer'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE_RE.sub(' ', question).strip().lower().rstrip('?!. ')
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(namespace, question, model, context):
+    digest = hashlib.sha256(
+        '\0'.join((namespace, normalize_question(question), model, fingerprint(context))).encode('utf-8')
+    ).hexdigest()
+    return f'{KEY_PREFIX}:{namespace}:{digest}'
+
+
+class LocalCacheBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_many(self, keys):
+        found = {}
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def aget_many(self, keys):
+        return self.get_many(keys)
+
+    async def aset(self, key, value, ttl):
+        self.set(key, value, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """Store answers in a Django cache so every worker shares them."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    async def aget_many(self, keys):
+        return await self.cache.aget_many(keys)
+
+    async def aset(self, key, value, ttl):
+        await self.cache.aset(key, value, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _keys(self, namespace, question, models, context):
+        return [cache_key(namespace, question, model, context) for model in models]
+
+    def _first_hit(self, keys, found, record=True):
+        for key in keys:
+            if key in found:
+                if record:
+                    with self._lock:
+                        self.hits += 1
+                return found[key]
+        if record:
+            with self._lock:
+                self.misses += 1
+        return None
+
+    def lookup(self, namespace, question, models, context):
+        """
+        Return a cached answer from any of ``models``, preferring earlier ones,
+        or None.
+        """
+        if not self.enabled:
+            return None
+        keys = self._keys(namespace, question, models, context)
+        try:
+            found = self.backend.get_many(keys)
+        except Exception as e:
+            # A cache outage must not take the chatbot down with it
+            logger.warning("LLM cache lookup failed: %s", e)
+            found = {}
+        return self._first_hit(keys, found)
+
+    async def alookup(self, namespace, question, models, context, record=True):
+        """
+        ``lookup`` for async views, without blocking the event loop on the
+        django backend. ``record=False`` leaves the hit/miss counters alone.
+        """
+        if not self.enabled:
+            return None
+        keys = self._keys(namespace, question, models, context)
+        try:
+            found = await self.backend.aget_many(keys)
+        except Exception as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+            found = {}
+        return self._first_hit(keys, found, record)
+
+    def store(self, namespace, question, model, context, answer):
+        if not self.enabled or not answer:
+            return
+        try:
+            self.backend.set(cache_key(namespace, question, model, context), answer, self.ttl)
+        except Exception as e:
+            logger.warning("LLM cache store failed: %s", e)
+            return
+        with self._lock:
+            self.stores += 1
+
+    async def astore(self, namespace, question, model, context, answer):
+        if not self.enabled or not answer:
+            return
+        try:
+            await self.backend.aset(cache_key(namespace, question, model, context), answer, self.ttl)
+        except Exception as e:
+            logger.warning("LLM cache store failed: %s", e)
+            return
+        with self._lock:
+            self.stores += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': type(self.backend).__name__ if self.enabled else None,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
+        if isinstance(self.backend, LocalCacheBackend):
+            stats.update(entries=len(self.backend), max_entries=self.backend.max_entries,
+                         evictions=self.backend.evictions)
+        return stats
+
+
+def build_response_cache():
+    from django.conf import settings
+
+    kind = getattr(settings, 'LLM_CACHE_BACKEND', 'local')
+    ttl = getattr(settings, 'LLM_CACHE_TTL', DEFAULT_TTL)
+    if kind == 'none' or ttl <= 0:
+        return ResponseCache(None, ttl)
+    if kind == 'django':
+        return ResponseCache(DjangoCacheBackend(getattr(settings, 'LLM_CACHE_ALIAS', 'default')), ttl)
+    if kind == 'local':
+        return ResponseCache(LocalCacheBackend(getattr(settings, 'LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)), ttl)
+    raise ValueError(f'Unknown LLM_CACHE_BACKEND {kind!r}, expected local, django or none')
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = build_response_cache()
+    return _response_cache
@@ -0,0 +1,211 @@
+"""
+Lexical retrieval over the career guidance PDF.
+
+``build_index`` splits ``datasets/docs/Job_Roles.pdf`` into chunks (one per
+numbered job role section, capped in size) and writes a BM25 index to a JSON
+file next to it. At query time only the top-k chunks for the question go into
+the LLM prompt instead of a fixed prefix of the whole document.
+
+Rebuilds are incremental: pages whose extracted text did not change reuse
+their chunks and term counts from the previous index.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from .documents import DOCS_DIR, JOB_ROLES_PDF, get_document_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PDF_PATH = JOB_ROLES_PDF
+DEFAULT_INDEX_PATH = os.path.join(DOCS_DIR, 'Job_Roles.index.json')
+
+INDEX_VERSION = 1
+MAX_CHUNK_CHARS = 1200
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_HEADING_RE = re.compile(r'^\s*\d+\)\s+\S')
+
+# Small built-in list so indexing does not depend on NLTK data
+STOP_WORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or
+that the their them they this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def split_chunks(text, max_chars=MAX_CHUNK_CHARS):
+    """Split page text at numbered headings, then by lines into chunks of at most ``max_chars``."""
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if current and (_HEADING_RE.match(line) or size + len(line) > max_chars):
+            chunks.append(' '.join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _source_stat(pdf_path):
+    st = os.stat(pdf_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def build_index(pdf_path=DEFAULT_PDF_PATH, index_path=DEFAULT_INDEX_PATH, previous=None, pages=None):
+    """
+    Build (and save, when ``index_path`` is set) the index for ``pdf_path``.
+
+    ``previous`` is an earlier index dict whose unchanged pages are reused,
+    ``pages`` lets callers pass already extracted page texts.
+    """
+    with open(pdf_path, 'rb') as f:
+        source_hash = _sha256(f.read())
+    source = dict(_source_stat(pdf_path), path=os.path.basename(pdf_path), sha256=source_hash)
+
+    if previous and previous.get('version') == INDEX_VERSION and previous['source'].get('sha256') == source_hash:
+        # Same content, only the file metadata moved
+        index = dict(previous, source=source)
+    else:
+        reused = {}
+        if previous and previous.get('version') == INDEX_VERSION:
+            for page in previous.get('pages', []):
+                reused[page['sha256']] = page
+
+        if pages is None:
+            pages = get_document_store().get_pages(pdf_path)
+        page_entries = []
+        for number, text in enumerate(pages):
+            page_hash = _sha256(text.encode('utf-8'))
+            entry = reused.get(page_hash)
+            if entry is None:
+                entry = {
+                    'sha256': page_hash,
+                    'chunks': [
+                        {'text': chunk, 'tf': dict(Counter(tokenize(chunk)))}
+                        for chunk in split_chunks(text)
+                    ],
+                }
+            page_entries.append(dict(entry, page=number))
+        index = {'version': INDEX_VERSION, 'source': source, 'pages': page_entries}
+
+    if index_path:
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+    return index
+
+
+class ContextIndex:
+    """A loaded BM25 index, with postings built once in memory."""
+
+    def __init__(self, index):
+        self.index = index
+        self.chunks = []
+        lengths = []
+        postings = {}
+        for page in index['pages']:
+            for chunk in page['chunks']:
+                chunk_id = len(self.chunks)
+                self.chunks.append(chunk['text'])
+                lengths.append(sum(chunk['tf'].values()))
+                for term, count in chunk['tf'].items():
+                    postings.setdefault(term, []).append((chunk_id, count))
+        n_chunks = len(self.chunks)
+        self.lengths = lengths
+        self.avgdl = (sum(lengths) / n_chunks) if n_chunks else 0.0
+        self.postings = postings
+        self.idf = {
+            term: math.log(1 + (n_chunks - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @property
+    def source(self):
+        return self.index['source']
+
+    def search(self, query, k=3):
+        """Return ``(chunk_id, score)`` for the ``k`` best chunks, best first."""
+        scores = {}
+        avgdl = self.avgdl or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[term]:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def retrieve(self, query, k=3):
+        """Text of the top ``k`` chunks in document order, or the first chunks when nothing matches."""
+        hits = self.search(query, k)
+        chunk_ids = sorted(chunk_id for chunk_id, _ in hits) or list(range(min(k, len(self.chunks))))
+        return '\n\n'.join(self.chunks[chunk_id] for chunk_id in chunk_ids)
+
+
+def load_index(index_path=DEFAULT_INDEX_PATH):
+    with open(index_path) as f:
+        index = json.load(f)
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError(f'Unsupported context index version {index.get("version")}')
+    return index
+
+
+_context_index = None
+_context_lock = threading.Lock()
+
+
+def get_context_index(pdf_path=DEFAULT_PDF_PATH, index_path=DEFAULT_INDEX_PATH):
+    """
+    Return the process-wide index, loading it from disk on first use.
+
+    A missing index, or one built from a different PDF, is rebuilt here as a
+    fallback; normally it is built ahead of time with
+    ``python manage.py build_context_index``.
+    """
+    global _context_index
+    if _context_index is not None:
+        return _context_index
+    with _context_lock:
+        if _context_index is None:
+            index = None
+            try:
+                index = load_index(index_path)
+            except (OSError, ValueError) as e:
+                logger.warning("Context index not loaded (%s), building it", e)
+            stat = _source_stat(pdf_path)
+            if index is None or any(index['source'].get(key) != value for key, value in stat.items()):
+                try:
+                    index = build_index(pdf_path, index_path, previous=index)
+                except OSError:
+                    # Read-only deploys can still serve the in-memory index
+                    index = build_index(pdf_path, None, previous=index)
+            _context_index = ContextIndex(index)
+    return _context_index
+
+
+def retrieve_context(query, k=3):
+    return get_context_index().retrieve(query, k)
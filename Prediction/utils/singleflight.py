@@ -0,0 +1,160 @@
+"""
+Request coalescing ("singleflight") for identical concurrent LLM questions.
+
+When a whole class asks the chatbot the same thing at once, only the first
+request (the leader) calls Gemini, the others wait for its answer.
+
+``SingleFlight`` coalesces within a worker process. In-flight calls are
+``concurrent.futures.Future`` objects, so waiters can be on the same event
+loop (ASGI) or on the per-request loops of other threads (WSGI).
+
+``CacheLock`` optionally extends this across workers: the leader holds a lock
+key in a Django cache while it generates, leaders in other workers see the
+lock and poll the shared answer cache instead of calling Gemini themselves.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+import uuid
+
+from .response_cache import fingerprint, normalize_question
+
+DEFAULT_LOCK_TTL = 60
+DEFAULT_POLL_INTERVAL = 0.1
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+def flight_key(namespace, question, context):
+    digest = hashlib.sha256(
+        '\0'.join((namespace, normalize_question(question), fingerprint(context))).encode('utf-8')
+    ).hexdigest()
+    return f'llm-flight:{namespace}:{digest}'
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, fn):
+        """
+        Return ``await fn()``, sharing one call among concurrent callers with the same ``key``.
+
+        Followers get the leader's result or exception. A follower that is
+        cancelled stops waiting without cancelling the leader, when the leader
+        is cancelled (its client went away) a follower takes over.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = concurrent.futures.Future()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            try:
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                return await self.do(key, fn)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': self.in_flight()}
+
+
+class CacheLock:
+    """A lock key in a Django cache, set with ``add`` so only one worker holds it."""
+
+    def __init__(self, alias='default', ttl=DEFAULT_LOCK_TTL, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.alias = alias
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        # Identifies this process's locks, so a lock that expired and was taken
+        # over by another worker is not released by us
+        self.owner = uuid.uuid4().hex
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    async def acquire(self, key):
+        return await self.cache.aadd(f'{key}:lock', self.owner, self.ttl)
+
+    async def release(self, key):
+        if await self.cache.aget(f'{key}:lock') == self.owner:
+            await self.cache.adelete(f'{key}:lock')
+
+    async def locked(self, key):
+        return await self.cache.aget(f'{key}:lock') is not None
+
+    async def wait(self, key, check, timeout):
+        """
+        Poll ``await check()`` until it returns a value, the lock is released
+        or ``timeout`` passes. Returns the value or None.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await check()
+            if result is not None:
+                return result
+            if not await self.locked(key):
+                # The leader finished without a cacheable answer (or failed)
+                return await check()
+        return None
+
+
+_singleflight = SingleFlight()
+_cache_lock = None
+_cache_lock_created = False
+_cache_lock_mutex = threading.Lock()
+
+
+def get_singleflight():
+    return _singleflight
+
+
+def get_cache_lock():
+    """The cross-worker lock when ``LLM_SINGLEFLIGHT_DISTRIBUTED`` is set, else None."""
+    global _cache_lock, _cache_lock_created
+    if not _cache_lock_created:
+        from django.conf import settings
+
+        with _cache_lock_mutex:
+            if not _cache_lock_created:
+                if getattr(settings, 'LLM_SINGLEFLIGHT_DISTRIBUTED', False):
+                    _cache_lock = CacheLock(
+                        getattr(settings, 'LLM_CACHE_ALIAS', 'default'),
+                        ttl=getattr(settings, 'LLM_SINGLEFLIGHT_LOCK_TTL', DEFAULT_LOCK_TTL),
+                    )
+                _cache_lock_created = True
+    return _cache_lock
@@ -0,0 +1,240 @@
+"""
+Per-request timing of the stages inside a request.
+
+Code paths mark their stages with ``span``::
+
+    with span('encode'):
+        encoded = encoder.encode_one(answers)
+
+Each span is timed with ``perf_counter`` and observed in two places:
+
+- The request's own timings, when ``TimingMiddleware`` is serving one. The
+  middleware sends them back as a ``Server-Timing`` header (spans of the same
+  name and detail are summed), so browser dev tools show the breakdown.
+- Process-wide histograms, served in the Prometheus text format by
+  ``metrics_view`` (``stage_duration_seconds`` per stage and
+  ``http_request_duration_seconds`` per route, method and status).
+
+The current request is held in a ``contextvars`` variable, so spans work in
+sync views, async views and code run through ``sync_to_async``, and are a
+no-op (apart from the histogram) outside of a request. Metrics are per
+process, with several workers each one is scraped or reports separately.
+
+Streamed responses send their headers before the body is produced, spans
+that run while streaming only reach the histograms.
+"""
+import bisect
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Prometheus' defaults with sub-millisecond buckets, encoding and tree
+# traversal take microseconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects it."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Callers hold the registry's lock
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._help = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help_text='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+                self._help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def add(self, name, amount, help_text=''):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def histogram(self, name, **labels):
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._gauges.items()):
+                lines += [f'# HELP {name} {self._help[name]}', f'# TYPE {name} gauge', f'{name} {value}']
+            by_name = {}
+            for (name, labels), histogram in self._histograms.items():
+                by_name.setdefault(name, []).append((labels, histogram))
+            for name in sorted(by_name):
+                lines += [f'# HELP {name} {self._help[name]}', f'# TYPE {name} histogram']
+                for labels, histogram in sorted(by_name[name], key=lambda item: item[0]):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum!r}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+metrics = MetricsRegistry()
+
+
+class RequestTimings:
+    """Stage durations of one request, summed per (name, detail)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, detail, seconds):
+        with self._lock:
+            total, count = self.stages.get((name, detail), (0.0, 0))
+            self.stages[(name, detail)] = (total + seconds, count + 1)
+
+    def server_timing(self, total):
+        entries = []
+        with self._lock:
+            stages = list(self.stages.items())
+        for (name, detail), (seconds, count) in stages:
+            entry = f'{_TOKEN_RE.sub("_", name)};dur={seconds * 1000:.2f}'
+            desc = detail if count == 1 else f'{detail} x{count}' if detail else f'x{count}'
+            if desc:
+                entry += ';desc="' + desc.replace('\\', '').replace('"', '') + '"'
+            entries.append(entry)
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def span(name, detail=None):
+    """
+    Time the block as stage ``name``. ``detail`` (e.g. the model used) only
+    goes into the ``Server-Timing`` description, not the metric labels.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe('stage_duration_seconds', seconds, 'Time spent in each stage of a request', stage=name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, detail, seconds)
+
+
+def current_timings():
+    return _current.get()
+
+
+class TimingMiddleware:
+    """
+    Times every request, adds ``Server-Timing`` (when ``SERVER_TIMING`` is
+    on) and feeds the request histograms. Should be first in ``MIDDLEWARE``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING', True)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.add('http_requests_in_flight', 1, 'Requests being served')
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.add('http_requests_in_flight', -1)
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        metrics.add('http_requests_in_flight', 1, 'Requests being served')
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.add('http_requests_in_flight', -1)
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        match = getattr(request, 'resolver_match', None)
+        # The route pattern, not the path, keeps the number of series bounded
+        route = match.route if match is not None else 'unmatched'
+        metrics.observe('http_request_duration_seconds', total, 'Time until the response (headers) was ready',
+                        method=request.method, route=route, status=str(response.status_code))
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, 404 when ``METRICS_ENABLED`` is off. With
+    ``METRICS_ALLOWED_IPS`` set only those addresses (and staff users) get
+    the metrics, the others a 404 as well.
+    """
+    from django.conf import settings
+    from django.http import Http404, HttpResponse
+
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        raise Http404()
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed and not request.user.is_staff:
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
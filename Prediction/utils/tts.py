@@ -0,0 +1,171 @@
+"""
+Text-to-speech on a dedicated worker thread.
+
+pyttsx3 engines are not thread-safe and ``runAndWait()`` blocks for as long
+as the speech lasts, so HTTP workers never touch the engine: they put jobs on
+a bounded queue and one thread, which creates and owns the engine, works
+through them.
+
+Jobs either speak on the server's audio device or render to a WAV file in
+``audio_dir``, named by the hash of (text, rate, voice). A phrase that was
+rendered once is served from the file, and identical renders queued at the
+same time share one job.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AUDIO_DIR = os.environ.get(
+    'TTS_AUDIO_DIR', os.path.normpath(os.path.join(os.path.dirname(__file__), '../.cache/tts'))
+)
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_RATE = 120
+
+SPEAK = 'speak'
+RENDER = 'render'
+
+
+class TTSBusy(Exception):
+    """The TTS queue is full."""
+
+
+def audio_key(text, rate, voice):
+    return hashlib.sha256('\0'.join((text, str(rate), voice or '')).encode('utf-8')).hexdigest()
+
+
+def create_pyttsx3_engine():
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    voices = engine.getProperty('voices')
+    engine.setProperty('voice', voices[0].id)
+    return engine
+
+
+class TTSWorker:
+
+    def __init__(self, engine_factory=create_pyttsx3_engine, audio_dir=DEFAULT_AUDIO_DIR,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.engine_factory = engine_factory
+        self.audio_dir = audio_dir
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._renders = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'spoken': 0, 'rendered': 0, 'audio_hits': 0, 'rejected': 0, 'failures': 0}
+
+    def audio_path(self, key):
+        return os.path.join(self.audio_dir, f'{key}.wav')
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='tts-worker', daemon=True)
+                self._thread.start()
+
+    def _submit(self, job):
+        self._start()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise TTSBusy(f"TTS queue is full ({self._queue.maxsize} jobs)")
+
+    def speak(self, text, rate=DEFAULT_RATE, voice=None):
+        """Queue ``text`` to be spoken, returns a future that completes when it was."""
+        future = concurrent.futures.Future()
+        self._submit((SPEAK, text, rate, voice, None, future))
+        return future
+
+    def render(self, text, rate=DEFAULT_RATE, voice=None):
+        """
+        Return ``(key, future)``, the future resolves to the WAV file's path.
+
+        Already rendered phrases resolve immediately.
+        """
+        key = audio_key(text, rate, voice)
+        path = self.audio_path(key)
+        with self._lock:
+            if os.path.exists(path):
+                self.stats['audio_hits'] += 1
+                future = concurrent.futures.Future()
+                future.set_result(path)
+                return key, future
+            future = self._renders.get(key)
+            if future is not None:
+                return key, future
+            future = self._renders[key] = concurrent.futures.Future()
+        try:
+            self._submit((RENDER, text, rate, voice, key, future))
+        except TTSBusy:
+            with self._lock:
+                self._renders.pop(key, None)
+            raise
+        return key, future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        engine = None
+        while True:
+            kind, text, rate, voice, key, future = self._queue.get()
+            try:
+                if engine is None:
+                    engine = self.engine_factory()
+                engine.setProperty('rate', rate)
+                if voice:
+                    engine.setProperty('voice', voice)
+                if kind == SPEAK:
+                    engine.say(text)
+                    engine.runAndWait()
+                    result = None
+                else:
+                    result = self._render(engine, text, key)
+            except Exception as e:
+                logger.error(f"Error in text-to-speech: {e}")
+                with self._lock:
+                    self.stats['failures'] += 1
+                    self._renders.pop(key, None)
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.stats['spoken' if kind == SPEAK else 'rendered'] += 1
+                    self._renders.pop(key, None)
+                future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    def _render(self, engine, text, key):
+        os.makedirs(self.audio_dir, exist_ok=True)
+        path = self.audio_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp.wav'
+        engine.save_to_file(text, tmp_path)
+        engine.runAndWait()
+        # Another worker process may render the same phrase, the rename is atomic
+        os.replace(tmp_path, path)
+        return path
+
+
+_tts_worker = None
+_tts_worker_lock = threading.Lock()
+
+
+def get_tts_worker():
+    global _tts_worker
+    if _tts_worker is None:
+        from django.conf import settings
+
+        with _tts_worker_lock:
+            if _tts_worker is None:
+                _tts_worker = TTSWorker(
+                    audio_dir=getattr(settings, 'TTS_AUDIO_DIR', DEFAULT_AUDIO_DIR),
+                    queue_size=getattr(settings, 'TTS_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                )
+    return _tts_worker
@@ -1,52 +1,219 @@
 import os
 import string
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from nltk.corpus import stopwords
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import word_tokenize
 import nltk
 
-nltk.download('vader_lexicon')
-nltk.download('punkt')
-nltk.download('wordnet')
-nltk.download('stopwords')
-
 import json
 
-def predict_sentiment(text_input):
-    
-    try:
-        lower_case = text_input.lower()
-        cleaned_text = lower_case.translate(str.maketrans('', '', string.punctuation))
-        tokenized_words = word_tokenize(cleaned_text, "english")
+from .timing import span
 
-        final_words = [word for word in tokenized_words if word not in stopwords.words('english')]
+# NLTK data is vendored at build time by `python manage.py download_nltk_data`,
+# nothing is downloaded at import or request time.
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR', os.path.join(os.path.dirname(__file__), '../nltk_data'))
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
 
-        lemma_words = [WordNetLemmatizer().lemmatize(word) for word in final_words]
+# Package id -> resource path used to check that it is installed
+NLTK_RESOURCES = {
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+    'punkt': 'tokenizers/punkt',
+    'wordnet': 'corpora/wordnet',
+    'stopwords': 'corpora/stopwords',
+}
 
-        emotion_file_path = os.path.join(os.path.dirname(__file__), '../datasets/emotions.txt')
-        emotion_list = []
+# NLTK 3.8.2+ tokenizes with the pickle-free punkt_tab tables
+if hasattr(nltk.tokenize, 'PunktTokenizer'):
+    NLTK_RESOURCES['punkt_tab'] = 'tokenizers/punkt_tab/english/'
+
+
+def missing_nltk_resources():
+    missing = []
+    for package, resource in NLTK_RESOURCES.items():
         try:
-            with open(emotion_file_path, 'r') as file:
-                for line in file:
-                    clear_line = line.replace("\n", '').replace(",", '').replace("'", '').strip()
-                    word, emotion = clear_line.split(':')
-                    if word in lemma_words:
-                        emotion_list.append(emotion)
-        except FileNotFoundError:
-                return {"error": "emotions.txt file not found"}
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(package)
+    return missing
+
+
+def ensure_nltk_resources():
+    """Fail with a clear message when the vendored NLTK data is incomplete."""
+    missing = missing_nltk_resources()
+    if missing:
+        raise LookupError(
+            f"Missing NLTK data: {', '.join(missing)}. "
+            f"Run `python manage.py download_nltk_data` to install it into {NLTK_DATA_DIR}"
+        )
+
+EMOTIONS_FILE_PATH = os.path.join(os.path.dirname(__file__), '../datasets/emotions.txt')
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+def load_emotions(file_path=EMOTIONS_FILE_PATH):
+    """
+    Parse emotions.txt (lines like ``'word': 'emotion',``) into a dict of
+    word to emotions, a word can be listed more than once.
+    """
+    emotions = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            clear_line = line.replace("\n", '').replace(",", '').replace("'", '').strip()
+            if not clear_line:
+                continue
+            word, emotion = clear_line.split(':')
+            emotions.setdefault(word.strip(), []).append(emotion.strip())
+    return emotions
+
+
+class SentimentEngine:
+    """
+    Holds the NLTK resources used for sentiment analysis.
+
+    Stopwords, the emotions map, the lemmatizer and the VADER analyzer are
+    built once, on first use (or by ``load()`` when preloading), and shared
+    by every call in the process.
+    """
+
+    def __init__(self, emotions_path=EMOTIONS_FILE_PATH):
+        self.emotions_path = emotions_path
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            ensure_nltk_resources()
+            self.stop_words = frozenset(stopwords.words('english'))
+            self.emotions = load_emotions(self.emotions_path)
+            self.analyzer = SentimentIntensityAnalyzer()
+            # Students reuse a small vocabulary, so memoize WordNet lookups
+            self.lemmatize = lru_cache(maxsize=65536)(WordNetLemmatizer().lemmatize)
+            self._loaded = True
 
+    def analyze(self, text_input):
+        """Return the cleaned tokens' emotions and the VADER scores for ``text_input``."""
+        if not self._loaded:
+            self.load()
+        with span('sentiment.tokenize'):
+            cleaned_text = text_input.lower().translate(_PUNCTUATION_TABLE)
+            tokenized_words = word_tokenize(cleaned_text, "english")
 
-        score = SentimentIntensityAnalyzer().polarity_scores(cleaned_text)
+        with span('sentiment.lemmatize'):
+            stop_words = self.stop_words
+            lemma_words = [self.lemmatize(word) for word in tokenized_words if word not in stop_words]
+
+            emotion_list = []
+            seen = set()
+            for word in lemma_words:
+                if word in seen:
+                    continue
+                seen.add(word)
+                emotion_list.extend(self.emotions.get(word, ()))
+
+        with span('sentiment.vader'):
+            scores = self.analyzer.polarity_scores(cleaned_text)
+        return {
+            'emotions': emotion_list,
+            'scores': scores,
+        }
+
+    def predict(self, text_input):
+        """0 for negative, 1 otherwise."""
+        score = self.analyze(text_input)['scores']
         if score['neg'] > score['pos']:
             return 0
         else:
             return 1
-    
+
+    def score(self, text_input):
+        """The 0/1 prediction together with the raw VADER scores and matched emotions."""
+        result = self.analyze(text_input)
+        scores = result['scores']
+        return {
+            'prediction': 0 if scores['neg'] > scores['pos'] else 1,
+            'compound': scores['compound'],
+            'pos': scores['pos'],
+            'neg': scores['neg'],
+            'neu': scores['neu'],
+            'emotions': result['emotions'],
+        }
+
+
+_sentiment_engine = SentimentEngine()
+
+
+def get_sentiment_engine():
+    return _sentiment_engine
+
+
+def _score_one(row, text_input):
+    if not isinstance(text_input, str):
+        return {'row': row, 'error': 'text must be a string'}
+    try:
+        return dict(row=row, **_sentiment_engine.score(text_input))
+    except Exception as e:
+        return {'row': row, 'error': str(e)}
+
+
+def _score_chunk(offset, texts):
+    # Runs in pool processes, each builds its own engine resources once
+    return [_score_one(offset + i, text) for i, text in enumerate(texts)]
+
+
+def _chunks(texts, chunk_size):
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_texts(texts, processes=0, chunk_size=256):
+    """
+    Score an iterable of texts, yielding one result dict per text in input order.
+
+    With ``processes`` > 1 chunks are scored in a process pool. At most two
+    chunks per process are in flight, so a long stream is never buffered whole.
+    """
+    if processes <= 1:
+        for row, text_input in enumerate(texts):
+            yield _score_one(row, text_input)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = deque()
+        offset = 0
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(pool.submit(_score_chunk, offset, chunk))
+            offset += len(chunk)
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def predict_sentiment(text_input):
+
+    try:
+        return _sentiment_engine.predict(text_input)
+    except FileNotFoundError:
+        return {"error": "emotions.txt file not found"}
     except Exception as e:
         return {"error": str(e)}
-    
-    
+
+
 
 def load_career_data():
     file_path=os.path.join(os.path.dirname(__file__),'../datasets/jobs.json')
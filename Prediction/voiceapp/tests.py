@@ -1,3 +1,168 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from utils.admission import AdmissionController, LocalBucketStore, TokenBucket
+from utils.llm_gateway import LLMGateway
+from utils.response_cache import ResponseCache
+from utils.tts import TTSWorker
+
+
+class StubAsyncModels:
+
+    def __init__(self):
+        self.aio = self
+        self.models = self
+
+    async def generate_content(self, model, contents, config=None):
+        return mock.Mock(text=f'spoken answer from {model}')
+
+
+class VoiceBotViewTests(TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch('voiceapp.views.get_llm_gateway', return_value=LLMGateway(StubAsyncModels())),
+            mock.patch('voiceapp.views.get_response_cache', return_value=ResponseCache(None)),
+            mock.patch('voiceapp.views.retrieve_context', return_value='1) QA Engineer\nTests software.'),
+
+            mock.patch('voiceapp.views.get_admission_controller',
+                       return_value=AdmissionController(LocalBucketStore())),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_answers_query(self):
+        response = self.client.post('/api/voice/', {'query': 'What is QA?'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'query': 'What is QA?',
+                                           'response': 'spoken answer from models/gemini-2.5-flash'})
+
+    def test_missing_query(self):
+        response = self.client.post('/api/voice/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_over_its_rate_gets_429(self):
+        controller = AdmissionController(LocalBucketStore(), client_bucket=TokenBucket(rate=0.1, capacity=1))
+        with mock.patch('voiceapp.views.get_admission_controller', return_value=controller):
+            statuses = [self.client.post('/api/voice/', {'query': 'What is QA?'},
+                                         content_type='application/json').status_code for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+
+class FakeEngine:
+
+    def __init__(self, release=None):
+        self.release = release
+        self.properties = {}
+        self.said = []
+        self.saved = []
+        self._pending = None
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def say(self, text):
+        self.said.append(text)
+
+    def save_to_file(self, text, path):
+        self._pending = (text, path)
+
+    def runAndWait(self):
+        if self.release is not None:
+            self.release.wait(5)
+        if self._pending is not None:
+            text, path = self._pending
+            with open(path, 'wb') as f:
+                f.write(b'RIFF' + text.encode('utf-8'))
+            self.saved.append(text)
+            self._pending = None
+
+
+class TTSWorkerTests(TestCase):
+
+    def setUp(self):
+        self.audio_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.audio_dir, True)
+        self.release = threading.Event()
+        self.engine = FakeEngine(self.release)
+        self.worker = TTSWorker(lambda: self.engine, audio_dir=self.audio_dir, queue_size=2)
+        patch = mock.patch('voiceapp.views.get_tts_worker', return_value=self.worker)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(self.release.set)
+
+    def test_voice_command_does_not_wait_for_speech(self):
+        response = self.client.get('/api/bot/cmd/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.worker.stats['spoken'], 0)
+        self.release.set()
+        self.worker._queue.join()
+        self.assertEqual(self.engine.said, ['Voice Assistant is Activated'])
+        self.assertEqual(self.engine.properties['rate'], 120)
+
+    def test_full_queue_is_refused(self):
+        self.worker.speak('one')
+        # Wait until the worker holds the first job, then fill the queue
+        while self.worker.pending():
+            time.sleep(0.01)
+        self.worker.speak('two')
+        self.worker.speak('three')
+        response = self.client.get('/api/bot/cmd/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.worker.stats['rejected'], 1)
+
+    def test_rendered_audio_is_cached_and_served(self):
+        self.release.set()
+        urls = [self.client.get('/api/bot/cmd/', {'audio': '1'}).json()['audio'] for _ in range(3)]
+        self.assertEqual(len(set(urls)), 1)
+        self.assertEqual(self.engine.saved, ['Voice Assistant is Activated'])
+        self.assertEqual(self.worker.stats['audio_hits'], 2)
+
+        response = self.client.get(urls[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'audio/wav')
+        self.assertEqual(b''.join(response.streaming_content), b'RIFFVoice Assistant is Activated')
+        self.assertEqual(self.client.get('/api/voice/audio/' + '0' * 64 + '.wav').status_code, 404)
+
+    def test_concurrent_renders_share_one_job(self):
+        key, first = self.worker.render('Hello', 150, 'voice-1')
+        same_key, second = self.worker.render('Hello', 150, 'voice-1')
+        self.assertEqual((same_key, second), (key, first))
+        self.assertNotEqual(self.worker.render('Hello', 120, 'voice-1')[0], key)
+        self.release.set()
+        self.assertEqual(first.result(5), os.path.join(self.audio_dir, f'{key}.wav'))
+        self.worker._queue.join()
+        self.assertEqual(self.engine.saved, ['Hello', 'Hello'])
+
+    def test_engine_failure_is_reported_on_the_future(self):
+        worker = TTSWorker(mock.Mock(side_effect=RuntimeError('no audio device')), audio_dir=self.audio_dir)
+        with self.assertRaises(RuntimeError):
+            worker.speak('Hello').result(5)
+        self.assertEqual(worker.stats['failures'], 1)
+
+    def test_voice_answer_with_audio(self):
+        self.release.set()
+        patches = [
+            mock.patch('voiceapp.views.get_llm_gateway', return_value=LLMGateway(StubAsyncModels())),
+            mock.patch('voiceapp.views.get_response_cache', return_value=ResponseCache(None)),
+            mock.patch('voiceapp.views.retrieve_context', return_value='1) QA Engineer\nTests software.'),
+
+            mock.patch('voiceapp.views.get_admission_controller',
+                       return_value=AdmissionController(LocalBucketStore())),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        response = self.client.post('/api/voice/', {'query': 'What is QA?', 'audio': True},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.json()['audio'], r'^http://testserver/api/voice/audio/[0-9a-f]{64}\.wav$')
+        self.assertEqual(self.engine.saved, ['spoken answer from models/gemini-2.5-flash'])
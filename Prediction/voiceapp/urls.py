@@ -1,7 +1,8 @@
-from django.urls import path
-from .views import VoiceBotView, VoiceCommand
+from django.urls import path, re_path
+from .views import VoiceAudioView, VoiceBotView, VoiceCommand
 
 urlpatterns = [
     path('voice/', VoiceBotView.as_view(), name='voice_bot'),
-    path('bot/cmd/',VoiceCommand.as_view(), name='voice-command')
+    path('bot/cmd/',VoiceCommand.as_view(), name='voice-command'),
+    re_path(r'^voice/audio/(?P<key>[0-9a-f]{64})\.wav$', VoiceAudioView.as_view(), name='voice-audio'),
 ]
\ No newline at end of file
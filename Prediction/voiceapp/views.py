@@ -1,145 +1,161 @@
+import asyncio
+
 from django.shortcuts import render
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import os
 import logging
 
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
-from PyPDF2 import PdfReader
+from django.conf import settings
+
+from utils.admission import Overloaded, get_admission_controller, overloaded_response
+from utils.documents import JOB_ROLES_PDF, DocumentUnavailable, get_document_store
+from utils.http import read_request_data
+from utils.llm_gateway import LLMUnavailable, get_llm_gateway
+from utils.response_cache import get_response_cache
+from utils.retrieval import retrieve_context
+from utils.timing import span
+from utils.tts import TTSBusy, get_tts_worker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
+# Load environment variables, the Gemini client is created by utils.llm_gateway
 load_dotenv()
-API_KEY = os.environ.get("GOOGLE_API_KEY")
-
-# Initialize Gemini client
-client = None
-if API_KEY:
-    client = genai.Client(api_key=API_KEY)
-else:
-    print("Warning: GOOGLE_API_KEY not found in environment variables")
-
-# Lazy-load TTS Engine to avoid blocking server startup
-_engine = None
 
-def get_tts_engine():
-    global _engine
-    if _engine is None:
-        import pyttsx3
-        _engine = pyttsx3.init()
-        voices = _engine.getProperty('voices')
-        _engine.setProperty('voice', voices[0].id)
-    return _engine
+# Async like chatapp.views.ChatbotView, so Gemini calls don't pin ASGI workers
+@method_decorator(csrf_exempt, name='dispatch')
+class VoiceBotView(View):
 
+    async def post(self, request):
+        try:
+            data = read_request_data(request)
+            user_message = data.get('query')
+        except ValueError as e:
+            return JsonResponse({'error': f'Invalid request body: {e}'}, status=status.HTTP_400_BAD_REQUEST)
 
-class VoiceBotView(APIView):
-
-    def post(self, request):
-        user_message = request.data.get('query')
-        
         if not user_message:
-            return Response({'error': 'Query not provided'}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({'error': 'Query not provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not client:
-            return Response({
+        if not get_llm_gateway().configured:
+            return JsonResponse({
                 'error': 'GOOGLE_API_KEY not configured. Please set it in the .env file.'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         try:
-            response_text = VoiceBotFunction.get_voice_response(user_message)
+            ticket = await get_admission_controller().admit(request)
+        except Overloaded as e:
+            return overloaded_response(e)
+
+        try:
+            response_text = await VoiceBotFunction.get_voice_response(user_message)
             logger.info(response_text)
-            return Response({'query': user_message, 'response': response_text})
+            payload = {'query': user_message, 'response': response_text}
+            if data.get('audio'):
+                with span('tts'):
+                    payload['audio'] = await VoiceBotFunction.render_audio(request, response_text)
+            return JsonResponse(payload)
 
+        except LLMUnavailable as e:
+            logger.error(f"Exception occurred: {e}")
+            response = JsonResponse({'error': f'Internal server error: {str(e)}'},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            if e.retry_after:
+                response['Retry-After'] = str(int(e.retry_after + 0.999))
+            return response
         except Exception as e:
             logger.error(f"Exception occurred: {e}")
-            return Response({
+            return JsonResponse({
                 'error': f'Internal server error: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            ticket.release()
 
 
 class VoiceBotFunction:
 
-    _pdf_content = None  # Cache PDF content
+    @staticmethod
+    def speak(text, rate=None):
+        """Queue ``text`` on the TTS worker and return without waiting for it to be spoken."""
+        return get_tts_worker().speak(text, rate or getattr(settings, 'TTS_RATE', 120),
+                                      getattr(settings, 'TTS_VOICE', None))
 
     @staticmethod
-    def speak(text, rate=120):
+    async def render_audio(request, text):
+        """URL of ``text`` rendered to a WAV file, or None when TTS failed or took too long."""
         try:
-            engine = get_tts_engine()
-            engine.setProperty('rate', rate)
-            engine.say(text)
-            if not engine._inLoop:
-                engine.runAndWait()
+            key, future = get_tts_worker().render(
+                text, getattr(settings, 'TTS_RATE', 120), getattr(settings, 'TTS_VOICE', None))
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                   getattr(settings, 'TTS_RENDER_TIMEOUT', 10))
         except Exception as e:
-            logger.error(f"Error in text-to-speech: {e}")
+            # The text answer is still useful without audio
+            logger.error(f"Error in text-to-speech: {e!r}")
+            return None
+        return request.build_absolute_uri(reverse('voice-audio', args=[key]))
 
     @staticmethod
     def get_pdf_text():
-        if VoiceBotFunction._pdf_content:
-            return VoiceBotFunction._pdf_content
-            
-        file_path = os.path.join(os.path.dirname(__file__), "../datasets/docs/Job_Roles.pdf")
-        text = ""
+        # Extracted once and shared with the other app through the document store
         try:
-            with open(file_path, 'rb') as pdf_docs:
-                pdf_reader = PdfReader(pdf_docs)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-            VoiceBotFunction._pdf_content = text
-        except Exception as e:
+            return get_document_store().get_text(JOB_ROLES_PDF)
+        except DocumentUnavailable as e:
             logger.error(f"Error reading PDF: {e}")
-            text = "Career guidance information not available."
-        return text
+            return "Career guidance information not available."
+
+    @staticmethod
+    def get_context(user_message):
+        # Only the chunks of the PDF relevant to the question go into the prompt
+        try:
+            return retrieve_context(user_message, k=getattr(settings, 'CONTEXT_TOP_K', 3))
+        except Exception as e:
+            logger.error(f"Context retrieval failed, using the PDF prefix: {e}")
+            return VoiceBotFunction.get_pdf_text()[:8000]
 
     @staticmethod
-    def get_voice_response(user_message):
+    async def get_voice_response(user_message):
         try:
-            # Get context from PDF
-            context = VoiceBotFunction.get_pdf_text()
+            # Get context from PDF, off the event loop (the first call may extract the PDF)
+            with span('context'):
+                context = await sync_to_async(VoiceBotFunction.get_context, thread_sensitive=False)(user_message)
             
             # Create prompt with context
             prompt = f"""You are a helpful career guidance voice assistant. Use the following context about job roles to answer the user's question.
 Keep your response concise and suitable for voice output.
             
 Context:
-{context[:8000]}
+{context}
 
 User Question: {user_message}
 
 Please provide a helpful, concise answer based on the context. If the answer is not in the context, provide general career guidance."""
 
-            # Use available models from Google GenAI - models need "models/" prefix
-            models_to_try = ["models/gemini-2.5-flash", "models/gemini-2.0-flash", "models/gemini-flash-latest", "models/gemini-pro-latest"]
-            
-            for model_name in models_to_try:
-                try:
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=prompt,
-                        config=types.GenerateContentConfig(
-                            temperature=0.3,
-                            max_output_tokens=512,
-                        )
-                    )
-                    return response.text
-                except Exception as model_error:
-                    error_str = str(model_error)
-                    # If 404 (model not found) or quota exceeded, try next model
-                    if "404" in error_str or "NOT_FOUND" in error_str or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "quota" in error_str.lower():
-                        if model_name == models_to_try[-1]:  # Last model failed
-                            raise Exception(f"All models failed. Error: {error_str}")
-                        continue  # Try next model
-                    else:
-                        # Other error, raise it
-                        raise
-            
-            raise Exception("Failed to generate response with any available model")
+            gateway = get_llm_gateway()
+
+            # Repeated questions are answered from the cache, see utils/response_cache.py
+            cache = get_response_cache()
+            with span('cache'):
+                cached = await cache.alookup('voice', user_message, gateway.models, context)
+            if cached is not None:
+                return cached
+
+            # Shares model health with the chatbot, a model that failed there is skipped here too
+            model_name, text = await gateway.generate(prompt, types.GenerateContentConfig(
+                temperature=0.3,
+                max_output_tokens=512,
+            ))
+            await cache.astore('voice', user_message, model_name, context, text)
+            return text
 
         except Exception as e:
             logger.error(f"Error in get_voice_response: {e}")
@@ -148,5 +164,28 @@ Please provide a helpful, concise answer based on the context. If the answer is
 
 class VoiceCommand(APIView):
     def get(self, request):
-        VoiceBotFunction.speak("Voice Assistant is Activated")
+        text = "Voice Assistant is Activated"
+        try:
+            if request.query_params.get('audio'):
+                # Rendered once, later requests get the cached file
+                audio = async_to_sync(VoiceBotFunction.render_audio)(request, text)
+                return Response({"message": "Voice activated", "audio": audio}, status=status.HTTP_200_OK)
+            VoiceBotFunction.speak(text)
+        except TTSBusy as e:
+            logger.error(f"Exception occurred: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
         return Response({"message": "Voice activated"}, status=status.HTTP_200_OK)
+
+
+class VoiceAudioView(View):
+    """Serves the WAV files rendered by the TTS worker."""
+
+    def get(self, request, key):
+        path = get_tts_worker().audio_path(key)
+        try:
+            response = FileResponse(open(path, 'rb'), content_type='audio/wav')
+        except FileNotFoundError:
+            raise Http404("Audio not found")
+        # Named by the hash of what was said, the file never changes
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response